@@ -0,0 +1,103 @@
+"""Measure the per-request cost of building and compiling JobDB searches
+
+Usage::
+
+    python benchmarks/search_compile_cost.py --requests 10000
+
+The same searches, with random values, are built and executed against an
+empty in-memory SQLite database so the time is dominated by the work done in
+Python. Three variants are compared:
+
+* ``rebuilt, no cache``: a new expression tree with literal values is built
+  for every request and SQLAlchemy's compiled cache is disabled, which is the
+  cost of a compiled cache miss
+* ``rebuilt``: the same, with the compiled cache enabled
+* ``shape cached``: the search is validated, the statement is looked up by
+  the shape of the search and the values are bound at execution
+"""
+from __future__ import annotations
+
+import random
+import time
+
+import typer
+from sqlalchemy import create_engine, select
+
+from diracx.db.jobs.db import (
+    _order_by,
+    _search_columns,
+    _search_key,
+    _search_ordering,
+    _search_statement,
+)
+from diracx.db.jobs.schema import Base as JobDBBase
+from diracx.db.jobs.schema import Jobs
+from diracx.db.utils import plan_search, search_params
+
+STATUSES = ["Received", "Checking", "Waiting", "Running", "Done", "Failed"]
+PARAMETERS = ["JobID", "Status", "Site", "Owner"]
+SORTS = [{"parameter": "JobID", "direction": "desc"}]
+
+
+def random_search() -> list[dict]:
+    return [
+        {"parameter": "Owner", "operator": "eq", "value": f"owner{random.random()}"},
+        {"parameter": "Status", "operator": "in", "values": random.sample(STATUSES, 3)},
+        {"parameter": "JobID", "operator": "gt", "value": random.randrange(10**6)},
+    ]
+
+
+def rebuilt_statement(search):
+    """Build the statement the way it was done for every request"""
+    stmt = select(*_search_columns(PARAMETERS))
+    for query in search:
+        column = Jobs.__table__.columns[query["parameter"]]
+        if query["operator"] == "eq":
+            stmt = stmt.where(column == query["value"])
+        elif query["operator"] == "gt":
+            stmt = stmt.where(column > query["value"])
+        elif query["operator"] == "in":
+            stmt = stmt.where(column.in_(query["values"]))
+    stmt = stmt.order_by(*_order_by(_search_ordering(SORTS, search)))
+    return stmt.limit(101), {}
+
+
+def cached_statement(search):
+    search = plan_search(Jobs.__table__, search)
+    stmt, _, _ = _search_statement(*_search_key(PARAMETERS, search, SORTS, True))
+    return stmt.limit(101), search_params(search)
+
+
+def main(requests: int = 10_000):
+    engine = create_engine("sqlite://")
+    JobDBBase.metadata.create_all(engine)
+    searches = [random_search() for _ in range(requests)]
+
+    variants = {
+        "rebuilt, no cache": (rebuilt_statement, {"compiled_cache": None}),
+        "rebuilt": (rebuilt_statement, {}),
+        "shape cached": (cached_statement, {}),
+    }
+    for name, (build, options) in variants.items():
+        with engine.connect().execution_options(**options) as conn:
+            # Warm up the caches
+            stmt, params = build(searches[0])
+            conn.execute(stmt, params).all()
+
+            build_time = execute_time = 0.0
+            for search in searches:
+                start = time.perf_counter()
+                stmt, params = build(search)
+                built = time.perf_counter()
+                conn.execute(stmt, params).all()
+                build_time += built - start
+                execute_time += time.perf_counter() - built
+        typer.echo(
+            f"{name:>20}: build {build_time / requests * 1e6:7.1f}us, "
+            f"compile and execute {execute_time / requests * 1e6:7.1f}us "
+            "per request"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
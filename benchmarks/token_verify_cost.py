@@ -0,0 +1,93 @@
+"""Measure the cost of verify_dirac_token for each token signing algorithm
+
+Usage::
+
+    python benchmarks/token_verify_cost.py --requests 2000
+
+A token is issued with a key of each supported type and verified
+``--requests`` times. The verified token cache is cleared before each call
+so the time is dominated by the signature verification, the cost of a
+cache hit is shown for comparison. RSA signatures are cheap to verify but
+expensive to create so the cost of issuing a token is shown too.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from uuid import uuid4
+
+import typer
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from diracx.routers.auth import (
+    AuthSettings,
+    _verified_token_cache,
+    create_access_token,
+    verify_dirac_token,
+)
+
+KEYS = {
+    "RS256 (4096 bits)": lambda: rsa.generate_private_key(65537, 4096),
+    "RS256 (2048 bits)": lambda: rsa.generate_private_key(65537, 2048),
+    "ES256": lambda: ec.generate_private_key(ec.SECP256R1()),
+    "EdDSA (Ed25519)": ed25519.Ed25519PrivateKey.generate,
+}
+
+
+def issue_token(settings: AuthSettings) -> str:
+    payload = {
+        "sub": "testingVO:yellow-sub",
+        "aud": settings.token_audience,
+        "iss": settings.token_issuer,
+        "dirac_properties": ["NormalUser"],
+        "jti": str(uuid4()),
+        "preferred_username": "preferred_username",
+        "dirac_group": "test_group",
+        "vo": "lhcb",
+    }
+    return create_access_token(payload, settings)
+
+
+def measure_signing(settings: AuthSettings, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        issue_token(settings)
+    return (time.perf_counter() - start) / requests
+
+
+async def measure(settings: AuthSettings, requests: int, cached: bool) -> float:
+    authorization = f"Bearer {issue_token(settings)}"
+    await verify_dirac_token(authorization, settings)
+    start = time.perf_counter()
+    for _ in range(requests):
+        if not cached:
+            _verified_token_cache.clear()
+        await verify_dirac_token(authorization, settings)
+    return (time.perf_counter() - start) / requests
+
+
+def main(requests: int = 2000):
+    for name, generate_key in KEYS.items():
+        pem = (
+            generate_key()
+            .private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption(),
+            )
+            .decode()
+        )
+        settings = AuthSettings(token_key=pem)
+        signing = measure_signing(settings, requests)
+        uncached = asyncio.run(measure(settings, requests, cached=False))
+        cached = asyncio.run(measure(settings, requests, cached=True))
+        typer.echo(
+            f"{name:>18} ({settings.signing_algorithm}): "
+            f"sign {signing * 1e6:7.1f}us, verify {uncached * 1e6:7.1f}us, "
+            f"cache hit {cached * 1e6:5.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
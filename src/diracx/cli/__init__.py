@@ -1,9 +1,8 @@
 from __future__ import annotations
 
 import asyncio
-import json
 import os
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timedelta
 from typing import Optional
 
 from typer import Option
@@ -12,12 +11,10 @@ from diracx.client.aio import Dirac
 from diracx.client.models import DeviceFlowErrorResponse
 
 from . import internal, jobs
-from .utils import CREDENTIALS_PATH, AsyncTyper
+from .utils import CLIENT_ID, CREDENTIALS_PATH, AsyncTyper, write_credentials
 
 app = AsyncTyper()
 
-EXPIRES_GRACE_SECONDS = 15
-
 
 @app.async_command()
 async def login(
@@ -37,7 +34,7 @@ async def login(
     # TODO set endpoint URL from preferences
     async with Dirac(endpoint="http://localhost:8000") as api:
         data = await api.auth.initiate_device_flow(
-            client_id="myDIRACClientID",
+            client_id=CLIENT_ID,
             audience="Dirac server",
             scope=" ".join(scopes),
         )
@@ -46,7 +43,7 @@ async def login(
         while expires > datetime.now():
             print(".", end="", flush=True)
             response = await api.auth.token(  # type: ignore
-                vo, device_code=data.device_code, client_id="myDIRACClientID"
+                vo, device_code=data.device_code, client_id=CLIENT_ID
             )
             if isinstance(response, DeviceFlowErrorResponse):
                 if response.error == "authorization_pending":
@@ -60,17 +57,7 @@ async def login(
         else:
             raise RuntimeError("Device authorization flow expired")
 
-    CREDENTIALS_PATH.parent.mkdir(parents=True, exist_ok=True)
-    expires = datetime.now(tz=timezone.utc) + timedelta(
-        seconds=response.expires_in - EXPIRES_GRACE_SECONDS
-    )
-    credential_data = {
-        "access_token": response.access_token,
-        # TODO: "refresh_token":
-        # TODO: "refresh_token_expires":
-        "expires": expires.isoformat(),
-    }
-    CREDENTIALS_PATH.write_text(json.dumps(credential_data))
+    write_credentials(response)
     print(f"Saved credentials to {CREDENTIALS_PATH}")
 
 
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 import json
 from pathlib import Path
+from typing import cast
 
 import git
 import typer
@@ -18,6 +19,9 @@ from diracx.core.config.schema import (
     RegistryConfig,
     UserConfig,
 )
+from diracx.core.extensions import select_from_extension
+from diracx.db.auth.db import AuthDB
+from diracx.db.utils import BaseDB, DBSettings
 
 from .utils import AsyncTyper
 
@@ -109,3 +113,58 @@ def add_user(
         f"Added user {sub} ({preferred_username}) to vo {vo} and user_group {user_group}"
     )
     typer.echo(f"Successfully added user to {config_repo}", err=True)
+
+
+def _load_db(db_name: str) -> BaseDB:
+    db_urls = BaseDB.available_urls()
+    if db_name not in db_urls:
+        typer.echo(f"ERROR: No URL found for {db_name}", err=True)
+        raise typer.Exit(1)
+    db_class = next(
+        entry_point.load()
+        for entry_point in select_from_extension(group="diracx.dbs", name=db_name)
+    )
+    return db_class(db_url=db_urls[db_name], settings=DBSettings.for_db(db_name))
+
+
+@app.async_command()
+async def sync_db_indexes(db_name: str):
+    """Create/drop indexes so an existing database matches the current schema
+
+    The database URL is taken from the DIRACX_DB_URL_<DB_NAME> environment variable.
+    """
+    db = _load_db(db_name)
+    async with db.engine_context():
+        await db.sync_indexes()
+    typer.echo(f"Successfully synchronised the indexes of {db_name}", err=True)
+
+
+@app.async_command()
+async def db_upgrade(db_name: str):
+    """Create the missing tables and indexes and record the schema version
+
+    This must be run before the services can start with a new schema version.
+    The database URL is taken from the DIRACX_DB_URL_<DB_NAME> environment variable.
+    """
+    db = _load_db(db_name)
+    async with db.engine_context(check_schema=False):
+        await db.upgrade()
+    typer.echo(
+        f"Successfully upgraded {db_name} to schema version {db.schema_version}",
+        err=True,
+    )
+
+
+@app.async_command()
+async def purge_refresh_tokens(expire_minutes: int):
+    """Delete the refresh tokens older than EXPIRE_MINUTES
+
+    EXPIRE_MINUTES should be the refresh token lifetime of the auth service,
+    expired tokens are deleted when their user logs in again so this only
+    needs to be run from time to time.
+    The database URL is taken from the DIRACX_DB_URL_AUTHDB environment variable.
+    """
+    db = cast(AuthDB, _load_db("AuthDB"))
+    async with db.engine_context(), db:
+        deleted = await db.delete_expired_refresh_tokens(expire_minutes * 60)
+    typer.echo(f"Deleted {deleted} expired refresh tokens", err=True)
@@ -5,14 +5,20 @@ __all__ = ("app",)
 
 import json
 import os
-from typing import Annotated
+from pathlib import Path
+from typing import Annotated, Optional
 
 from rich.console import Console
 from rich.table import Table
 from typer import FileText, Option
 
 from diracx.client.aio import Dirac
-from diracx.core.models import ScalarSearchOperator, SearchSpec, VectorSearchOperator
+from diracx.core.models import (
+    ExportFormat,
+    ScalarSearchOperator,
+    SearchSpec,
+    VectorSearchOperator,
+)
 
 from .utils import AsyncTyper, get_auth_headers
 
@@ -52,16 +58,44 @@ async def search(
     ],
     condition: Annotated[list[SearchSpec], Option(parser=parse_condition)] = [],
     all: bool = False,
+    per_page: int = 100,
 ):
+    jobs = []
     async with Dirac(endpoint="http://localhost:8000") as api:
-        jobs = await api.jobs.search(
+        async for page in api.jobs.search_pages(  # type: ignore
             parameters=None if all else parameter,
             search=condition if condition else None,
-            headers=get_auth_headers(),
-        )
+            per_page=per_page,
+            headers=await get_auth_headers(api),
+        ):
+            jobs.extend(page)
     display(jobs, "jobs")
 
 
+@app.async_command()
+async def export(
+    output: Path,
+    parameter: Optional[list[str]] = None,
+    condition: Annotated[list[SearchSpec], Option(parser=parse_condition)] = [],
+    format: ExportFormat = ExportFormat.ARROW,
+):
+    """Export the matching jobs to OUTPUT as an Arrow IPC stream or Parquet file
+
+    All the columns are exported unless some are selected with --parameter.
+    Arrow exports can be opened without copying the data into memory, e.g.
+    with pyarrow.ipc.open_stream(pyarrow.memory_map(OUTPUT)).
+    """
+    async with Dirac(endpoint="http://localhost:8000") as api:
+        with output.open("wb") as f:
+            async for chunk in api.jobs.export(  # type: ignore
+                format=format.value,
+                parameters=parameter,
+                search=condition if condition else None,
+                headers=await get_auth_headers(api),
+            ):
+                f.write(chunk)
+
+
 def display(data, unit: str):
     format = os.environ["DIRACX_OUTPUT_FORMAT"]
     if format == "json":
@@ -105,7 +139,7 @@ def display_rich(data, unit: str) -> None:
 async def submit(jdl: list[FileText]):
     async with Dirac(endpoint="http://localhost:8000") as api:
         jobs = await api.jobs.submit_bulk_jobs(
-            [x.read() for x in jdl], headers=get_auth_headers()
+            [x.read() for x in jdl], headers=await get_auth_headers(api)
         )
     print(
         f"Inserted {len(jobs)} jobs with ids: {','.join(map(str, (job.job_id for job in jobs)))}"
@@ -1,16 +1,30 @@
 from __future__ import annotations
 
-__all__ = ("AsyncTyper", "CREDENTIALS_PATH", "get_auth_headers")
+__all__ = (
+    "AsyncTyper",
+    "CREDENTIALS_PATH",
+    "get_auth_headers",
+    "write_credentials",
+)
 
 import json
 from asyncio import run
+from base64 import urlsafe_b64decode
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 from pathlib import Path
 
 import typer
 
+from diracx.client.models import DeviceFlowErrorResponse, TokenResponse
+
 CREDENTIALS_PATH = Path.home() / ".cache" / "diracx" / "credentials.json"
 
+EXPIRES_GRACE_SECONDS = 15
+
+# TODO: Should be obtained from the server
+CLIENT_ID = "myDIRACClientID"
+
 
 class AsyncTyper(typer.Typer):
     def async_command(self, *args, **kwargs):
@@ -25,9 +39,58 @@ class AsyncTyper(typer.Typer):
         return decorator
 
 
-def get_auth_headers():
+def _token_expires(raw_token: str) -> datetime:
+    """Get the expiry of a JWT from its claims without verifying it"""
+    payload = raw_token.split(".")[1]
+    claims = json.loads(urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    return datetime.fromtimestamp(claims["exp"], tz=timezone.utc)
+
+
+def write_credentials(token_response: TokenResponse):
+    """Save the tokens of a successful login or refresh to CREDENTIALS_PATH"""
+    now = datetime.now(tz=timezone.utc)
+    expires = now + timedelta(seconds=token_response.expires_in - EXPIRES_GRACE_SECONDS)
+    refresh_token_expires = _token_expires(token_response.refresh_token) - timedelta(
+        seconds=EXPIRES_GRACE_SECONDS
+    )
+    credential_data = {
+        "access_token": token_response.access_token,
+        "refresh_token": token_response.refresh_token,
+        "refresh_token_expires": refresh_token_expires.isoformat(),
+        "expires": expires.isoformat(),
+    }
+    CREDENTIALS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    CREDENTIALS_PATH.write_text(json.dumps(credential_data))
+
+
+async def get_auth_headers(api):
+    """Get the headers to authenticate with the access token
+
+    The access token is short lived so an expired one is exchanged, along with
+    the refresh token, for new tokens which are saved for the next commands.
+    """
     # TODO: Use autorest's actual mechanism for this
     if not CREDENTIALS_PATH.exists():
         raise NotImplementedError("Login first")
     credentials = json.loads(CREDENTIALS_PATH.read_text())
+    now = datetime.now(tz=timezone.utc)
+    if datetime.fromisoformat(credentials["expires"]) < now:
+        # Credentials saved by older versions have no refresh token
+        refresh_token_expires = credentials.get("refresh_token_expires")
+        if (
+            "refresh_token" not in credentials
+            or refresh_token_expires is None
+            or datetime.fromisoformat(refresh_token_expires) < now
+        ):
+            typer.echo(
+                "Your credentials have expired, run 'dirac login' again", err=True
+            )
+            raise typer.Exit(1)
+        response = await api.auth.refresh(
+            credentials["refresh_token"], client_id=CLIENT_ID
+        )
+        if isinstance(response, DeviceFlowErrorResponse):
+            raise RuntimeError(f"Failed to refresh the credentials: {response}")
+        write_credentials(response)
+        credentials["access_token"] = response.access_token
     return {"Authorization": f"Bearer {credentials['access_token']}"}
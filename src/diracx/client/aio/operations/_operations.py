@@ -43,6 +43,7 @@ from ...operations._operations import (
     build_jobs_set_status_bulk_request,
     build_jobs_submit_bulk_jobs_request,
     build_jobs_summary_request,
+    build_well_known_jwks_request,
     build_well_known_openid_configuration_request,
 )
 from .._vendor import raise_if_not_implemented
@@ -130,6 +131,60 @@ class WellKnownOperations:
 
         return deserialized
 
+    @distributed_trace_async
+    async def jwks(self, **kwargs: Any) -> Any:
+        """Jwks.
+
+        The public keys which DiracX tokens can be signed with.
+
+        This includes the retiring keys so tokens signed with them can still be
+        verified until they expire.
+
+        :return: any
+        :rtype: any
+        :raises ~azure.core.exceptions.HttpResponseError:
+        """
+        error_map = {
+            401: ClientAuthenticationError,
+            404: ResourceNotFoundError,
+            409: ResourceExistsError,
+            304: ResourceNotModifiedError,
+        }
+        error_map.update(kwargs.pop("error_map", {}) or {})
+
+        _headers = kwargs.pop("headers", {}) or {}
+        _params = kwargs.pop("params", {}) or {}
+
+        cls: ClsType[Any] = kwargs.pop("cls", None)
+
+        request = build_well_known_jwks_request(
+            headers=_headers,
+            params=_params,
+        )
+        request.url = self._client.format_url(request.url)
+
+        _stream = False
+        pipeline_response: PipelineResponse = (
+            await self._client._pipeline.run(  # pylint: disable=protected-access
+                request, stream=_stream, **kwargs
+            )
+        )
+
+        response = pipeline_response.http_response
+
+        if response.status_code not in [200]:
+            map_error(
+                status_code=response.status_code, response=response, error_map=error_map
+            )
+            raise HttpResponseError(response=response)
+
+        deserialized = self._deserialize("object", pipeline_response)
+
+        if cls:
+            return cls(pipeline_response, deserialized, {})
+
+        return deserialized
+
 
 class AuthOperations:
     """
@@ -985,17 +1040,15 @@ class JobsOperations:
         return deserialized
 
     @distributed_trace_async
-    async def get_single_job_status(
-        self, job_id: int, **kwargs: Any
-    ) -> Union[str, _models.JobStatus]:
+    async def get_single_job_status(self, job_id: int, **kwargs: Any) -> str:
         """Get Single Job Status.
 
         Get Single Job Status.
 
         :param job_id: Required.
         :type job_id: int
-        :return: JobStatus
-        :rtype: str or ~client.models.JobStatus
+        :return: str
+        :rtype: str
         :raises ~azure.core.exceptions.HttpResponseError:
         """
         error_map = {
@@ -1009,7 +1062,7 @@ class JobsOperations:
         _headers = kwargs.pop("headers", {}) or {}
         _params = kwargs.pop("params", {}) or {}
 
-        cls: ClsType[Union[str, _models.JobStatus]] = kwargs.pop("cls", None)
+        cls: ClsType[str] = kwargs.pop("cls", None)
 
         request = build_jobs_get_single_job_status_request(
             job_id=job_id,
@@ -1042,7 +1095,12 @@ class JobsOperations:
 
     @distributed_trace_async
     async def set_single_job_status(
-        self, job_id: int, *, status: Union[str, _models.JobStatus], **kwargs: Any
+        self,
+        job_id: int,
+        *,
+        status: Union[str, _models.JobStatus],
+        minor_status: Optional[str] = None,
+        **kwargs: Any
     ) -> Any:
         """Set Single Job Status.
 
@@ -1053,6 +1111,8 @@ class JobsOperations:
         :keyword status: Known values are: "Running", "Stalled", "Killed", "Failed", "RECEIVED", and
          "Submitting". Required.
         :paramtype status: str or ~client.models.JobStatus
+        :keyword minor_status: Default value is None.
+        :paramtype minor_status: str
         :return: any
         :rtype: any
         :raises ~azure.core.exceptions.HttpResponseError:
@@ -1073,6 +1133,7 @@ class JobsOperations:
         request = build_jobs_set_single_job_status_request(
             job_id=job_id,
             status=status,
+            minor_status=minor_status,
             headers=_headers,
             params=_params,
         )
@@ -1325,8 +1386,9 @@ class JobsOperations:
         self,
         body: Optional[_models.JobSearchParams] = None,
         *,
-        page: int = 0,
         per_page: int = 100,
+        cursor: Optional[str] = None,
+        total: Optional[Union[str, _models.TotalCountMode]] = None,
         content_type: str = "application/json",
         **kwargs: Any
     ) -> List[JSON]:
@@ -1338,10 +1400,13 @@ class JobsOperations:
 
         :param body: Default value is None.
         :type body: ~client.models.JobSearchParams
-        :keyword page: Default value is 0.
-        :paramtype page: int
         :keyword per_page: Default value is 100.
         :paramtype per_page: int
+        :keyword cursor: Default value is None.
+        :paramtype cursor: str
+        :keyword total: Known values are: "exact", "capped", and "estimated". Default value is
+         None.
+        :paramtype total: str or ~client.models.TotalCountMode
         :keyword content_type: Body Parameter content-type. Content type parameter for JSON body.
          Default value is "application/json".
         :paramtype content_type: str
@@ -1355,8 +1420,9 @@ class JobsOperations:
         self,
         body: Optional[IO] = None,
         *,
-        page: int = 0,
         per_page: int = 100,
+        cursor: Optional[str] = None,
+        total: Optional[Union[str, _models.TotalCountMode]] = None,
         content_type: str = "application/json",
         **kwargs: Any
     ) -> List[JSON]:
@@ -1368,10 +1434,13 @@ class JobsOperations:
 
         :param body: Default value is None.
         :type body: IO
-        :keyword page: Default value is 0.
-        :paramtype page: int
         :keyword per_page: Default value is 100.
         :paramtype per_page: int
+        :keyword cursor: Default value is None.
+        :paramtype cursor: str
+        :keyword total: Known values are: "exact", "capped", and "estimated". Default value is
+         None.
+        :paramtype total: str or ~client.models.TotalCountMode
         :keyword content_type: Body Parameter content-type. Content type parameter for binary body.
          Default value is "application/json".
         :paramtype content_type: str
@@ -1385,8 +1454,9 @@ class JobsOperations:
         self,
         body: Optional[Union[_models.JobSearchParams, IO]] = None,
         *,
-        page: int = 0,
         per_page: int = 100,
+        cursor: Optional[str] = None,
+        total: Optional[Union[str, _models.TotalCountMode]] = None,
         **kwargs: Any
     ) -> List[JSON]:
         """Search.
@@ -1397,10 +1467,13 @@ class JobsOperations:
 
         :param body: Is either a JobSearchParams type or a IO type. Default value is None.
         :type body: ~client.models.JobSearchParams or IO
-        :keyword page: Default value is 0.
-        :paramtype page: int
         :keyword per_page: Default value is 100.
         :paramtype per_page: int
+        :keyword cursor: Default value is None.
+        :paramtype cursor: str
+        :keyword total: Known values are: "exact", "capped", and "estimated". Default value is
+         None.
+        :paramtype total: str or ~client.models.TotalCountMode
         :keyword content_type: Body Parameter content-type. Known values are: 'application/json'.
          Default value is None.
         :paramtype content_type: str
@@ -1436,8 +1509,9 @@ class JobsOperations:
                 _json = None
 
         request = build_jobs_search_request(
-            page=page,
             per_page=per_page,
+            cursor=cursor,
+            total=total,
             content_type=content_type,
             json=_json,
             content=_content,
@@ -8,7 +8,7 @@ Follow our quickstart for examples: https://aka.ms/azsdk/python/dpcodegen/python
 """
 import io
 import json
-from typing import Any, List
+from typing import Any, AsyncIterator, List
 
 from azure.core.rest import HttpRequest
 from azure.core.exceptions import map_error, HttpResponseError
@@ -16,7 +16,11 @@ from azure.core.pipeline import PipelineResponse
 from azure.core.utils import case_insensitive_dict
 from azure.core.tracing.decorator_async import distributed_trace_async
 
-from ...operations._operations import _SERIALIZER, _format_url_section
+from ...operations._operations import (
+    _SERIALIZER,
+    _format_url_section,
+    build_jobs_search_request,
+)
 from ._operations import (
     AuthOperations as AuthOperationsGenerated,
     JobsOperations as JobsOperationsGenerated,
@@ -39,7 +43,13 @@ def patch_sdk():
     """
 
 
-def build_token_request(vo: str, **kwargs: Any) -> HttpRequest:
+# Response header containing the cursor to use to get the next page of results
+NEXT_CURSOR_HEADER = "X-DiracX-Next-Cursor"
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def build_token_request(**kwargs: Any) -> HttpRequest:
     _headers = case_insensitive_dict(kwargs.pop("headers", {}) or {})
 
     accept = _headers.pop("Accept", "application/json")
@@ -53,19 +63,58 @@ def build_token_request(vo: str, **kwargs: Any) -> HttpRequest:
     return HttpRequest(method="POST", url=_url, headers=_headers, **kwargs)
 
 
+def build_jobs_export_request(*, format: str = "arrow", **kwargs: Any) -> HttpRequest:
+    _headers = case_insensitive_dict(kwargs.pop("headers", {}) or {})
+    _params = case_insensitive_dict(kwargs.pop("params", {}) or {})
+
+    # Construct URL
+    _url = "/jobs/export"
+
+    # Construct parameters
+    _params["format"] = _SERIALIZER.query("format", format, "str")
+
+    # Construct headers
+    _headers["Content-Type"] = _SERIALIZER.header(
+        "content_type", "application/json", "str"
+    )
+
+    return HttpRequest(
+        method="POST", url=_url, params=_params, headers=_headers, **kwargs
+    )
+
+
 class AuthOperations(AuthOperationsGenerated):
     @distributed_trace_async
     async def token(
         self, vo: str, device_code: str, client_id: str, **kwargs
     ) -> _models.TokenResponse | _models.DeviceFlowErrorResponse:
-        request = build_token_request(
-            vo=vo,
-            data={
+        return await self._token(
+            {
                 "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
                 "device_code": device_code,
                 "client_id": client_id,
             },
+            **kwargs,
+        )
+
+    @distributed_trace_async
+    async def refresh(
+        self, refresh_token: str, client_id: str, **kwargs
+    ) -> _models.TokenResponse | _models.DeviceFlowErrorResponse:
+        """Exchange a refresh token for a new access and refresh token"""
+        return await self._token(
+            {
+                "grant_type": "refresh_token",
+                "refresh_token": refresh_token,
+                "client_id": client_id,
+            },
+            **kwargs,
         )
+
+    async def _token(
+        self, data: dict[str, str], **kwargs
+    ) -> _models.TokenResponse | _models.DeviceFlowErrorResponse:
+        request = build_token_request(data=data)
         request.url = self._client.format_url(request.url)
 
         _stream = False
@@ -86,6 +135,10 @@ class AuthOperations(AuthOperationsGenerated):
             raise HttpResponseError(response=response)
 
 
+def _with_next_cursor(pipeline_response: PipelineResponse, deserialized, headers):
+    return deserialized, pipeline_response.http_response.headers.get(NEXT_CURSOR_HEADER)
+
+
 class JobsOperations(JobsOperationsGenerated):
     @distributed_trace_async
     async def search(  # type: ignore[override]
@@ -94,6 +147,9 @@ class JobsOperations(JobsOperationsGenerated):
         parameters: list[str] | None = None,
         search: list[str] | None = None,
         sort: list[str] | None = None,
+        per_page: int = 100,
+        cursor: str | None = None,
+        total: str | None = None,
         **kwargs: Any,
     ) -> List[JSON]:
         """TODO"""
@@ -107,7 +163,122 @@ class JobsOperations(JobsOperationsGenerated):
         # TODO: The BytesIO here is only needed to satify the typing
         # Probably an autorest bug
         body_data = io.BytesIO(json.dumps(body).encode("utf-8"))
-        return await super().search(body_data, **kwargs)
+        return await super().search(
+            body_data, per_page=per_page, cursor=cursor, total=total, **kwargs
+        )
+
+    async def search_pages(self, **kwargs: Any) -> AsyncIterator[List[JSON]]:
+        """Iterate over the pages of a search by following the cursor
+
+        Accepts the same arguments as :meth:`search`.
+        """
+        cursor = kwargs.pop("cursor", None)
+        while True:
+            jobs, cursor = await self.search(
+                cursor=cursor, cls=_with_next_cursor, **kwargs
+            )
+            yield jobs
+            if cursor is None:
+                break
+
+    async def search_stream(
+        self,
+        *,
+        parameters: list[str] | None = None,
+        search: list[str] | None = None,
+        sort: list[str] | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[JSON]:
+        """Stream all the jobs matching a search, one at a time
+
+        The server sends the results as newline delimited JSON so they are
+        never all held in memory at once.
+        """
+        body = {}
+        if parameters is not None:
+            body["parameters"] = parameters
+        if search is not None:
+            body["search"] = search
+        if sort is not None:
+            body["sort"] = sort
+
+        _headers = case_insensitive_dict(kwargs.pop("headers", {}) or {})
+        _headers["Accept"] = NDJSON_MEDIA_TYPE
+        request = build_jobs_search_request(
+            content_type="application/json", json=body, headers=_headers
+        )
+        request.url = self._client.format_url(request.url)
+
+        pipeline_response: PipelineResponse = (
+            await self._client._pipeline.run(  # pylint: disable=protected-access
+                request, stream=True, **kwargs
+            )
+        )
+        response = pipeline_response.http_response
+        try:
+            if response.status_code != 200:
+                await response.read()
+                map_error(
+                    status_code=response.status_code, response=response, error_map={}
+                )
+                raise HttpResponseError(response=response)
+
+            buffer = b""
+            async for chunk in response.iter_bytes():
+                *lines, buffer = (buffer + chunk).split(b"\n")
+                for line in lines:
+                    if line:
+                        yield json.loads(line)
+            if buffer.strip():
+                yield json.loads(buffer)
+        finally:
+            await response.close()
+
+    async def export(
+        self,
+        *,
+        format: str = "arrow",
+        parameters: list[str] | None = None,
+        search: list[str] | None = None,
+        sort: list[str] | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[bytes]:
+        """Export all the jobs matching a search as Arrow IPC stream or Parquet
+
+        The bytes are yielded as they are received so they can be written to
+        a file without holding the whole export in memory.
+        """
+        body = {}
+        if parameters is not None:
+            body["parameters"] = parameters
+        if search is not None:
+            body["search"] = search
+        if sort is not None:
+            body["sort"] = sort
+
+        request = build_jobs_export_request(
+            format=format, json=body, headers=kwargs.pop("headers", None)
+        )
+        request.url = self._client.format_url(request.url)
+
+        pipeline_response: PipelineResponse = (
+            await self._client._pipeline.run(  # pylint: disable=protected-access
+                request, stream=True, **kwargs
+            )
+        )
+        response = pipeline_response.http_response
+        try:
+            if response.status_code != 200:
+                await response.read()
+                map_error(
+                    status_code=response.status_code, response=response, error_map={}
+                )
+                raise HttpResponseError(response=response)
+
+            async for chunk in response.iter_bytes():
+                yield chunk
+        finally:
+            await response.close()
 
     @distributed_trace_async
     async def summary(  # type: ignore[override]
@@ -31,6 +31,7 @@ from ._enums import Enum7
 from ._enums import Enum8
 from ._enums import JobStatus
 from ._enums import ScalarSearchOperator
+from ._enums import TotalCountMode
 from ._enums import VectorSearchOperator
 from ._patch import __all__ as _patch_all
 from ._patch import *  # pylint: disable=unused-wildcard-import
@@ -63,6 +64,7 @@ __all__ = [
     "Enum8",
     "JobStatus",
     "ScalarSearchOperator",
+    "TotalCountMode",
     "VectorSearchOperator",
 ]
 __all__.extend([p for p in _patch_all if p not in __all__])
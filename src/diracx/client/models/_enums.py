@@ -43,7 +43,7 @@ class Enum7(str, Enum, metaclass=CaseInsensitiveEnumMeta):
 class Enum8(str, Enum, metaclass=CaseInsensitiveEnumMeta):
     """Enum8."""
 
-    DSC = "dsc"
+    DESC = "desc"
 
 
 class JobStatus(str, Enum, metaclass=CaseInsensitiveEnumMeta):
@@ -55,6 +55,16 @@ class JobStatus(str, Enum, metaclass=CaseInsensitiveEnumMeta):
     FAILED = "Failed"
     RECEIVED = "RECEIVED"
     SUBMITTING = "Submitting"
+    CHECKING = "Checking"
+    STAGING = "Staging"
+    SCOUTING = "Scouting"
+    WAITING = "Waiting"
+    MATCHED = "Matched"
+    RESCHEDULED = "Rescheduled"
+    COMPLETING = "Completing"
+    DONE = "Done"
+    COMPLETED = "Completed"
+    DELETED = "Deleted"
 
 
 class ScalarSearchOperator(str, Enum, metaclass=CaseInsensitiveEnumMeta):
@@ -67,6 +77,14 @@ class ScalarSearchOperator(str, Enum, metaclass=CaseInsensitiveEnumMeta):
     LIKE = "like"
 
 
+class TotalCountMode(str, Enum, metaclass=CaseInsensitiveEnumMeta):
+    """How the total number of results of a search is counted."""
+
+    EXACT = "exact"
+    CAPPED = "capped"
+    ESTIMATED = "estimated"
+
+
 class VectorSearchOperator(str, Enum, metaclass=CaseInsensitiveEnumMeta):
     """An enumeration."""
 
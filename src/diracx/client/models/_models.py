@@ -33,6 +33,8 @@ class BodyAuthToken(_serialization.Model):
     :ivar code_verifier: Verifier for the code challenge for the OAuth2 authorization flow with
      PKCE.
     :vartype code_verifier: str
+    :ivar refresh_token: Refresh token for the OAuth2 refresh token grant.
+    :vartype refresh_token: str
     """
 
     _validation = {
@@ -47,6 +49,7 @@ class BodyAuthToken(_serialization.Model):
         "code": {"key": "code", "type": "str"},
         "redirect_uri": {"key": "redirect_uri", "type": "str"},
         "code_verifier": {"key": "code_verifier", "type": "str"},
+        "refresh_token": {"key": "refresh_token", "type": "str"},
     }
 
     def __init__(
@@ -58,6 +61,7 @@ class BodyAuthToken(_serialization.Model):
         code: Optional[str] = None,
         redirect_uri: Optional[str] = None,
         code_verifier: Optional[str] = None,
+        refresh_token: Optional[str] = None,
         **kwargs: Any
     ) -> None:
         """
@@ -74,6 +78,8 @@ class BodyAuthToken(_serialization.Model):
         :keyword code_verifier: Verifier for the code challenge for the OAuth2 authorization flow with
          PKCE.
         :paramtype code_verifier: str
+        :keyword refresh_token: Refresh token for the OAuth2 refresh token grant.
+        :paramtype refresh_token: str
         """
         super().__init__(**kwargs)
         self.grant_type = grant_type
@@ -82,6 +88,7 @@ class BodyAuthToken(_serialization.Model):
         self.code = code
         self.redirect_uri = redirect_uri
         self.code_verifier = code_verifier
+        self.refresh_token = refresh_token
 
 
 class BodyAuthTokenGrantType(_serialization.Model):
@@ -293,9 +300,8 @@ class JobStatusReturn(_serialization.Model):
 
     :ivar job_id: Job Id. Required.
     :vartype job_id: int
-    :ivar status: An enumeration. Required. Known values are: "Running", "Stalled", "Killed",
-     "Failed", "RECEIVED", and "Submitting".
-    :vartype status: str or ~client.models.JobStatus
+    :ivar status: Status. Required.
+    :vartype status: str
     """
 
     _validation = {
@@ -308,15 +314,12 @@ class JobStatusReturn(_serialization.Model):
         "status": {"key": "status", "type": "str"},
     }
 
-    def __init__(
-        self, *, job_id: int, status: Union[str, "_models.JobStatus"], **kwargs: Any
-    ) -> None:
+    def __init__(self, *, job_id: int, status: str, **kwargs: Any) -> None:
         """
         :keyword job_id: Job Id. Required.
         :paramtype job_id: int
-        :keyword status: An enumeration. Required. Known values are: "Running", "Stalled", "Killed",
-         "Failed", "RECEIVED", and "Submitting".
-        :paramtype status: str or ~client.models.JobStatus
+        :keyword status: Status. Required.
+        :paramtype status: str
         """
         super().__init__(**kwargs)
         self.job_id = job_id
@@ -333,6 +336,8 @@ class JobStatusUpdate(_serialization.Model):
     :ivar status: An enumeration. Required. Known values are: "Running", "Stalled", "Killed",
      "Failed", "RECEIVED", and "Submitting".
     :vartype status: str or ~client.models.JobStatus
+    :ivar minor_status: Minor Status.
+    :vartype minor_status: str
     """
 
     _validation = {
@@ -343,10 +348,16 @@ class JobStatusUpdate(_serialization.Model):
     _attribute_map = {
         "job_id": {"key": "job_id", "type": "int"},
         "status": {"key": "status", "type": "str"},
+        "minor_status": {"key": "minor_status", "type": "str"},
     }
 
     def __init__(
-        self, *, job_id: int, status: Union[str, "_models.JobStatus"], **kwargs: Any
+        self,
+        *,
+        job_id: int,
+        status: Union[str, "_models.JobStatus"],
+        minor_status: Optional[str] = None,
+        **kwargs: Any
     ) -> None:
         """
         :keyword job_id: Job Id. Required.
@@ -354,10 +365,13 @@ class JobStatusUpdate(_serialization.Model):
         :keyword status: An enumeration. Required. Known values are: "Running", "Stalled", "Killed",
          "Failed", "RECEIVED", and "Submitting".
         :paramtype status: str or ~client.models.JobStatus
+        :keyword minor_status: Minor Status.
+        :paramtype minor_status: str
         """
         super().__init__(**kwargs)
         self.job_id = job_id
         self.status = status
+        self.minor_status = minor_status
 
 
 class JobSummaryParams(_serialization.Model):
@@ -511,6 +525,8 @@ class TokenResponse(_serialization.Model):
     :vartype access_token: str
     :ivar expires_in: Expires In. Required.
     :vartype expires_in: int
+    :ivar refresh_token: Refresh Token. Required.
+    :vartype refresh_token: str
     :ivar state: State. Required.
     :vartype state: str
     """
@@ -518,29 +534,40 @@ class TokenResponse(_serialization.Model):
     _validation = {
         "access_token": {"required": True},
         "expires_in": {"required": True},
+        "refresh_token": {"required": True},
         "state": {"required": True},
     }
 
     _attribute_map = {
         "access_token": {"key": "access_token", "type": "str"},
         "expires_in": {"key": "expires_in", "type": "int"},
+        "refresh_token": {"key": "refresh_token", "type": "str"},
         "state": {"key": "state", "type": "str"},
     }
 
     def __init__(
-        self, *, access_token: str, expires_in: int, state: str, **kwargs: Any
+        self,
+        *,
+        access_token: str,
+        expires_in: int,
+        refresh_token: str,
+        state: str,
+        **kwargs: Any
     ) -> None:
         """
         :keyword access_token: Access Token. Required.
         :paramtype access_token: str
         :keyword expires_in: Expires In. Required.
         :paramtype expires_in: int
+        :keyword refresh_token: Refresh Token. Required.
+        :paramtype refresh_token: str
         :keyword state: State. Required.
         :paramtype state: str
         """
         super().__init__(**kwargs)
         self.access_token = access_token
         self.expires_in = expires_in
+        self.refresh_token = refresh_token
         self.state = state
 
 
@@ -56,6 +56,22 @@ def build_well_known_openid_configuration_request(
     return HttpRequest(method="GET", url=_url, headers=_headers, **kwargs)
 
 
+def build_well_known_jwks_request(
+    **kwargs: Any,
+) -> HttpRequest:
+    _headers = case_insensitive_dict(kwargs.pop("headers", {}) or {})
+
+    accept = _headers.pop("Accept", "application/json")
+
+    # Construct URL
+    _url = "/.well-known/jwks.json"
+
+    # Construct headers
+    _headers["Accept"] = _SERIALIZER.header("accept", accept, "str")
+
+    return HttpRequest(method="GET", url=_url, headers=_headers, **kwargs)
+
+
 def build_auth_do_device_flow_request(*, user_code: str, **kwargs: Any) -> HttpRequest:
     _headers = case_insensitive_dict(kwargs.pop("headers", {}) or {})
     _params = case_insensitive_dict(kwargs.pop("params", {}) or {})
@@ -353,7 +369,11 @@ def build_jobs_get_single_job_status_request(job_id: int, **kwargs: Any) -> Http
 
 
 def build_jobs_set_single_job_status_request(
-    job_id: int, *, status: Union[str, _models.JobStatus], **kwargs: Any
+    job_id: int,
+    *,
+    status: Union[str, _models.JobStatus],
+    minor_status: Optional[str] = None,
+    **kwargs: Any,
 ) -> HttpRequest:
     _headers = case_insensitive_dict(kwargs.pop("headers", {}) or {})
     _params = case_insensitive_dict(kwargs.pop("params", {}) or {})
@@ -370,6 +390,8 @@ def build_jobs_set_single_job_status_request(
 
     # Construct parameters
     _params["status"] = _SERIALIZER.query("status", status, "str")
+    if minor_status is not None:
+        _params["minor_status"] = _SERIALIZER.query("minor_status", minor_status, "str")
 
     # Construct headers
     _headers["Accept"] = _SERIALIZER.header("accept", accept, "str")
@@ -445,7 +467,11 @@ def build_jobs_set_status_bulk_request(**kwargs: Any) -> HttpRequest:
 
 
 def build_jobs_search_request(
-    *, page: int = 0, per_page: int = 100, **kwargs: Any
+    *,
+    per_page: int = 100,
+    cursor: Optional[str] = None,
+    total: Optional[Union[str, _models.TotalCountMode]] = None,
+    **kwargs: Any,
 ) -> HttpRequest:
     _headers = case_insensitive_dict(kwargs.pop("headers", {}) or {})
     _params = case_insensitive_dict(kwargs.pop("params", {}) or {})
@@ -459,10 +485,14 @@ def build_jobs_search_request(
     _url = "/jobs/search"
 
     # Construct parameters
-    if page is not None:
-        _params["page"] = _SERIALIZER.query("page", page, "int")
     if per_page is not None:
-        _params["per_page"] = _SERIALIZER.query("per_page", per_page, "int")
+        _params["per_page"] = _SERIALIZER.query(
+            "per_page", per_page, "int", maximum=10000, minimum=1
+        )
+    if cursor is not None:
+        _params["cursor"] = _SERIALIZER.query("cursor", cursor, "str")
+    if total is not None:
+        _params["total"] = _SERIALIZER.query("total", total, "str")
 
     # Construct headers
     if content_type is not None:
@@ -569,6 +599,60 @@ class WellKnownOperations:
 
         return deserialized
 
+    @distributed_trace
+    def jwks(self, **kwargs: Any) -> Any:
+        """Jwks.
+
+        The public keys which DiracX tokens can be signed with.
+
+        This includes the retiring keys so tokens signed with them can still be
+        verified until they expire.
+
+        :return: any
+        :rtype: any
+        :raises ~azure.core.exceptions.HttpResponseError:
+        """
+        error_map = {
+            401: ClientAuthenticationError,
+            404: ResourceNotFoundError,
+            409: ResourceExistsError,
+            304: ResourceNotModifiedError,
+        }
+        error_map.update(kwargs.pop("error_map", {}) or {})
+
+        _headers = kwargs.pop("headers", {}) or {}
+        _params = kwargs.pop("params", {}) or {}
+
+        cls: ClsType[Any] = kwargs.pop("cls", None)
+
+        request = build_well_known_jwks_request(
+            headers=_headers,
+            params=_params,
+        )
+        request.url = self._client.format_url(request.url)
+
+        _stream = False
+        pipeline_response: PipelineResponse = (
+            self._client._pipeline.run(  # pylint: disable=protected-access
+                request, stream=_stream, **kwargs
+            )
+        )
+
+        response = pipeline_response.http_response
+
+        if response.status_code not in [200]:
+            map_error(
+                status_code=response.status_code, response=response, error_map=error_map
+            )
+            raise HttpResponseError(response=response)
+
+        deserialized = self._deserialize("object", pipeline_response)
+
+        if cls:
+            return cls(pipeline_response, deserialized, {})
+
+        return deserialized
+
 
 class AuthOperations:
     """
@@ -1424,17 +1508,15 @@ class JobsOperations:
         return deserialized
 
     @distributed_trace
-    def get_single_job_status(
-        self, job_id: int, **kwargs: Any
-    ) -> Union[str, _models.JobStatus]:
+    def get_single_job_status(self, job_id: int, **kwargs: Any) -> str:
         """Get Single Job Status.
 
         Get Single Job Status.
 
         :param job_id: Required.
         :type job_id: int
-        :return: JobStatus
-        :rtype: str or ~client.models.JobStatus
+        :return: str
+        :rtype: str
         :raises ~azure.core.exceptions.HttpResponseError:
         """
         error_map = {
@@ -1448,7 +1530,7 @@ class JobsOperations:
         _headers = kwargs.pop("headers", {}) or {}
         _params = kwargs.pop("params", {}) or {}
 
-        cls: ClsType[Union[str, _models.JobStatus]] = kwargs.pop("cls", None)
+        cls: ClsType[str] = kwargs.pop("cls", None)
 
         request = build_jobs_get_single_job_status_request(
             job_id=job_id,
@@ -1481,7 +1563,12 @@ class JobsOperations:
 
     @distributed_trace
     def set_single_job_status(
-        self, job_id: int, *, status: Union[str, _models.JobStatus], **kwargs: Any
+        self,
+        job_id: int,
+        *,
+        status: Union[str, _models.JobStatus],
+        minor_status: Optional[str] = None,
+        **kwargs: Any,
     ) -> Any:
         """Set Single Job Status.
 
@@ -1492,6 +1579,8 @@ class JobsOperations:
         :keyword status: Known values are: "Running", "Stalled", "Killed", "Failed", "RECEIVED", and
          "Submitting". Required.
         :paramtype status: str or ~client.models.JobStatus
+        :keyword minor_status: Default value is None.
+        :paramtype minor_status: str
         :return: any
         :rtype: any
         :raises ~azure.core.exceptions.HttpResponseError:
@@ -1512,6 +1601,7 @@ class JobsOperations:
         request = build_jobs_set_single_job_status_request(
             job_id=job_id,
             status=status,
+            minor_status=minor_status,
             headers=_headers,
             params=_params,
         )
@@ -1764,8 +1854,9 @@ class JobsOperations:
         self,
         body: Optional[_models.JobSearchParams] = None,
         *,
-        page: int = 0,
         per_page: int = 100,
+        cursor: Optional[str] = None,
+        total: Optional[Union[str, _models.TotalCountMode]] = None,
         content_type: str = "application/json",
         **kwargs: Any,
     ) -> List[JSON]:
@@ -1777,10 +1868,13 @@ class JobsOperations:
 
         :param body: Default value is None.
         :type body: ~client.models.JobSearchParams
-        :keyword page: Default value is 0.
-        :paramtype page: int
         :keyword per_page: Default value is 100.
         :paramtype per_page: int
+        :keyword cursor: Default value is None.
+        :paramtype cursor: str
+        :keyword total: Known values are: "exact", "capped", and "estimated". Default value is
+         None.
+        :paramtype total: str or ~client.models.TotalCountMode
         :keyword content_type: Body Parameter content-type. Content type parameter for JSON body.
          Default value is "application/json".
         :paramtype content_type: str
@@ -1794,8 +1888,9 @@ class JobsOperations:
         self,
         body: Optional[IO] = None,
         *,
-        page: int = 0,
         per_page: int = 100,
+        cursor: Optional[str] = None,
+        total: Optional[Union[str, _models.TotalCountMode]] = None,
         content_type: str = "application/json",
         **kwargs: Any,
     ) -> List[JSON]:
@@ -1807,10 +1902,13 @@ class JobsOperations:
 
         :param body: Default value is None.
         :type body: IO
-        :keyword page: Default value is 0.
-        :paramtype page: int
         :keyword per_page: Default value is 100.
         :paramtype per_page: int
+        :keyword cursor: Default value is None.
+        :paramtype cursor: str
+        :keyword total: Known values are: "exact", "capped", and "estimated". Default value is
+         None.
+        :paramtype total: str or ~client.models.TotalCountMode
         :keyword content_type: Body Parameter content-type. Content type parameter for binary body.
          Default value is "application/json".
         :paramtype content_type: str
@@ -1824,8 +1922,9 @@ class JobsOperations:
         self,
         body: Optional[Union[_models.JobSearchParams, IO]] = None,
         *,
-        page: int = 0,
         per_page: int = 100,
+        cursor: Optional[str] = None,
+        total: Optional[Union[str, _models.TotalCountMode]] = None,
         **kwargs: Any,
     ) -> List[JSON]:
         """Search.
@@ -1836,10 +1935,13 @@ class JobsOperations:
 
         :param body: Is either a JobSearchParams type or a IO type. Default value is None.
         :type body: ~client.models.JobSearchParams or IO
-        :keyword page: Default value is 0.
-        :paramtype page: int
         :keyword per_page: Default value is 100.
         :paramtype per_page: int
+        :keyword cursor: Default value is None.
+        :paramtype cursor: str
+        :keyword total: Known values are: "exact", "capped", and "estimated". Default value is
+         None.
+        :paramtype total: str or ~client.models.TotalCountMode
         :keyword content_type: Body Parameter content-type. Known values are: 'application/json'.
          Default value is None.
         :paramtype content_type: str
@@ -1875,8 +1977,9 @@ class JobsOperations:
                 _json = None
 
         request = build_jobs_search_request(
-            page=page,
             per_page=per_page,
+            cursor=cursor,
+            total=total,
             content_type=content_type,
             json=_json,
             content=_content,
@@ -36,3 +36,17 @@ class BadConfigurationVersion(ConfigurationError):
 
 class InvalidQueryError(DiracError):
     """It was not possible to build a valid database query from the given input"""
+
+
+class InvalidJDLError(DiracError):
+    """The description of a submitted job is not valid"""
+
+
+class JobNotFound(DiracError):
+    http_status_code = status.HTTP_404_NOT_FOUND
+
+
+class InvalidJobStatusTransition(DiracError):
+    """A job can't be moved to the requested status from its current one"""
+
+    http_status_code = status.HTTP_409_CONFLICT
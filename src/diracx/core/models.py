@@ -17,10 +17,34 @@ class VectorSearchOperator(str, Enum):
     NOT_IN = "not in"
 
 
+class TotalCountMode(str, Enum):
+    """How the total number of results of a search is counted"""
+
+    # Count all the matching rows
+    EXACT = "exact"
+    # Stop counting after a fixed number of rows
+    CAPPED = "capped"
+    # Use the statistics of the database if possible, else count up to a cap
+    ESTIMATED = "estimated"
+
+
+class ExportFormat(str, Enum):
+    # Arrow IPC streaming format
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+class CountAccuracy(str, Enum):
+    EXACT = "exact"
+    # There are at least this many results
+    LOWER_BOUND = "lower-bound"
+    ESTIMATE = "estimate"
+
+
 # TODO: TypedDict vs pydnatic?
 class SortSpec(TypedDict):
     parameter: str
-    direction: Literal["asc"] | Literal["dsc"]
+    direction: Literal["asc"] | Literal["desc"]
 
 
 class ScalarSearchSpec(TypedDict):
@@ -26,10 +26,16 @@ class SqlalchemyDsn(AnyUrl):
 
 class TokenSigningKey(SecretStr):
     jwk: JsonWebKey
+    #: Identifier of the key in the JWKS, its RFC 7638 thumbprint
+    kid: str
+    #: JWS algorithm used to sign tokens with this type of key
+    algorithm: str
 
     def __init__(self, data: str):
         super().__init__(data)
         self.jwk = JsonWebKey.import_key(self.get_secret_value())
+        self.kid = self.jwk.thumbprint()
+        self.algorithm = _signing_algorithm(self.jwk)
 
     @classmethod
     # TODO: This should return TokenSigningKey but pydantic's type hints are wrong
@@ -41,6 +47,28 @@ class TokenSigningKey(SecretStr):
         return super().validate(value)
 
 
+def _signing_algorithm(jwk: JsonWebKey) -> str:
+    """Find the JWS algorithm to use for a key from its type
+
+    RSA keys are the most expensive to verify, prefer Ed25519 or P-256 keys.
+    """
+    key = jwk.as_dict(is_private=False)
+    if key["kty"] == "RSA":
+        return "RS256"
+    algorithms = {
+        ("EC", "P-256"): "ES256",
+        ("EC", "P-384"): "ES384",
+        ("EC", "P-521"): "ES512",
+        ("OKP", "Ed25519"): "EdDSA",
+    }
+    try:
+        return algorithms[(key["kty"], key.get("crv"))]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported token signing key {key['kty']} {key.get('crv')}"
+        ) from None
+
+
 class LocalFileUrl(AnyUrl):
     host_required = False
     allowed_schemes = {"file"}
@@ -1,8 +1,16 @@
 from __future__ import annotations
 
+import asyncio
+import math
 import os
 import re
 from enum import Enum
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple, TypeVar
+from weakref import WeakValueDictionary
+
+from cachetools import TLRUCache
+
+T = TypeVar("T")
 
 
 class JobStatus(str, Enum):
@@ -12,6 +20,16 @@ class JobStatus(str, Enum):
     Failed = "Failed"
     RECEIVED = "RECEIVED"
     SUBMITTING = "Submitting"
+    CHECKING = "Checking"
+    STAGING = "Staging"
+    SCOUTING = "Scouting"
+    WAITING = "Waiting"
+    MATCHED = "Matched"
+    RESCHEDULED = "Rescheduled"
+    COMPLETING = "Completing"
+    DONE = "Done"
+    COMPLETED = "Completed"
+    DELETED = "Deleted"
 
 
 def dotenv_files_from_environment(prefix: str) -> list[str]:
@@ -21,3 +39,63 @@ def dotenv_files_from_environment(prefix: str) -> list[str]:
         if match := re.fullmatch(rf"{prefix}(?:_(\d+))?", key):
             env_files[int(match.group(1) or -1)] = value
     return [v for _, v in sorted(env_files.items())]
+
+
+class _CacheEntry(NamedTuple):
+    future: asyncio.Future
+    ttl: float
+
+
+def _entry_expiry(key: Hashable, entry: _CacheEntry, now: float) -> float:
+    # The TTL only starts once the result is available, entries are stored
+    # again when their computation completes
+    return now + entry.ttl if entry.future.done() else math.inf
+
+
+class SingleFlightCache:
+    """Size bounded LRU cache of coroutine results with a per entry TTL
+
+    Concurrent lookups of a key which isn't cached yet all wait for the
+    same computation instead of each starting their own. The TTL of a
+    result counts from when its computation completes. Failed computations
+    are not cached. Caches given a ``name`` are listed in :attr:`instances`
+    so their statistics can be exported.
+    """
+
+    instances: WeakValueDictionary[str, SingleFlightCache] = WeakValueDictionary()
+
+    def __init__(self, maxsize: int, name: str | None = None):
+        self._cache: TLRUCache = TLRUCache(maxsize=maxsize, ttu=_entry_expiry)
+        self.hits = 0
+        self.misses = 0
+        if name is not None:
+            SingleFlightCache.instances[name] = self
+
+    async def get(
+        self, key: Hashable, compute: Callable[[], Awaitable[T]], ttl: float
+    ) -> T:
+        if entry := self._cache.get(key):
+            self.hits += 1
+            future = entry.future
+        else:
+            self.misses += 1
+            future = asyncio.ensure_future(compute())
+            future.add_done_callback(lambda f: self._completed(key, f))
+            self._cache[key] = _CacheEntry(future, ttl)
+        # Don't cancel the computation if only one of the waiters is cancelled
+        return await asyncio.shield(future)
+
+    def _completed(self, key: Hashable, future: asyncio.Future[Any]) -> None:
+        entry = self._cache.get(key)
+        if entry is None or entry.future is not future:
+            # The cache was invalidated while the computation was running
+            return
+        if future.cancelled() or future.exception() is not None:
+            del self._cache[key]
+        else:
+            # Store the entry again so its expiry is computed from now
+            self._cache[key] = entry
+
+    def invalidate(self) -> None:
+        """Forget all the cached results, e.g. after the underlying data changed"""
+        self._cache.clear()
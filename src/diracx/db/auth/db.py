@@ -3,7 +3,7 @@ from __future__ import annotations
 import secrets
 from uuid import uuid4
 
-from sqlalchemy import insert, select, update
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.exc import IntegrityError
 
 from diracx.core.exceptions import (
@@ -13,7 +13,13 @@ from diracx.core.exceptions import (
 )
 
 from ..utils import BaseDB, substract_date
-from .schema import AuthorizationFlows, DeviceFlows, FlowStatus
+from .schema import (
+    AuthorizationFlows,
+    DeviceFlows,
+    FlowStatus,
+    RefreshTokens,
+    RefreshTokenStatus,
+)
 from .schema import Base as AuthDBBase
 
 # https://datatracker.ietf.org/doc/html/rfc8628#section-6.1
@@ -24,6 +30,8 @@ MAX_RETRY = 5
 class AuthDB(BaseDB):
     # This needs to be here for the BaseDB to create the engine
     metadata = AuthDBBase.metadata
+    # 2: Added the RefreshTokens table
+    schema_version = 2
 
     async def device_flow_validate_user_code(
         self, user_code: str, max_validity: int
@@ -41,7 +49,7 @@ class AuthDB(BaseDB):
             DeviceFlows.creation_time > substract_date(seconds=max_validity),
         )
 
-        return (await self.conn.execute(stmt)).scalar_one()
+        return (await self.ro_conn.execute(stmt)).scalar_one()
 
     async def get_device_flow(self, device_code: str, max_validity: int):
         """
@@ -211,3 +219,75 @@ class AuthDB(BaseDB):
             raise AuthorizationError("Code was already used")
 
         raise AuthorizationError("Bad state in authorization flow")
+
+    async def insert_refresh_token(
+        self, jti: str, sub: str, preferred_username: str, scope: str
+    ) -> None:
+        stmt = insert(RefreshTokens).values(
+            jti=jti,
+            sub=sub,
+            preferred_username=preferred_username,
+            scope=scope,
+        )
+        await self.conn.execute(stmt)
+
+    async def use_refresh_token(self, jti: str, max_validity: int):
+        """Revoke a refresh token so it can be exchanged for new tokens
+
+        Returns the refresh token as it was before it was used. If it had
+        already been used it may have been stolen so all the refresh tokens of
+        the user are revoked, the caller must check the status and refuse to
+        issue new tokens without failing the transaction.
+
+        :raises: AuthorizationError if no such token or it is expired
+        """
+        # The with_for_update
+        # prevents that the token is used
+        # multiple time concurrently
+        stmt = select(RefreshTokens).with_for_update()
+        stmt = stmt.where(
+            RefreshTokens.jti == jti,
+            RefreshTokens.creation_time > substract_date(seconds=max_validity),
+        )
+        row = (await self.conn.execute(stmt)).one_or_none()
+        if row is None:
+            raise AuthorizationError("Invalid refresh token")
+        res = dict(row._mapping)
+
+        if res["status"] == RefreshTokenStatus.CREATED:
+            await self.conn.execute(
+                update(RefreshTokens)
+                .where(RefreshTokens.jti == jti)
+                .values(status=RefreshTokenStatus.REVOKED)
+            )
+        else:
+            await self.revoke_user_refresh_tokens(res["sub"])
+
+        return res
+
+    async def revoke_user_refresh_tokens(self, sub: str) -> None:
+        """Revoke all the refresh tokens of a user"""
+        await self.conn.execute(
+            update(RefreshTokens)
+            .where(RefreshTokens.sub == sub)
+            .values(status=RefreshTokenStatus.REVOKED)
+        )
+
+    async def delete_expired_refresh_tokens(
+        self, max_validity: int, sub: str | None = None
+    ) -> int:
+        """Delete the refresh tokens which expired, optionally only those of ``sub``
+
+        Revoked tokens are kept until they expire so their reuse is detected.
+        New tokens are issued by exchanging an older one so the expired tokens
+        of a user are deleted each time they get new ones, the tokens of users
+        who don't come back are deleted by ``dirac internal purge-refresh-tokens``.
+
+        Returns the number of deleted tokens.
+        """
+        stmt = delete(RefreshTokens).where(
+            RefreshTokens.creation_time < substract_date(seconds=max_validity)
+        )
+        if sub is not None:
+            stmt = stmt.where(RefreshTokens.sub == sub)
+        return (await self.conn.execute(stmt)).rowcount
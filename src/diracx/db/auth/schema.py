@@ -63,3 +63,33 @@ class AuthorizationFlows(Base):
     redirect_uri = Column(String(255))
     code = NullColumn(String(255))  # hash it ?
     id_token = NullColumn(JSON())
+
+
+class RefreshTokenStatus(Enum):
+    """
+    A refresh token can only be used once, using it REVOKES it
+    and a new one is issued
+    """
+
+    # The token can be used to get new tokens
+    CREATED = auto()
+    # The token was used or revoked
+    REVOKED = auto()
+
+
+class RefreshTokens(Base):
+    """Refresh tokens which were issued, identified by the ``jti`` of the JWT
+
+    The tokens themselves are signed so only what is needed to revoke them
+    and to issue new access tokens is stored.
+    """
+
+    __tablename__ = "RefreshTokens"
+    jti = Column(Uuid(as_uuid=False), primary_key=True)
+    status = EnumColumn(
+        RefreshTokenStatus, server_default=RefreshTokenStatus.CREATED.name
+    )
+    creation_time = DateNowColumn()
+    scope = Column(String(1024))
+    sub = Column(String(256), index=True)
+    preferred_username = Column(String(255))
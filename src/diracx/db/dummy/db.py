@@ -26,13 +26,15 @@ class DummyDB(BaseDB):
         columns = [Cars.__table__.columns[x] for x in group_by]
 
         stmt = select(*columns, func.count(Cars.licensePlate).label("count"))
-        stmt = apply_search_filters(Cars.__table__, stmt, search)
+        stmt, params = await apply_search_filters(
+            self.conn, Cars.__table__, stmt, search
+        )
         stmt = stmt.group_by(*columns)
 
         # Execute the query
         return [
             dict(row._mapping)
-            async for row in (await self.conn.stream(stmt))
+            async for row in (await self.conn.stream(stmt, params))
             if row.count > 0  # type: ignore
         ]
 
@@ -1,81 +1,365 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
-from typing import Any
-
-from sqlalchemy import func, insert, select, update
+from functools import lru_cache
+from typing import Any, AsyncIterator
+from uuid import uuid4
+
+from sqlalchemy import (
+    Integer,
+    bindparam,
+    case,
+    cast,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
 
 from diracx.core.exceptions import InvalidQueryError
-from diracx.core.utils import JobStatus
-
-from ..utils import BaseDB, apply_search_filters
+from diracx.core.models import CountAccuracy, TotalCountMode
+
+from ..utils import (
+    SEARCH_FILTERS_CACHE_SIZE,
+    BaseDB,
+    DBSettings,
+    apply_keyset_pagination,
+    decode_cursor,
+    encode_cursor,
+    explain,
+    load_search_values,
+    ordering_uses_index,
+    plan_search,
+    search_filters,
+    search_params,
+    search_shape,
+    utcnow,
+)
+from .jdl import prepare_job
 from .schema import Base as JobDBBase
-from .schema import InputData, JobJDLs, Jobs
+from .schema import InputData, JobCounts, JobJDLs, Jobs
+from .status import is_allowed_transition
+
+JOB_COUNTS_KEYS = [c.name for c in JobCounts.__table__.primary_key.columns]
+
+# Number of processes used to prepare the JDL of new jobs in each server worker
+DEFAULT_JDL_PROCESSES = 2
+
+
+def _search_columns(parameters):
+    """Find which columns to select"""
+    columns = [x for x in Jobs.__table__.columns]
+    if parameters:
+        if unrecognised_parameters := set(parameters) - set(
+            Jobs.__table__.columns.keys()
+        ):
+            raise InvalidQueryError(
+                f"Unrecognised parameters requested {unrecognised_parameters}"
+            )
+        columns = [c for c in columns if c.name in parameters]
+    return columns
+
+
+def _search_ordering(sorts, search):
+    """Convert sort constraints to (column, direction) pairs
+
+    JobID is always used last to make the ordering total. Orderings which
+    can't be served by walking one of the indexes of the Jobs table are
+    rejected as they would require sorting the full result in the DB.
+    """
+    ordering = []
+    for sort in sorts:
+        if sort["parameter"] not in Jobs.__table__.columns:
+            raise InvalidQueryError(f"Unknown sort parameter {sort['parameter']!r}")
+        column = Jobs.__table__.columns[sort["parameter"]]
+        if sort["direction"] not in ("asc", "desc"):
+            raise InvalidQueryError(f"Unknown sort {sort['direction']=}")
+        if column.name in {c.name for c, _ in ordering}:
+            raise InvalidQueryError(f"Cannot sort by {column.name} more than once")
+        ordering.append((column, sort["direction"]))
+    if "JobID" not in {c.name for c, _ in ordering}:
+        # Follow the last direction so an index can still be used
+        direction = ordering[-1][1] if ordering else "asc"
+        ordering.append((Jobs.__table__.columns["JobID"], direction))
+
+    if not ordering_uses_index(Jobs.__table__, ordering, search):
+        raise InvalidQueryError(
+            f"Sorting by {[f'{c.name} {d}' for c, d in ordering]} is not "
+            "supported by any index"
+        )
+    return ordering
+
+
+def _summary_table(group_by, search):
+    """Answer from the JobCounts rollup if it has all the needed columns"""
+    needed = set(group_by) | {query["parameter"] for query in search}
+    return JobCounts.__table__ if needed <= set(JOB_COUNTS_KEYS) else Jobs.__table__
+
+
+@lru_cache(maxsize=SEARCH_FILTERS_CACHE_SIZE)
+def _summary_statement(
+    table, group_by: tuple[str, ...], shape: tuple[tuple[str, str], ...]
+):
+    """Build the statement of a summary, see :func:`search_filters`"""
+    columns = [table.columns[x] for x in group_by]
+    if table is JobCounts.__table__:
+        count = cast(func.sum(JobCounts.Count), Integer).label("count")
+    else:
+        count = func.count(Jobs.JobID).label("count")
+    stmt = select(*columns, count).where(*search_filters(table, shape))
+    return stmt.group_by(*columns)
+
+
+@lru_cache(maxsize=SEARCH_FILTERS_CACHE_SIZE)
+def _search_statement(
+    parameters: tuple[str, ...] | None,
+    shape: tuple[tuple[str, str], ...],
+    sorts: tuple[tuple[str, str], ...],
+    paginated: bool,
+):
+    """Build the statement of a search, see :func:`search_filters`
+
+    Returns the ordered statement, the ordering and the columns which were
+    only selected because they are needed by the pagination cursor.
+    """
+    columns = _search_columns(parameters)
+    ordering = _search_ordering(
+        [{"parameter": p, "direction": d} for p, d in sorts],
+        [{"parameter": p, "operator": o} for p, o in shape],
+    )
+    # The columns used by the cursor must always be selected
+    selected = {c.name for c in columns}
+    extra_columns = [c for c, _ in ordering if c.name not in selected]
+    if not paginated:
+        extra_columns = []
+    stmt = select(*columns, *extra_columns)
+    stmt = stmt.where(*search_filters(Jobs.__table__, shape))
+    stmt = stmt.order_by(*_order_by(ordering))
+    return stmt, ordering, extra_columns
+
+
+@lru_cache(maxsize=SEARCH_FILTERS_CACHE_SIZE)
+def _matching_jobs_statement(shape: tuple[tuple[str, str], ...]):
+    """Select the IDs of the jobs matching a search, see :func:`search_filters`"""
+    return select(Jobs.JobID).where(*search_filters(Jobs.__table__, shape))
+
+
+def _search_key(parameters, search, sorts, paginated):
+    return (
+        tuple(parameters) if parameters else None,
+        search_shape(search),
+        tuple((sort["parameter"], sort["direction"]) for sort in sorts),
+        paginated,
+    )
+
+
+def _job_counts_key(job_attrs: dict[str, Any]) -> dict[str, Any]:
+    """Find the JobCounts key of a job, taking the column defaults into account"""
+    return {
+        x: job_attrs[x]
+        if x in job_attrs
+        else Jobs.__table__.columns[x].default.arg  # type: ignore[union-attr]
+        for x in JOB_COUNTS_KEYS
+    }
+
+
+def _rebuild_job_counts_statements():
+    columns = [Jobs.__table__.columns[x] for x in JOB_COUNTS_KEYS]
+    return [
+        delete(JobCounts),
+        insert(JobCounts).from_select(
+            [*JOB_COUNTS_KEYS, "Count"],
+            select(*columns, func.count(Jobs.JobID)).group_by(*columns),
+        ),
+    ]
+
+
+def _order_by(ordering):
+    return [c.asc() if direction == "asc" else c.desc() for c, direction in ordering]
 
 
 class JobDB(BaseDB):
     # This needs to be here for the BaseDB to create the engine
     metadata = JobDBBase.metadata
+    obsolete_indexes = {"Jobs": ["JobType"]}
 
     # TODO: this is copied from the DIRAC JobDB
     # but is overwriten in LHCbDIRAC, so we need
     # to find a way to make it dynamic
     jdl2DBParameters = ["JobName", "JobType", "JobGroup"]
 
-    async def summary(self, group_by, search) -> list[dict[str, str | int]]:
-        columns = [Jobs.__table__.columns[x] for x in group_by]
+    def __init__(
+        self,
+        db_url: str,
+        settings: DBSettings | None = None,
+        read_only_urls: list[str] | None = None,
+    ) -> None:
+        super().__init__(db_url, settings, read_only_urls)
+        self._jdl_executor: ProcessPoolExecutor | None = None
+
+    @contextlib.asynccontextmanager
+    async def engine_context(self, *, check_schema: bool = True) -> AsyncIterator[None]:
+        """Also manage the process pool used to prepare the JDL of new jobs
+
+        The number of processes is taken from ``DIRACX_JOBDB_JDL_PROCESSES``
+        and defaults to :data:`DEFAULT_JDL_PROCESSES`. Each of them imports
+        DIRAC and there is a pool per server worker so it is kept small.
+        """
+        max_workers = int(
+            os.environ.get("DIRACX_JOBDB_JDL_PROCESSES", DEFAULT_JDL_PROCESSES)
+        )
+        with ProcessPoolExecutor(
+            max_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as self._jdl_executor:
+            async with super().engine_context(check_schema=check_schema):
+                yield
+        self._jdl_executor = None
 
-        stmt = select(*columns, func.count(Jobs.JobID).label("count"))
-        stmt = apply_search_filters(Jobs.__table__, stmt, search)
-        stmt = stmt.group_by(*columns)
+    async def summary(self, group_by, search) -> list[dict[str, str | int]]:
+        if unrecognised_parameters := set(group_by) - set(
+            Jobs.__table__.columns.keys()
+        ):
+            raise InvalidQueryError(
+                f"Unrecognised grouping requested {unrecognised_parameters}"
+            )
+        search = plan_search(Jobs.__table__, search)
+
+        table = _summary_table(group_by, search)
+        await load_search_values(self.ro_conn, table, search)
+        stmt = _summary_statement(table, tuple(group_by), search_shape(search))
 
         # Execute the query
         return [
             dict(row._mapping)
-            async for row in (await self.conn.stream(stmt))
+            async for row in (await self.ro_conn.stream(stmt, search_params(search)))
             if row.count > 0  # type: ignore
         ]
 
     async def search(
-        self, parameters, search, sorts, *, per_page: int = 100, page: int | None = None
-    ) -> list[dict[str, Any]]:
-        # Find which columns to select
-        columns = [x for x in Jobs.__table__.columns]
-        if parameters:
-            if unrecognised_parameters := set(parameters) - set(
-                Jobs.__table__.columns.keys()
-            ):
-                raise InvalidQueryError(
-                    f"Unrecognised parameters requested {unrecognised_parameters}"
-                )
-            columns = [c for c in columns if c.name in parameters]
-        stmt = select(*columns)
-
-        stmt = apply_search_filters(Jobs.__table__, stmt, search)
-
-        # Apply any sort constraints
-        for sort in sorts:
-            column = Jobs.__table__.columns[sort["parameter"]]
-            if sort["direction"] == "asc":
-                column = column.asc()
-            elif sort["direction"] == "desc":
-                column = column.desc()
-            else:
-                raise InvalidQueryError(f"Unknown sort {sort['direction']=}")
+        self,
+        parameters,
+        search,
+        sorts,
+        *,
+        per_page: int = 100,
+        cursor: str | None = None,
+    ) -> tuple[list[dict[str, Any]], str | None]:
+        """Search for jobs, one page at a time
+
+        Returns the matching rows together with an opaque cursor which can be
+        passed back to get the next page, or None if this was the last page.
+        Pagination is keyset based so the cost of a page does not depend on
+        how far into the results it is.
+        """
+        if per_page < 1:
+            raise InvalidQueryError(f"per_page must be positive, got {per_page}")
+        search = plan_search(Jobs.__table__, search)
+
+        stmt, ordering, extra_columns = _search_statement(
+            *_search_key(parameters, search, sorts, paginated=True)
+        )
 
         # Apply pagination
-        if page:
-            raise NotImplementedError("TODO Not yet implemented")
+        if cursor is not None:
+            stmt = apply_keyset_pagination(
+                stmt, ordering, decode_cursor(ordering, cursor)
+            )
+        # Fetch one extra row to know if there is a next page
+        stmt = stmt.limit(per_page + 1)
+        await load_search_values(self.ro_conn, Jobs.__table__, search)
 
         # Execute the query
-        return [dict(row._mapping) async for row in (await self.conn.stream(stmt))]
-
-    async def _insertNewJDL(self, jdl) -> int:
-        from DIRAC.WorkloadManagementSystem.DB.JobDBUtils import compressJDL
+        result = await self.ro_conn.stream(stmt, search_params(search))
+        rows = [dict(row._mapping) async for row in result]
+        next_cursor = None
+        if len(rows) > per_page:
+            rows = rows[:per_page]
+            next_cursor = encode_cursor(ordering, rows[-1])
+        for row in rows:
+            for column in extra_columns:
+                row.pop(column.name)
+        return rows, next_cursor
+
+    async def search_stream(
+        self, parameters, search, sorts, *, batch_size: int = 1000
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Stream all the jobs matching a search in batches of ``batch_size``
+
+        Unlike :meth:`search` this is not paginated, the rows are fetched
+        from a server side cursor so memory usage doesn't depend on the
+        number of results. The query is validated and executed when awaiting
+        so errors are raised before any row is returned.
+        """
+        search = plan_search(Jobs.__table__, search)
+        stmt, _, _ = _search_statement(
+            *_search_key(parameters, search, sorts, paginated=False)
+        )
+        stmt = stmt.execution_options(yield_per=batch_size)
+        await load_search_values(self.ro_conn, Jobs.__table__, search)
 
-        stmt = insert(JobJDLs).values(
-            JDL="", JobRequirements="", OriginalJDL=compressJDL(jdl)
+        result = await self.ro_conn.stream(stmt, search_params(search))
+        return (
+            [dict(row._mapping) for row in partition]
+            async for partition in result.partitions()
         )
+
+    @staticmethod
+    def search_column_types(parameters) -> dict[str, type]:
+        """The Python type of each of the columns returned by a search"""
+        return {c.name: c.type.python_type for c in _search_columns(parameters)}
+
+    async def count(
+        self, search, mode: TotalCountMode, *, cap: int = 10_000
+    ) -> tuple[int, CountAccuracy]:
+        """Count the jobs matching a search
+
+        Searches which can be answered from the JobCounts rollup are always
+        counted exactly as it is cheap. Otherwise in ``capped`` mode at most
+        ``cap + 1`` rows are counted and in ``estimated`` mode the estimate
+        of the query planner is used if the database provides one, falling
+        back to the ``capped`` mode.
+        """
+        search = plan_search(Jobs.__table__, search)
+        table = _summary_table([], search)
+        await load_search_values(self.ro_conn, table, search)
+        shape = search_shape(search)
+        params = search_params(search)
+
+        if mode == TotalCountMode.EXACT or table is JobCounts.__table__:
+            stmt = _summary_statement(table, (), shape)
+            count = (await self.ro_conn.execute(stmt, params)).scalar_one()
+            return count or 0, CountAccuracy.EXACT
+
+        if mode == TotalCountMode.ESTIMATED and self.ro_conn.dialect.name == "mysql":
+            return await self._estimate_count(shape, params), CountAccuracy.ESTIMATE
+
+        matching = _matching_jobs_statement(shape).limit(cap + 1).subquery()
+        stmt = select(func.count()).select_from(matching)
+        count = (await self.ro_conn.execute(stmt, params)).scalar_one()
+        if count > cap:
+            return cap, CountAccuracy.LOWER_BOUND
+        return count, CountAccuracy.EXACT
+
+    async def _estimate_count(self, shape, params) -> int:
+        """Use the row estimate of MySQL's query plan"""
+        stmt = explain(_matching_jobs_statement(shape))
+        plan = (await self.ro_conn.execute(stmt, params)).mappings().all()
+        row = next(row for row in plan if row["table"] == Jobs.__tablename__)
+        return int(row["rows"] * (row["filtered"] or 100) / 100)
+
+    async def _insertNewJDL(self) -> int:
+        """Allocate a JobID by inserting an empty JobJDLs row"""
+        stmt = insert(JobJDLs).values(JDL="", JobRequirements="", OriginalJDL="")
         result = await self.conn.execute(stmt)
         # await self.engine.commit()
         return result.lastrowid
@@ -83,6 +367,48 @@ class JobDB(BaseDB):
     async def _insertJob(self, jobData: dict[str, Any]):
         stmt = insert(Jobs).values(jobData)
         await self.conn.execute(stmt)
+        await self._update_job_counts((_job_counts_key(jobData), 1))
+
+    async def _update_job_counts(self, *changes: tuple[dict[str, Any], int]):
+        """Add a delta to the number of jobs in the JobCounts rollup
+
+        Each change is a ``(key, delta)`` pair, all of them are applied with
+        a single statement.
+        """
+        values = [key | {"Count": delta} for key, delta in changes]
+        if not values:
+            return
+        if self.conn.dialect.name == "mysql":
+            mysql_stmt = mysql_insert(JobCounts)
+            await self.conn.execute(
+                mysql_stmt.on_duplicate_key_update(
+                    Count=JobCounts.Count + mysql_stmt.inserted.Count
+                ),
+                values,
+            )
+        else:
+            sqlite_stmt = sqlite_insert(JobCounts)
+            await self.conn.execute(
+                sqlite_stmt.on_conflict_do_update(
+                    index_elements=JOB_COUNTS_KEYS,
+                    set_={"Count": JobCounts.Count + sqlite_stmt.excluded.Count},
+                ),
+                values,
+            )
+
+    async def rebuild_job_counts(self):
+        """Recompute the JobCounts rollup from the content of the Jobs table
+
+        This is done by :meth:`upgrade` when the rollup is created on an
+        existing DB, it is only needed again if the rollup was corrupted.
+        """
+        for stmt in _rebuild_job_counts_statements():
+            await self.conn.execute(stmt)
+
+    def _fill_new_tables(self, conn: Connection, new_tables: set[str]) -> None:
+        if JobCounts.__tablename__ in new_tables:
+            for stmt in _rebuild_job_counts_statements():
+                conn.execute(stmt)
 
     async def _insertInputData(self, job_id: int, lfns: list[str]):
         stmt = insert(InputData).values([{"JobID": job_id, "LFN": lfn} for lfn in lfns])
@@ -94,48 +420,105 @@ class JobDB(BaseDB):
         """
         if "Status" in jobData:
             jobData = jobData | {"LastUpdateTime": datetime.now(tz=timezone.utc)}
+
+        old_key = None
+        if set(jobData) & set(JOB_COUNTS_KEYS):
+            columns = [Jobs.__table__.columns[x] for x in JOB_COUNTS_KEYS]
+            stmt = select(*columns).where(Jobs.JobID == job_id).with_for_update()
+            if row := (await self.conn.execute(stmt)).one_or_none():
+                old_key = dict(row._mapping)
+
         stmt = update(Jobs).where(Jobs.JobID == job_id).values(jobData)
         await self.conn.execute(stmt)
 
-    async def _checkAndPrepareJob(
-        self,
-        jobID,
-        class_ad_job,
-        class_ad_req,
-        owner,
-        owner_dn,
-        owner_group,
-        dirac_setup,
-        job_attrs,
-        vo,
-    ):
+        if old_key is not None:
+            new_key = old_key | {k: jobData[k] for k in JOB_COUNTS_KEYS if k in jobData}
+            if new_key != old_key:
+                await self._update_job_counts((old_key, -1), (new_key, 1))
+
+    async def get_job_statuses(
+        self, job_ids: list[int], *, owner: str | None = None
+    ) -> dict[int, str]:
+        """Return the status of each of the jobs which exist
+
+        If ``owner`` is given the jobs of other owners are left out.
         """
-        Check Consistency of Submitted JDL and set some defaults
-        Prepare subJDL with Job Requirements
+        stmt = select(Jobs.JobID, Jobs.Status).where(Jobs.JobID.in_(job_ids))
+        if owner is not None:
+            stmt = stmt.where(Jobs.Owner == owner)
+        return dict((await self.ro_conn.execute(stmt)).tuples().all())
+
+    async def set_job_statuses(
+        self, updates: dict[int, tuple[str, str | None]], *, owner: str | None = None
+    ) -> dict[int, str]:
+        """Move jobs to new statuses in bulk
+
+        ``updates`` maps JobIDs to ``(status, minor_status)`` pairs, the minor
+        status is left unchanged if it is None. Transitions which are not
+        allowed by :data:`~.status.TRANSITIONS` are ignored. Returns the
+        status of each job after the update, jobs which don't exist, or
+        belong to someone else than ``owner`` if given, are left out.
+
+        All the jobs moving to the same status are updated with a single
+        statement and LastUpdateTime is set by the database.
         """
-        from DIRAC.Core.Utilities.DErrno import EWMSSUBM, cmpError
-        from DIRAC.Core.Utilities.ReturnValues import returnValueOrRaise
-        from DIRAC.WorkloadManagementSystem.DB.JobDBUtils import (
-            checkAndPrepareJob,
-        )
+        columns = [Jobs.__table__.columns[x] for x in JOB_COUNTS_KEYS]
+        stmt = select(Jobs.JobID, *columns).where(Jobs.JobID.in_(list(updates)))
+        if owner is not None:
+            stmt = stmt.where(Jobs.Owner == owner)
+        old_keys = {
+            row.JobID: dict(row._mapping)
+            for row in await self.conn.execute(stmt.with_for_update())
+        }
 
-        retVal = checkAndPrepareJob(
-            jobID,
-            class_ad_job,
-            class_ad_req,
-            owner,
-            owner_dn,
-            owner_group,
-            dirac_setup,
-            job_attrs,
-            vo,
+        accepted: dict[str, dict[int, str | None]] = {}
+        for job_id, (status, minor_status) in updates.items():
+            if job_id in old_keys and is_allowed_transition(
+                old_keys[job_id]["Status"], status
+            ):
+                accepted.setdefault(status, {})[job_id] = minor_status
+
+        count_changes: Counter[tuple] = Counter()
+        for status, minor_statuses in accepted.items():
+            values: dict[str, Any] = {"Status": status, "LastUpdateTime": utcnow()}
+            distinct_minor_statuses = set(minor_statuses.values())
+            if len(distinct_minor_statuses) == 1:
+                if (minor_status := distinct_minor_statuses.pop()) is not None:
+                    values["MinorStatus"] = minor_status
+            else:
+                values["MinorStatus"] = case(
+                    {
+                        job_id: minor_status
+                        for job_id, minor_status in minor_statuses.items()
+                        if minor_status is not None
+                    },
+                    value=Jobs.JobID,
+                    else_=Jobs.MinorStatus,
+                )
+            await self.conn.execute(
+                update(Jobs).where(Jobs.JobID.in_(list(minor_statuses))).values(values)
+            )
+
+            for job_id, minor_status in minor_statuses.items():
+                old_key = old_keys[job_id]
+                new_key = old_key | {"Status": status}
+                if minor_status is not None:
+                    new_key["MinorStatus"] = minor_status
+                count_changes[tuple(old_key[x] for x in JOB_COUNTS_KEYS)] -= 1
+                count_changes[tuple(new_key[x] for x in JOB_COUNTS_KEYS)] += 1
+
+        await self._update_job_counts(
+            *(
+                (dict(zip(JOB_COUNTS_KEYS, key)), delta)
+                for key, delta in count_changes.items()
+                if delta != 0
+            )
         )
 
-        if not retVal["OK"]:
-            if cmpError(retVal, EWMSSUBM):
-                await self.setJobAttributes(jobID, job_attrs)
-
-            returnValueOrRaise(retVal)
+        new_statuses = {job_id: key["Status"] for job_id, key in old_keys.items()}
+        for status, minor_statuses in accepted.items():
+            new_statuses |= dict.fromkeys(minor_statuses, status)
+        return new_statuses
 
     async def setJobJDL(self, job_id, jdl):
         from DIRAC.WorkloadManagementSystem.DB.JobDBUtils import compressJDL
@@ -145,6 +528,46 @@ class JobDB(BaseDB):
         )
         await self.conn.execute(stmt)
 
+    async def _reserve_job_ids(self, count: int) -> list[int]:
+        """Allocate ``count`` JobIDs by inserting placeholder JobJDLs rows
+
+        Like :meth:`_insertNewJDL` the IDs come from the autoincrement of the
+        JobJDLs table so they are never reused and only the new rows are
+        locked. The rows are marked with a unique token to find their IDs,
+        which need not be consecutive if other jobs are inserted concurrently.
+        """
+        stmt = select(func.max(JobJDLs.JobID))
+        # The new IDs are greater than any which already exists
+        last_job_id = (await self.conn.execute(stmt)).scalar() or 0
+        token = f"Reserved {uuid4()}"
+        await self.conn.execute(
+            insert(JobJDLs),
+            [{"JDL": "", "JobRequirements": token, "OriginalJDL": ""}] * count,
+        )
+        stmt = (
+            select(JobJDLs.JobID)
+            .where(JobJDLs.JobID > last_job_id, JobJDLs.JobRequirements == token)
+            .order_by(JobJDLs.JobID)
+        )
+        return list((await self.conn.execute(stmt)).scalars())
+
+    def _prepare_jobs(self, jdls: list[str], job_ids: list[int], *args):
+        """Prepare the jobs in the JDL process pool"""
+        loop = asyncio.get_running_loop()
+        return asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self._jdl_executor,
+                    prepare_job,
+                    jdl,
+                    job_id,
+                    *args,
+                    self.jdl2DBParameters,
+                )
+                for job_id, jdl in zip(job_ids, jdls)
+            )
+        )
+
     async def insert(
         self,
         jdl,
@@ -156,101 +579,117 @@ class JobDB(BaseDB):
         initial_minor_status,
         vo,
     ):
-        from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
-        from DIRAC.Core.Utilities.ReturnValues import returnValueOrRaise
-        from DIRAC.WorkloadManagementSystem.DB.JobDBUtils import (
-            checkAndAddOwner,
-            createJDLWithInitialStatus,
-            fixJDL,
-        )
-
-        job_attrs = {
-            "LastUpdateTime": datetime.now(tz=timezone.utc),
-            "SubmissionTime": datetime.now(tz=timezone.utc),
-            "Owner": owner,
-            "OwnerDN": owner_dn,
-            "OwnerGroup": owner_group,
-            "DIRACSetup": dirac_setup,
-        }
+        job_id = await self._insertNewJDL()
 
-        jobManifest = returnValueOrRaise(
-            checkAndAddOwner(jdl, owner, owner_dn, owner_group, dirac_setup)
+        [job] = await self._prepare_jobs(
+            [jdl],
+            [job_id],
+            owner,
+            owner_dn,
+            owner_group,
+            dirac_setup,
+            initial_status,
+            initial_minor_status,
+            vo,
         )
 
-        jdl = fixJDL(jdl)
-
-        job_id = await self._insertNewJDL(jdl)
-
-        jobManifest.setOption("JobID", job_id)
-
-        job_attrs["JobID"] = job_id
-
-        # 2.- Check JDL and Prepare DIRAC JDL
-        jobJDL = jobManifest.dumpAsJDL()
-
-        # Replace the JobID placeholder if any
-        if jobJDL.find("%j") != -1:
-            jobJDL = jobJDL.replace("%j", str(job_id))
+        stmt = (
+            update(JobJDLs)
+            .where(JobJDLs.JobID == job_id)
+            .values(JDL=job.jdl, OriginalJDL=job.original_jdl)
+        )
+        await self.conn.execute(stmt)
 
-        class_ad_job = ClassAd(jobJDL)
-        class_ad_req = ClassAd("[]")
-        if not class_ad_job.isOK():
-            job_attrs["Status"] = JobStatus.Failed
+        # Adding the job in the Jobs table
+        await self._insertJob(job.job_attrs)
 
-            job_attrs["MinorStatus"] = "Error in JDL syntax"
+        if job.lfns:
+            await self._insertInputData(job_id, job.lfns)
 
-            await self._insertJob(job_attrs)
+        return {
+            "JobID": job_id,
+            "Status": job.job_attrs["Status"],
+            "MinorStatus": job.job_attrs["MinorStatus"],
+            "TimeStamp": datetime.now(tz=timezone.utc),
+        }
 
-            return {
-                "JobID": job_id,
-                "Status": JobStatus.FAILED,
-                "MinorStatus": "Error in JDL syntax",
-            }
+    async def insert_bulk(
+        self,
+        jdls: list[str],
+        owner,
+        owner_dn,
+        owner_group,
+        dirac_setup,
+        initial_status,
+        initial_minor_status,
+        vo,
+    ):
+        """Insert many jobs with a number of round trips independent of their count
 
-        class_ad_job.insertAttributeInt("JobID", job_id)
+        The JobIDs are reserved, the JDLs are prepared in the JDL process pool
+        and each table is then filled with a single ``executemany``.
+        """
+        if not jdls:
+            return []
 
-        await self._checkAndPrepareJob(
-            job_id,
-            class_ad_job,
-            class_ad_req,
+        job_ids = await self._reserve_job_ids(len(jdls))
+        jobs = await self._prepare_jobs(
+            jdls,
+            job_ids,
             owner,
             owner_dn,
             owner_group,
             dirac_setup,
-            job_attrs,
-            vo,
-        )
-
-        jobJDL = createJDLWithInitialStatus(
-            class_ad_job,
-            class_ad_req,
-            self.jdl2DBParameters,
-            job_attrs,
             initial_status,
             initial_minor_status,
-            modern=True,
+            vo,
         )
 
-        await self.setJobJDL(job_id, jobJDL)
-
-        # Adding the job in the Jobs table
-        await self._insertJob(job_attrs)
-
-        # TODO: check if that is actually true
-        if class_ad_job.lookupAttribute("Parameters"):
-            raise NotImplementedError("Parameters in the JDL are not supported")
-
-        # Looking for the Input Data
-        inputData = []
-        if class_ad_job.lookupAttribute("InputData"):
-            inputData = class_ad_job.getListFromExpression("InputData")
-            lfns = [lfn for lfn in inputData if lfn]
-            if lfns:
-                await self._insertInputData(job_id, lfns)
+        jdl_rows = []
+        job_rows: dict[frozenset[str], list[dict[str, Any]]] = {}
+        input_data_rows: list[dict[str, Any]] = []
+        job_counts: Counter[tuple] = Counter()
+        results = []
+        for job_id, job in zip(job_ids, jobs):
+            jdl_rows.append(
+                {
+                    "b_JobID": job_id,
+                    "b_JDL": job.jdl,
+                    "b_OriginalJDL": job.original_jdl,
+                }
+            )
+            # executemany requires all the rows to have the same columns
+            job_rows.setdefault(frozenset(job.job_attrs), []).append(job.job_attrs)
+            input_data_rows.extend({"JobID": job_id, "LFN": lfn} for lfn in job.lfns)
+            job_counts[tuple(_job_counts_key(job.job_attrs).values())] += 1
+            results.append(
+                {
+                    "JobID": job_id,
+                    "Status": job.job_attrs["Status"],
+                    "MinorStatus": job.job_attrs["MinorStatus"],
+                    "TimeStamp": datetime.now(tz=timezone.utc),
+                }
+            )
+
+        await self.conn.execute(
+            update(JobJDLs)
+            .where(JobJDLs.JobID == bindparam("b_JobID"))
+            .values(
+                JDL=bindparam("b_JDL"),
+                JobRequirements="",
+                OriginalJDL=bindparam("b_OriginalJDL"),
+            ),
+            jdl_rows,
+        )
+        for rows in job_rows.values():
+            await self.conn.execute(insert(Jobs), rows)
+        if input_data_rows:
+            await self.conn.execute(insert(InputData), input_data_rows)
+        await self._update_job_counts(
+            *(
+                (dict(zip(JOB_COUNTS_KEYS, key)), count)
+                for key, count in job_counts.items()
+            )
+        )
 
-        return {
-            "JobID": job_id,
-            "Status": initial_status,
-            "MinorStatus": initial_minor_status,
-            "TimeStamp": datetime.now(tz=timezone.utc),
-        }
+        return results
@@ -0,0 +1,115 @@
+"""CPU bound preparation of the JDL of submitted jobs
+
+The functions in this module don't do any I/O so they can be run in a
+process pool, outside of the event loop.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+from diracx.core.utils import JobStatus
+
+
+class PreparedJob(NamedTuple):
+    # Content of the row of the Jobs table
+    job_attrs: dict[str, Any]
+    # Compressed JDLs to store in the JobJDLs table
+    jdl: str
+    original_jdl: str
+    # LFNs to store in the InputData table
+    lfns: list[str]
+
+
+def prepare_job(
+    jdl: str,
+    job_id: int,
+    owner: str,
+    owner_dn: str,
+    owner_group: str,
+    dirac_setup: str,
+    initial_status: str,
+    initial_minor_status: str,
+    vo: str,
+    jdl2DBParameters: list[str],
+) -> PreparedJob:
+    """Check the JDL of a job and compute everything needed to insert it"""
+    from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
+    from DIRAC.Core.Utilities.ReturnValues import returnValueOrRaise
+    from DIRAC.WorkloadManagementSystem.DB.JobDBUtils import (
+        checkAndAddOwner,
+        checkAndPrepareJob,
+        compressJDL,
+        createJDLWithInitialStatus,
+        fixJDL,
+    )
+
+    job_manifest = returnValueOrRaise(
+        checkAndAddOwner(jdl, owner, owner_dn, owner_group, dirac_setup)
+    )
+    original_jdl = compressJDL(fixJDL(jdl))
+
+    now = datetime.now(tz=timezone.utc)
+    job_attrs: dict[str, Any] = {
+        "JobID": job_id,
+        "LastUpdateTime": now,
+        "SubmissionTime": now,
+        "Owner": owner,
+        "OwnerDN": owner_dn,
+        "OwnerGroup": owner_group,
+        "DIRACSetup": dirac_setup,
+    }
+
+    job_manifest.setOption("JobID", job_id)
+
+    # 2.- Check JDL and Prepare DIRAC JDL
+    jobJDL = job_manifest.dumpAsJDL()
+
+    # Replace the JobID placeholder if any
+    if jobJDL.find("%j") != -1:
+        jobJDL = jobJDL.replace("%j", str(job_id))
+
+    class_ad_job = ClassAd(jobJDL)
+    class_ad_req = ClassAd("[]")
+    if not class_ad_job.isOK():
+        job_attrs["Status"] = JobStatus.Failed
+        job_attrs["MinorStatus"] = "Error in JDL syntax"
+        return PreparedJob(job_attrs, "", original_jdl, [])
+
+    class_ad_job.insertAttributeInt("JobID", job_id)
+
+    returnValueOrRaise(
+        checkAndPrepareJob(
+            job_id,
+            class_ad_job,
+            class_ad_req,
+            owner,
+            owner_dn,
+            owner_group,
+            dirac_setup,
+            job_attrs,
+            vo,
+        )
+    )
+
+    jobJDL = createJDLWithInitialStatus(
+        class_ad_job,
+        class_ad_req,
+        jdl2DBParameters,
+        job_attrs,
+        initial_status,
+        initial_minor_status,
+        modern=True,
+    )
+
+    # TODO: check if that is actually true
+    if class_ad_job.lookupAttribute("Parameters"):
+        raise NotImplementedError("Parameters in the JDL are not supported")
+
+    # Looking for the Input Data
+    lfns = []
+    if class_ad_job.lookupAttribute("InputData"):
+        inputData = class_ad_job.getListFromExpression("InputData")
+        lfns = [lfn for lfn in inputData if lfn]
+
+    return PreparedJob(job_attrs, compressJDL(jobJDL), original_jdl, lfns)
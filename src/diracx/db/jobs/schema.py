@@ -26,6 +26,10 @@ class EnumBackedBool(types.TypeDecorator):
     def __init__(self) -> None:
         super().__init__("True", "False")
 
+    @property
+    def python_type(self) -> type[bool]:
+        return bool
+
     def process_bind_param(self, value, dialect) -> str:
         if value is True:
             return "True"
@@ -95,25 +99,35 @@ class Jobs(Base):
 
     __table_args__ = (
         ForeignKeyConstraint(["JobID"], ["JobJDLs.JobID"]),
-        Index(
-            "JobType",
-            "DIRACSetup",
-            "JobGroup",
-            "JobSplitType",
-            "Site",
-            "Owner",
-            "OwnerDN",
-            "OwnerGroup",
-            "Status",
-            "MinorStatus",
-            "ApplicationStatus",
-            "Status",
-            "Site",
-            "LastUpdateTime",
-        ),
+        # These follow the access patterns of JobDB.search/summary, the
+        # primary key (JobID) is implicitly the last column of each of them
+        Index("OwnerStatus", "Owner", "Status"),
+        Index("OwnerGroupStatus", "OwnerGroup", "Status"),
+        Index("StatusLastUpdateTime", "Status", "LastUpdateTime"),
+        Index("JobGroupStatus", "JobGroup", "Status"),
+        Index("SiteStatus", "Site", "Status"),
+        Index("LastUpdateTime", "LastUpdateTime"),
     )
 
 
+class JobCounts(Base):
+    """Number of jobs for each combination of the most common summary keys
+
+    This is kept up to date by the JobDB in the same transaction as any
+    change to the Jobs table so summaries don't need to scan all the jobs.
+    """
+
+    __tablename__ = "JobCounts"
+    Status = Column(String(32), primary_key=True)
+    MinorStatus = Column(String(128), primary_key=True)
+    Site = Column(String(100), primary_key=True)
+    Owner = Column(String(64), primary_key=True)
+    OwnerGroup = Column(String(128), primary_key=True)
+    JobGroup = Column(String(32), primary_key=True)
+    JobType = Column(String(32), primary_key=True)
+    Count = Column(Integer, default=0)
+
+
 class InputData(Base):
     __tablename__ = "InputData"
     JobID = Column(Integer, primary_key=True)
@@ -0,0 +1,113 @@
+"""Allowed transitions between job statuses
+
+This follows the ``JobsStateMachine`` of DIRAC.
+"""
+from __future__ import annotations
+
+from diracx.core.utils import JobStatus
+
+TRANSITIONS: dict[JobStatus, frozenset[JobStatus]] = {
+    JobStatus.DELETED: frozenset(),
+    JobStatus.Killed: frozenset([JobStatus.DELETED]),
+    JobStatus.Failed: frozenset([JobStatus.RESCHEDULED, JobStatus.DELETED]),
+    JobStatus.DONE: frozenset([JobStatus.DELETED]),
+    JobStatus.COMPLETED: frozenset([JobStatus.DONE, JobStatus.Failed]),
+    JobStatus.COMPLETING: frozenset(
+        [
+            JobStatus.DONE,
+            JobStatus.Failed,
+            JobStatus.COMPLETED,
+            JobStatus.Stalled,
+            JobStatus.Killed,
+        ]
+    ),
+    JobStatus.Stalled: frozenset(
+        [JobStatus.Running, JobStatus.Failed, JobStatus.Killed]
+    ),
+    JobStatus.Running: frozenset(
+        [
+            JobStatus.Stalled,
+            JobStatus.DONE,
+            JobStatus.Failed,
+            JobStatus.RESCHEDULED,
+            JobStatus.COMPLETING,
+            JobStatus.Killed,
+            JobStatus.RECEIVED,
+        ]
+    ),
+    JobStatus.RESCHEDULED: frozenset(
+        [
+            JobStatus.WAITING,
+            JobStatus.RECEIVED,
+            JobStatus.DELETED,
+            JobStatus.Failed,
+            JobStatus.Killed,
+        ]
+    ),
+    JobStatus.MATCHED: frozenset(
+        [
+            JobStatus.Running,
+            JobStatus.Failed,
+            JobStatus.RESCHEDULED,
+            JobStatus.Killed,
+        ]
+    ),
+    JobStatus.WAITING: frozenset(
+        [
+            JobStatus.MATCHED,
+            JobStatus.RESCHEDULED,
+            JobStatus.DELETED,
+            JobStatus.Killed,
+        ]
+    ),
+    JobStatus.STAGING: frozenset(
+        [JobStatus.CHECKING, JobStatus.WAITING, JobStatus.Failed, JobStatus.Killed]
+    ),
+    JobStatus.SCOUTING: frozenset(
+        [JobStatus.CHECKING, JobStatus.Failed, JobStatus.Stalled, JobStatus.Killed]
+    ),
+    JobStatus.CHECKING: frozenset(
+        [
+            JobStatus.SCOUTING,
+            JobStatus.STAGING,
+            JobStatus.WAITING,
+            JobStatus.RESCHEDULED,
+            JobStatus.Failed,
+            JobStatus.DELETED,
+            JobStatus.Killed,
+        ]
+    ),
+    JobStatus.RECEIVED: frozenset(
+        [
+            JobStatus.SCOUTING,
+            JobStatus.CHECKING,
+            JobStatus.STAGING,
+            JobStatus.WAITING,
+            JobStatus.Failed,
+            JobStatus.DELETED,
+            JobStatus.Killed,
+        ]
+    ),
+    JobStatus.SUBMITTING: frozenset(
+        [
+            JobStatus.RECEIVED,
+            JobStatus.CHECKING,
+            JobStatus.DELETED,
+            JobStatus.Killed,
+        ]
+    ),
+}
+
+
+def is_allowed_transition(current: str, new: str) -> bool:
+    """Check if a job can move from the ``current`` status to ``new``
+
+    Setting the status a job already has is always allowed, statuses which
+    are not known can't be left.
+    """
+    if current == new:
+        return True
+    try:
+        return JobStatus(new) in TRANSITIONS.get(JobStatus(current), frozenset())
+    except ValueError:
+        return False
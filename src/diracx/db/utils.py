@@ -1,20 +1,63 @@
 from __future__ import annotations
 
-__all__ = ("utcnow", "Column", "NullColumn", "DateNowColumn", "BaseDB")
-
+__all__ = (
+    "utcnow",
+    "Column",
+    "NullColumn",
+    "DateNowColumn",
+    "BaseDB",
+    "DBSettings",
+    "SchemaVersionError",
+)
+
+import asyncio
+import base64
+import binascii
 import contextlib
+import itertools
+import json
+import logging
 import os
+import time
 from abc import ABCMeta
+from collections import Counter
+from contextvars import ContextVar, Token
 from datetime import datetime, timedelta, timezone
-from functools import partial
-from typing import TYPE_CHECKING, AsyncIterator, Self
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, NamedTuple, Self
 
-from pydantic import parse_obj_as
+from pydantic import BaseSettings, ValidationError, parse_obj_as
 from sqlalchemy import Column as RawColumn
-from sqlalchemy import DateTime, Enum, MetaData
-from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy import (
+    DateTime,
+    Enum,
+    Integer,
+    MetaData,
+    Table,
+    and_,
+    bindparam,
+    delete,
+    event,
+    false,
+    insert,
+    inspect,
+    or_,
+    select,
+)
+from sqlalchemy.engine import Connection, CursorResult, Dialect, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncResult,
+    create_async_engine,
+)
 from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateTable, DropIndex
 from sqlalchemy.sql import expression
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import BindParameter, ClauseElement
 
 from diracx.core.exceptions import InvalidQueryError
 from diracx.core.extensions import select_from_extension
@@ -23,6 +66,31 @@ from diracx.core.settings import SqlalchemyDsn
 if TYPE_CHECKING:
     from sqlalchemy.types import TypeEngine
 
+logger = logging.getLogger(__name__)
+
+# Seconds during which a read-only replica which failed is not used
+REPLICA_RETRY_SECONDS = 30
+# Number of distinct search shapes for which the filters are kept
+SEARCH_FILTERS_CACHE_SIZE = 1024
+# Above this number of values, "in" filters use a temporary table
+LARGE_IN_THRESHOLD = 1000
+# Pseudo-operators used in search shapes for the filters using a temporary table
+IN_TEMPORARY_TABLE = "in temporary table"
+NOT_IN_TEMPORARY_TABLE = "not in temporary table"
+# Maximum number of filters using a temporary table on the same column, as
+# MySQL can't use a temporary table more than once in a statement each of them
+# needs its own table
+MAX_TEMPORARY_TABLES_PER_COLUMN = 4
+
+SCALAR_OPERATORS = frozenset(["eq", "neq", "gt", "lt", "like"])
+VECTOR_OPERATORS = frozenset(["in", "not in"])
+# Search operators from the most to the least selective
+OPERATOR_RANKS = {
+    op: i for i, op in enumerate(["eq", "in", "gt", "lt", "like", "neq", "not in"])
+}
+
+_search_values_metadata = MetaData()
+
 
 class utcnow(expression.FunctionElement):
     type: TypeEngine = DateTime()
@@ -49,6 +117,20 @@ def sqlite_utcnow(element, compiler, **kw) -> str:
     return "DATETIME('now')"
 
 
+class explain(Executable, ClauseElement):
+    """``EXPLAIN`` of a statement, its parameters are bound when executing"""
+
+    inherit_cache: bool = False
+
+    def __init__(self, statement: ClauseElement) -> None:
+        self.statement = statement
+
+
+@compiles(explain)
+def compile_explain(element, compiler, **kw) -> str:
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
 def substract_date(**kwargs: float) -> datetime:
     return datetime.now(tz=timezone.utc) - timedelta(**kwargs)
 
@@ -62,17 +144,250 @@ def EnumColumn(enum_type, **kwargs):
     return Column(Enum(enum_type, native_enum=False, length=16), **kwargs)
 
 
+# Holds the version of the schema which was last applied by BaseDB.upgrade
+SchemaVersion = Table(
+    "DiracxSchemaVersion",
+    MetaData(),
+    Column("Version", Integer, primary_key=True, autoincrement=False),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    """The schema of the database doesn't match the one of the code"""
+
+
+def is_in_memory(db_url: str) -> bool:
+    url = make_url(db_url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+class DBSettings(BaseSettings, env_prefix="DIRACX_DB_"):
+    """Options of the engine and connection pool of a DB
+
+    The defaults for all DBs are read from ``DIRACX_DB_{OPTION}`` and can be
+    overridden for a single DB with ``DIRACX_DB_{DB_NAME}_{OPTION}``.
+    """
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = 3600
+    pool_pre_ping: bool = True
+    echo: bool = False
+
+    @classmethod
+    def for_db(cls, db_name: str) -> Self:
+        prefix = f"DIRACX_DB_{db_name.upper()}_"
+        return cls(
+            **{
+                name: os.environ[f"{prefix}{name.upper()}"]
+                for name in cls.__fields__
+                if f"{prefix}{name.upper()}" in os.environ
+            }
+        )
+
+    def engine_options(self, db_url: str) -> dict[str, Any]:
+        """Keyword arguments to pass to create_async_engine"""
+        options: dict[str, Any] = {
+            "echo": self.echo,
+            "pool_pre_ping": self.pool_pre_ping,
+            "pool_recycle": self.pool_recycle,
+        }
+        url = make_url(db_url)
+        # e.g. in memory SQLite DBs use a StaticPool which can't be sized
+        pool_class = url.get_dialect().get_pool_class(url)  # type: ignore[attr-defined]
+        if issubclass(pool_class, QueuePool):
+            options |= {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "pool_timeout": self.pool_timeout,
+            }
+        return options
+
+
+class PoolStats:
+    """Statistics about how the connection pool of a DB is used"""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.checkout_wait_seconds = 0.0
+        self.in_use = 0
+        self.overflows = 0
+        self.retryable_errors = 0
+
+    def listen(self, engine: AsyncEngine) -> None:
+        pool = engine.sync_engine.pool
+
+        def on_connect(*args):
+            # QueuePool counts the overflow before opening the connection
+            if getattr(pool, "overflow", lambda: 0)() > 0:
+                self.overflows += 1
+
+        def on_checkout(*args):
+            self.checkouts += 1
+            self.in_use += 1
+
+        def on_checkin(*args):
+            self.in_use -= 1
+
+        event.listen(pool, "connect", on_connect)
+        event.listen(pool, "checkout", on_checkout)
+        event.listen(pool, "checkin", on_checkin)
+
+
+def is_retryable_error(e: DBAPIError) -> bool:
+    """Whether the transaction which raised ``e`` can succeed if retried"""
+    # MySQL deadlocks and lock wait timeouts
+    args = getattr(e.orig, "args", ())
+    if args and args[0] in (1205, 1213):
+        return True
+    # SQLite busy or locked database
+    sqlite_errorcode = getattr(e.orig, "sqlite_errorcode", None)
+    return sqlite_errorcode is not None and sqlite_errorcode & 0xFF in (5, 6)
+
+
+class ReplicaSet:
+    """Read-only replicas of a DB which are used in turn
+
+    A replica which can't be connected to is skipped for
+    ``REPLICA_RETRY_SECONDS`` and the primary is used if none is available.
+    """
+
+    def __init__(self, engines: list[AsyncEngine]) -> None:
+        self.engines = engines
+        self._next = itertools.cycle(range(len(engines)))
+        self._unhealthy_until = [0.0] * len(engines)
+
+    async def connect(self, primary: AsyncEngine) -> AsyncConnection:
+        now = time.monotonic()
+        for _ in self.engines:
+            i = next(self._next)
+            if self._unhealthy_until[i] > now:
+                continue
+            try:
+                return await self.engines[i].connect()
+            except DBAPIError as e:
+                logger.warning("Read-only replica %s is unavailable: %s", i, e)
+                self._unhealthy_until[i] = now + REPLICA_RETRY_SECONDS
+        return await primary.connect()
+
+
+class LazyConnection:
+    """Stand-in for an AsyncConnection which is only checked out of the pool
+    when the first statement is executed
+
+    Requests which never touch the DB therefore don't hold a connection or
+    send a COMMIT.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        pool_stats: PoolStats,
+        replicas: ReplicaSet | None = None,
+    ) -> None:
+        self._engine = engine
+        self._pool_stats = pool_stats
+        self._replicas = replicas
+        self._conn: AsyncConnection | None = None
+        self._lock = asyncio.Lock()
+        # Set when the transaction was rolled back because of a retryable error
+        self._aborted_by: DBAPIError | None = None
+
+    @property
+    def dialect(self) -> Dialect:
+        return self._engine.dialect
+
+    async def _connection(self) -> AsyncConnection:
+        if self._aborted_by is not None:
+            raise self._aborted_by
+        if self._conn is None:
+            async with self._lock:
+                if self._conn is None:
+                    start = time.perf_counter()
+                    if self._replicas is None:
+                        self._conn = await self._engine.connect()
+                    else:
+                        self._conn = await self._replicas.connect(self._engine)
+                    wait = time.perf_counter() - start
+                    self._pool_stats.checkout_wait_seconds += wait
+        return self._conn
+
+    async def execute(self, *args: Any, **kwargs: Any) -> CursorResult[Any]:
+        try:
+            return await (await self._connection()).execute(*args, **kwargs)
+        except DBAPIError as e:
+            await self._abort_if_retryable(e)
+            raise
+
+    async def stream(self, *args: Any, **kwargs: Any) -> AsyncResult[Any]:
+        try:
+            return await (await self._connection()).stream(*args, **kwargs)
+        except DBAPIError as e:
+            await self._abort_if_retryable(e)
+            raise
+
+    async def _abort_if_retryable(self, e: DBAPIError) -> None:
+        """Roll back straight away if the whole transaction needs to be retried
+
+        This releases the locks it holds before the retry is attempted and
+        ensures nothing it did can be committed.
+        """
+        if self._aborted_by is None and is_retryable_error(e):
+            self._pool_stats.retryable_errors += 1
+            self._aborted_by = e
+            await self.close(commit=False)
+
+    async def close(self, commit: bool) -> None:
+        """Release the connection, committing the transaction if requested"""
+        if self._conn is None:
+            return
+        try:
+            if commit:
+                await self._conn.commit()
+        finally:
+            await self._conn.close()
+            self._conn = None
+
+
+class _Transaction:
+    def __init__(self, conn: LazyConnection, ro_conn: LazyConnection) -> None:
+        self.conn = conn
+        self.ro_conn = ro_conn
+        self.token: Token[_Transaction | None]
+        self.on_commit: list[Callable[[], Any]] = []
+
+
 class BaseDB(metaclass=ABCMeta):
     """This should be the base class of all the DiracX DBs"""
 
     # engine: AsyncEngine
     # TODO: Make metadata an abstract property
     metadata: MetaData
-
-    def __init__(self, db_url: str) -> None:
-        self._conn = None
+    # Names of indexes which were part of previous versions of the schema
+    # and should be removed by sync_indexes, keyed by table name
+    obsolete_indexes: dict[str, list[str]] = {}
+    # Must be increased whenever the schema changes so that outdated
+    # databases are detected at startup
+    schema_version: int = 1
+
+    def __init__(
+        self,
+        db_url: str,
+        settings: DBSettings | None = None,
+        read_only_urls: list[str] | None = None,
+    ) -> None:
+        # The transaction of the current task, so a single instance can be
+        # shared by concurrent requests
+        self._transaction: ContextVar[_Transaction | None] = ContextVar(
+            f"{self.__class__.__name__}_transaction", default=None
+        )
         self._db_url = db_url
+        self._read_only_urls = read_only_urls or []
+        self._settings = DBSettings() if settings is None else settings
         self._engine: AsyncEngine | None = None
+        self._replicas: ReplicaSet | None = None
+        self.pool_stats = PoolStats()
 
     @classmethod
     def available_urls(cls) -> dict[str, str]:
@@ -93,6 +408,23 @@ class BaseDB(metaclass=ABCMeta):
                     db_urls[db_name] = parse_obj_as(SqlalchemyDsn, db_url)
         return db_urls
 
+    @classmethod
+    def available_read_only_urls(cls) -> dict[str, list[str]]:
+        """Return a dict of the urls of the read-only replicas of each database.
+
+        They are given as a comma separated list in the environment variables
+        named ``DIRACX_DB_URL_{DB_NAME}_RO``.
+        """
+        db_urls: dict[str, list[str]] = {}
+        for entry_point in select_from_extension(group="diracx.dbs"):
+            var_name = f"DIRACX_DB_URL_{entry_point.name.upper()}_RO"
+            if var_name in os.environ:
+                db_urls[entry_point.name] = [
+                    parse_obj_as(SqlalchemyDsn, db_url.strip())
+                    for db_url in os.environ[var_name].split(",")
+                ]
+        return db_urls
+
     @classmethod
     def transaction(cls) -> Self:
         raise NotImplementedError("This should never be called")
@@ -107,60 +439,472 @@ class BaseDB(metaclass=ABCMeta):
         return self._engine
 
     @contextlib.asynccontextmanager
-    async def engine_context(self) -> AsyncIterator[None]:
+    async def engine_context(self, *, check_schema: bool = True) -> AsyncIterator[None]:
         """Context manage to manage the engine lifecycle.
 
-        Tables are automatically created upon entering
+        The schema version of the database is checked upon entering, use
+        ``upgrade`` to update it. In memory databases are always created from
+        scratch instead.
         """
         assert self._engine is None, "engine_context cannot be nested"
 
         engine = create_async_engine(
-            self._db_url,
-            echo=True,
+            self._db_url, **self._settings.engine_options(self._db_url)
         )
-        async with engine.begin() as conn:
-            await conn.run_sync(self.metadata.create_all)
+        self.pool_stats.listen(engine)
+        if is_in_memory(self._db_url):
+            async with engine.begin() as conn:
+                await conn.run_sync(self._upgrade)
+        elif check_schema:
+            async with engine.connect() as conn:
+                await conn.run_sync(self._check_schema_version)
         self._engine = engine
+        if self._read_only_urls:
+            self._replicas = ReplicaSet(
+                [
+                    create_async_engine(url, **self._settings.engine_options(url))
+                    for url in self._read_only_urls
+                ]
+            )
+            for replica in self._replicas.engines:
+                self.pool_stats.listen(replica)
 
         yield
 
         self._engine = None
         await engine.dispose()
+        if self._replicas is not None:
+            for replica in self._replicas.engines:
+                await replica.dispose()
+            self._replicas = None
+
+    def _check_schema_version(self, conn: Connection) -> None:
+        version = None
+        if inspect(conn).has_table(SchemaVersion.name):
+            version = conn.execute(select(SchemaVersion.c.Version)).scalar()
+        if version != self.schema_version:
+            raise SchemaVersionError(
+                f"{self.__class__.__name__} has schema version {version} but "
+                f"{self.schema_version} is needed, run `dirac internal db-upgrade`"
+            )
+
+    def _upgrade(self, conn: Connection) -> None:
+        if inspect(conn).has_table(SchemaVersion.name):
+            version = conn.execute(select(SchemaVersion.c.Version)).scalar()
+            if version is not None and version > self.schema_version:
+                raise SchemaVersionError(
+                    f"Cannot downgrade {self.__class__.__name__} from schema "
+                    f"version {version} to {self.schema_version}"
+                )
+        inspector = inspect(conn)
+        new_tables = {
+            name for name in self.metadata.tables if not inspector.has_table(name)
+        }
+        self.metadata.create_all(conn)
+        self._fill_new_tables(conn, new_tables)
+        SchemaVersion.create(conn, checkfirst=True)
+        sync_indexes(conn, self.metadata, self.obsolete_indexes)
+        conn.execute(delete(SchemaVersion))
+        conn.execute(insert(SchemaVersion).values(Version=self.schema_version))
+
+    def _fill_new_tables(  # noqa: B027
+        self, conn: Connection, new_tables: set[str]
+    ) -> None:
+        """Populate the tables which were just created by an upgrade
+
+        Tables derived from the content of other tables, e.g. rollups, must be
+        filled before the new schema version is recorded.
+        """
 
-    @property
-    def conn(self) -> AsyncConnection:
-        if self._conn is None:
+    async def upgrade(self) -> None:
+        """Create the missing tables and indexes and record the schema version
+
+        This can lock tables for a long time so it is never done implicitly.
+        """
+        async with self.engine.begin() as conn:
+            await conn.run_sync(self._upgrade)
+
+    async def sync_indexes(self) -> None:
+        """Bring the indexes of an existing database in line with the schema
+
+        This can lock tables for a long time so it is never done implicitly.
+        """
+        async with self.engine.begin() as conn:
+            await conn.run_sync(sync_indexes, self.metadata, self.obsolete_indexes)
+
+    def _current_transaction(self) -> _Transaction:
+        if (transaction := self._transaction.get()) is None:
             raise RuntimeError(f"{self.__class__} was used before entering")
-        return self._conn
+        return transaction
+
+    @property
+    def conn(self) -> LazyConnection:
+        return self._current_transaction().conn
+
+    @property
+    def ro_conn(self) -> LazyConnection:
+        """Connection for read-only queries, using a replica if there are any
+
+        Replicas may lag behind so this must not be used to read rows which
+        were written in the same transaction.
+        """
+        return self._current_transaction().ro_conn
+
+    def on_commit(self, callback: Callable[[], Any]) -> None:
+        """Call ``callback`` once the current transaction has been committed
+
+        e.g. to invalidate caches only when the change is visible to others.
+        """
+        self._current_transaction().on_commit.append(callback)
 
     async def __aenter__(self):
-        self._conn = await self.engine.connect().__aenter__()
+        conn = LazyConnection(self.engine, self.pool_stats)
+        ro_conn = conn
+        if self._replicas is not None:
+            ro_conn = LazyConnection(self.engine, self.pool_stats, self._replicas)
+        transaction = _Transaction(conn, ro_conn)
+        transaction.token = self._transaction.set(transaction)
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
+        transaction = self._current_transaction()
+        try:
+            await transaction.conn.close(commit=exc_type is None)
+        finally:
+            if transaction.ro_conn is not transaction.conn:
+                await transaction.ro_conn.close(commit=False)
+            self._transaction.reset(transaction.token)
         if exc_type is None:
-            await self._conn.commit()
-        await self._conn.__aexit__(exc_type, exc, tb)
-        self._conn = None
+            for callback in transaction.on_commit:
+                callback()
+
+
+def sync_indexes(
+    conn: Connection, metadata: MetaData, obsolete: dict[str, list[str]]
+) -> None:
+    """Create missing indexes and drop obsolete ones on existing tables
+
+    ``metadata.create_all`` only creates missing tables so this is needed
+    when indexes are changed in the schema of a table which already exists.
+    """
+    inspector = inspect(conn)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        reflected = Table(table.name, MetaData(), autoload_with=conn)
+        existing = {str(index.name): index for index in reflected.indexes}
+        for name in obsolete.get(table.name, []):
+            if name in existing:
+                conn.execute(DropIndex(existing.pop(name)))
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+
+
+class SearchableColumn(NamedTuple):
+    python_type: type
+    operators: frozenset[str]
+    # 0 if an index starts with the column, 1 if an index contains it, else 2
+    index_rank: int
+
+
+@lru_cache(maxsize=None)
+def searchable_columns(table) -> dict[str, SearchableColumn]:
+    """Find which columns of ``table`` can be searched and how"""
+    indexes = [list(table.primary_key.columns)]
+    indexes += [list(index.columns) for index in table.indexes]
+    columns = {}
+    for column in table.columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            continue
+        operators = SCALAR_OPERATORS | VECTOR_OPERATORS
+        if python_type is not str:
+            operators -= {"like"}
+        if python_type is bool:
+            operators -= {"gt", "lt"}
+        if any(index[0] is column for index in indexes):
+            index_rank = 0
+        elif any(column in index for index in indexes):
+            index_rank = 1
+        else:
+            index_rank = 2
+        columns[column.name] = SearchableColumn(python_type, operators, index_rank)
+    return columns
 
 
-def apply_search_filters(table, stmt, search):
-    # Apply any filters
+def plan_search(table, search) -> list[dict[str, Any]]:
+    """Validate a search of ``table`` and prepare it for being executed
+
+    The values are converted to the type of the column they are compared
+    with, operators are converted to plain strings and the filters are
+    ordered so that the ones which can use an index come first. The result
+    is what the other search functions of this module expect.
+    """
+    planned = []
     for query in search:
-        column = table.columns[query["parameter"]]
-        if query["operator"] == "eq":
-            expr = column == query["value"]
-        elif query["operator"] == "neq":
-            expr = column != query["value"]
-        elif query["operator"] == "gt":
-            expr = column > query["value"]
-        elif query["operator"] == "lt":
-            expr = column < query["value"]
-        elif query["operator"] == "in":
-            expr = column.in_(query["values"])
-        elif query["operator"] in "like":
-            expr = column.like(query["values"])
+        parameter = query.get("parameter")
+        column = searchable_columns(table).get(parameter)
+        if column is None:
+            raise InvalidQueryError(f"Unknown search parameter {parameter!r}")
+        operator = getattr(query.get("operator"), "value", query.get("operator"))
+        if operator not in column.operators:
+            raise InvalidQueryError(
+                f"Operator {operator!r} is not supported for {parameter!r}"
+            )
+        key = "values" if operator in VECTOR_OPERATORS else "value"
+        if key not in query:
+            raise InvalidQueryError(f"Filter on {parameter!r} needs {key!r}")
+        expected_type: Any = column.python_type
+        if key == "values":
+            expected_type = list[expected_type]
+        try:
+            value = parse_obj_as(expected_type, query[key])
+        except ValidationError as e:
+            raise InvalidQueryError(
+                f"Invalid value for {parameter!r}: {query[key]!r}"
+            ) from e
+        planned.append({"parameter": parameter, "operator": operator, key: value})
+    planned.sort(
+        key=lambda query: (
+            searchable_columns(table)[query["parameter"]].index_rank,
+            OPERATOR_RANKS[query["operator"]],
+        )
+    )
+    large = Counter(query["parameter"] for query in planned if _is_large(query))
+    for parameter, count in large.items():
+        if count > MAX_TEMPORARY_TABLES_PER_COLUMN:
+            raise InvalidQueryError(
+                f"Too many filters on {parameter!r} with more than "
+                f"{LARGE_IN_THRESHOLD} values"
+            )
+    return planned
+
+
+def _is_large(query) -> bool:
+    return (
+        query["operator"] in VECTOR_OPERATORS
+        and len(query["values"]) > LARGE_IN_THRESHOLD
+    )
+
+
+def _shape_operator(query) -> str:
+    if not _is_large(query):
+        return query["operator"]
+    if query["operator"] == "in":
+        return IN_TEMPORARY_TABLE
+    return NOT_IN_TEMPORARY_TABLE
+
+
+def search_shape(search) -> tuple[tuple[str, str], ...]:
+    """The part of a search which determines the structure of the SQL query"""
+    return tuple((query["parameter"], _shape_operator(query)) for query in search)
+
+
+def search_params(search) -> dict[str, Any]:
+    """The values bound to the parameters of :func:`search_filters`"""
+    return {
+        f"search_{i}": query["values"] if "values" in query else query["value"]
+        for i, query in enumerate(search)
+        if not _is_large(query)
+    }
+
+
+def _temporary_table_slots(shape: tuple[tuple[str, str], ...]) -> dict[int, int]:
+    """Number the filters of a search shape using a temporary table
+
+    Filters on the same column are numbered in order so each of them is given
+    its own table by :func:`search_values_table`.
+    """
+    slots = {}
+    used: Counter[str] = Counter()
+    for i, (parameter, operator) in enumerate(shape):
+        if operator in (IN_TEMPORARY_TABLE, NOT_IN_TEMPORARY_TABLE):
+            slots[i] = used[parameter]
+            used[parameter] += 1
+    return slots
+
+
+@lru_cache(maxsize=None)
+def search_values_table(column, slot: int) -> Table:
+    """The temporary table holding the values of a large ``(not) in`` filter
+
+    ``slot`` tells apart the filters on the same column of a search, there are
+    at most ``MAX_TEMPORARY_TABLES_PER_COLUMN`` of them so the number of
+    tables is bounded by the schema.
+    """
+    return Table(
+        f"search_{column.table.name}_{column.name}_{slot}",
+        _search_values_metadata,
+        RawColumn("value", column.type, primary_key=True),
+        prefixes=["TEMPORARY"],
+    )
+
+
+async def load_search_values(conn, table, search) -> None:
+    """Fill the temporary tables used by the large vector filters of ``search``
+
+    Temporary tables are private to the DB session and they are only emptied
+    the next time they are used, so they must be filled using the connection
+    which executes the search.
+    """
+    for i, slot in _temporary_table_slots(search_shape(search)).items():
+        query = search[i]
+        values_table = search_values_table(table.columns[query["parameter"]], slot)
+        await conn.execute(CreateTable(values_table, if_not_exists=True))
+        await conn.execute(delete(values_table))
+        await conn.execute(
+            insert(values_table),
+            [{"value": value} for value in dict.fromkeys(query["values"])],
+        )
+
+
+@lru_cache(maxsize=SEARCH_FILTERS_CACHE_SIZE)
+def search_filters(table, shape: tuple[tuple[str, str], ...]):
+    """Build the filters of a search of the given shape
+
+    The values are not part of the expressions, they are bound when executing
+    the statement using :func:`search_params`. The same expressions can
+    therefore be reused for all the searches with the same shape, which saves
+    building them and lets SQLAlchemy find the compiled SQL in its cache.
+
+    ``search`` must have been prepared with :func:`plan_search`. Vector
+    filters with more than ``LARGE_IN_THRESHOLD`` values are instead
+    answered by joining against a temporary table which must be filled with
+    :func:`load_search_values`. This avoids sending and compiling statements
+    with one parameter per value.
+    """
+    filters = []
+    slots = _temporary_table_slots(shape)
+    for i, (parameter, operator) in enumerate(shape):
+        column = table.columns[parameter]
+        value: BindParameter[Any] = bindparam(f"search_{i}", type_=column.type)
+        if operator == "eq":
+            expr = column == value
+        elif operator == "neq":
+            expr = column != value
+        elif operator == "gt":
+            expr = column > value
+        elif operator == "lt":
+            expr = column < value
+        elif operator == "in":
+            expr = column.in_(
+                bindparam(f"search_{i}", type_=column.type, expanding=True)
+            )
+        elif operator == "not in":
+            expr = column.not_in(
+                bindparam(f"search_{i}", type_=column.type, expanding=True)
+            )
+        elif operator == IN_TEMPORARY_TABLE:
+            expr = column.in_(select(search_values_table(column, slots[i]).c.value))
+        elif operator == NOT_IN_TEMPORARY_TABLE:
+            expr = column.not_in(select(search_values_table(column, slots[i]).c.value))
+        elif operator == "like":
+            expr = column.like(value)
+        else:
+            raise InvalidQueryError(f"Unknown filter {operator=}")
+        filters.append(expr)
+    return tuple(filters)
+
+
+async def apply_search_filters(conn, table, stmt, search):
+    """Filter ``stmt`` using ``search``
+
+    Returns the statement together with the parameters which must be passed
+    when executing it with ``conn``.
+    """
+    search = plan_search(table, search)
+    await load_search_values(conn, table, search)
+    stmt = stmt.where(*search_filters(table, search_shape(search)))
+    return stmt, search_params(search)
+
+
+def ordering_uses_index(table, ordering, search) -> bool:
+    """Check if rows can be returned in the given order by walking an index
+
+    ``ordering`` is a list of ``(column, direction)`` pairs. Columns which
+    are fixed by an equality filter in ``search`` can be ignored in both the
+    ordering and the index. As the primary key is implicitly appended to
+    secondary indexes it is taken into account too. Indexes can be scanned
+    in either direction so the remaining directions must all be the same.
+    """
+    pinned = {query["parameter"] for query in search if query["operator"] == "eq"}
+    remaining = [(c.name, d) for c, d in ordering if c.name not in pinned]
+    if len({d for _, d in remaining}) > 1:
+        return False
+    sort_columns = [name for name, _ in remaining]
+
+    primary_key = [c.name for c in table.primary_key.columns]
+    candidates = [primary_key] + [
+        [c.name for c in index.columns] + primary_key for index in table.indexes
+    ]
+    for key in candidates:
+        i = 0
+        for name in key:
+            if i < len(sort_columns) and name == sort_columns[i]:
+                i += 1
+            elif name not in pinned:
+                break
+        if i == len(sort_columns):
+            return True
+    return False
+
+
+def apply_keyset_pagination(stmt, ordering, last_values):
+    """Only keep the rows which come strictly after ``last_values``
+
+    ``ordering`` is a list of ``(column, direction)`` pairs which must end with
+    a unique column so that the ordering is total. NULLs are assumed to sort
+    first in ascending order and last in descending order, which is the
+    behaviour of both MySQL and SQLite.
+    """
+    clauses = []
+    for i, ((column, direction), value) in enumerate(zip(ordering, last_values)):
+        equal = [
+            c.is_(None) if v is None else c == v
+            for (c, _), v in zip(ordering[:i], last_values[:i])
+        ]
+        if direction == "asc":
+            after = column.is_not(None) if value is None else column > value
         else:
-            raise InvalidQueryError(f"Unknown filter {query=}")
-        stmt = stmt.where(expr)
-    return stmt
+            after = false() if value is None else or_(column < value, column.is_(None))
+        clauses.append(and_(*equal, after))
+    return stmt.where(or_(*clauses))
+
+
+def encode_cursor(ordering, row: dict[str, Any]) -> str:
+    """Build an opaque continuation token pointing after ``row``"""
+    values = []
+    for column, _ in ordering:
+        value = row[column.name]
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        values.append(value)
+    payload = {
+        "ordering": [[column.name, direction] for column, direction in ordering],
+        "values": values,
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(ordering, cursor: str) -> list[Any]:
+    """Extract the values of the last returned row from a continuation token
+
+    :raises: InvalidQueryError if the cursor is malformed or was built for a
+        different ordering
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        expected = [[column.name, direction] for column, direction in ordering]
+        if payload["ordering"] != expected:
+            raise InvalidQueryError("Cursor does not match the requested ordering")
+        values = payload["values"]
+        return [
+            datetime.fromisoformat(value)
+            if isinstance(value, str) and isinstance(column.type, DateTime)
+            else value
+            for (column, _), value in zip(ordering, values, strict=True)
+        ]
+    except (binascii.Error, KeyError, TypeError, ValueError) as e:
+        raise InvalidQueryError(f"Malformed cursor {cursor!r}") from e
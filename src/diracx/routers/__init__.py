@@ -3,25 +3,27 @@ from __future__ import annotations
 import inspect
 import logging
 import os
+import secrets
 from functools import partial
-from typing import AsyncContextManager, AsyncGenerator, Iterable, TypeVar
+from typing import Annotated, AsyncContextManager, AsyncGenerator, Iterable, TypeVar
 
 import dotenv
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from fastapi.dependencies.models import Dependant
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.routing import APIRoute
-from pydantic import parse_raw_as
+from pydantic import BaseSettings, SecretStr, parse_raw_as
 
 from diracx.core.config import ConfigSource
 from diracx.core.exceptions import DiracError, DiracHttpResponse
 from diracx.core.extensions import select_from_extension
-from diracx.core.utils import dotenv_files_from_environment
-from diracx.db.utils import BaseDB
+from diracx.core.utils import SingleFlightCache, dotenv_files_from_environment
+from diracx.db.utils import BaseDB, DBSettings
 
 from ..core.settings import ServiceSettingsBase
 from .auth import verify_dirac_token
 from .fastapi_classes import DiracFastAPI, DiracxRouter
+from .http_client import SharedHTTPClient
 
 T = TypeVar("T")
 T2 = TypeVar("T2", bound=AsyncContextManager)
@@ -41,6 +43,9 @@ def create_app_inner(
     all_service_settings: Iterable[ServiceSettingsBase],
     database_urls: dict[str, str],
     config_source: ConfigSource,
+    read_only_database_urls: dict[str, list[str]] | None = None,
+    http_client: SharedHTTPClient | None = None,
+    metrics_settings: MetricsSettings | None = None,
 ) -> DiracFastAPI:
     app = DiracFastAPI()
 
@@ -55,8 +60,14 @@ def create_app_inner(
     # Override the configuration source
     app.dependency_overrides[ConfigSource.create] = config_source.read_config
 
+    # Share a single HTTP client for all the outbound requests
+    http_client = http_client or SharedHTTPClient()
+    app.lifetime_functions.append(http_client.client_context)
+    app.dependency_overrides[SharedHTTPClient.create] = lambda: http_client.client
+
     # Add the DBs to the application
     available_db_classes: set[type[BaseDB]] = set()
+    dbs: dict[str, BaseDB] = {}
     for db_name, db_url in database_urls.items():
         db_classes: list[type[BaseDB]] = [
             entry_point.load()
@@ -64,7 +75,12 @@ def create_app_inner(
         ]
         assert db_classes, f"Could not find {db_name=}"
         # The first DB is the highest priority one
-        db = db_classes[0](db_url=db_url)
+        db = db_classes[0](
+            db_url=db_url,
+            settings=DBSettings.for_db(db_name),
+            read_only_urls=(read_only_database_urls or {}).get(db_name),
+        )
+        dbs[db_name] = db
         app.lifetime_functions.append(db.engine_context)
         # Add overrides for all the DB classes, including those from extensions
         # This means vanilla DiracX routers get an instance of the extension's DB
@@ -118,9 +134,94 @@ def create_app_inner(
     app.add_exception_handler(DiracError, dirac_error_handler)
     app.add_exception_handler(DiracHttpResponse, http_response_handler)
 
+    # Expose metrics about the current worker in the Prometheus text format
+    metrics_settings = metrics_settings or MetricsSettings()
+    if metrics_settings.token is not None:
+        expected_authorization = f"Bearer {metrics_settings.token.get_secret_value()}"
+
+        @app.get("/metrics", tags=["metrics"], include_in_schema=False)
+        async def metrics(
+            authorization: Annotated[str | None, Header()] = None
+        ) -> PlainTextResponse:
+            if authorization is None or not secrets.compare_digest(
+                authorization.encode(), expected_authorization.encode()
+            ):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            return PlainTextResponse(format_metrics(dbs))
+
     return app
 
 
+class MetricsSettings(BaseSettings, env_prefix="DIRACX_METRICS_"):
+    """Access to ``/metrics``, read from ``DIRACX_METRICS_{OPTION}``
+
+    The endpoint is only served if a token is set, scrapers must send it as
+    a bearer token.
+    """
+
+    token: SecretStr | None = None
+
+
+def format_metrics(dbs: dict[str, BaseDB]) -> str:
+    lines = []
+    for name, kind, description, attr in [
+        (
+            "diracx_db_pool_checkouts_total",
+            "counter",
+            "Number of connections checked out of the pool",
+            "checkouts",
+        ),
+        (
+            "diracx_db_pool_checkout_wait_seconds_total",
+            "counter",
+            "Time spent waiting for a connection from the pool",
+            "checkout_wait_seconds",
+        ),
+        (
+            "diracx_db_pool_connections_in_use",
+            "gauge",
+            "Number of connections currently checked out of the pool",
+            "in_use",
+        ),
+        (
+            "diracx_db_pool_overflows_total",
+            "counter",
+            "Number of connections opened beyond the pool size",
+            "overflows",
+        ),
+        (
+            "diracx_db_retryable_errors_total",
+            "counter",
+            "Number of transactions rolled back to be retried, e.g. after a deadlock",
+            "retryable_errors",
+        ),
+    ]:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for db_name, db in dbs.items():
+            lines.append(f'{name}{{db="{db_name}"}} {getattr(db.pool_stats, attr)}')
+    for name, description, attr in [
+        (
+            "diracx_query_cache_hits_total",
+            "Number of lookups answered from a query cache",
+            "hits",
+        ),
+        (
+            "diracx_query_cache_misses_total",
+            "Number of lookups which had to run the query",
+            "misses",
+        ),
+    ]:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} counter")
+        for cache_name, cache in sorted(SingleFlightCache.instances.items()):
+            lines.append(f'{name}{{cache="{cache_name}"}} {getattr(cache, attr)}')
+    return "\n".join(lines) + "\n"
+
+
 def create_app() -> DiracFastAPI:
     """Load settings from the environment and create the application object"""
     for env_file in dotenv_files_from_environment("DIRACX_SERVICE_DOTENV"):
@@ -151,6 +252,7 @@ def create_app() -> DiracFastAPI:
         all_service_settings=all_service_settings,
         database_urls=BaseDB.available_urls(),
         config_source=ConfigSource.create(),
+        read_only_database_urls=BaseDB.available_read_only_urls(),
     )
 
 
@@ -1,19 +1,34 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import hashlib
 import json
+import logging
 import re
 import secrets
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Annotated, Literal, TypedDict
+from functools import partial
+from typing import (
+    Annotated,
+    Any,
+    Callable,
+    Coroutine,
+    Literal,
+    NamedTuple,
+    TypedDict,
+    TypeVar,
+)
 from uuid import UUID, uuid4
 
 import httpx
+from authlib.common.encoding import json_loads, urlsafe_b64decode
 from authlib.integrations.starlette_client import OAuthError
-from authlib.jose import JoseError, JsonWebKey, JsonWebToken
+from authlib.jose import JoseError, JsonWebKey, JsonWebToken, KeySet
 from authlib.oidc.core import IDToken
-from cachetools import TTLCache
+from cachetools import Cache, TLRUCache
 from fastapi import (
     Depends,
     Form,
@@ -23,7 +38,7 @@ from fastapi import (
     responses,
     status,
 )
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.security import OpenIdConnect
 from pydantic import BaseModel, Field
 
@@ -34,15 +49,20 @@ from diracx.core.exceptions import (
 )
 from diracx.core.properties import SecurityProperty, UnevaluatedProperty
 from diracx.core.settings import ServiceSettingsBase, TokenSigningKey
-from diracx.db.auth.schema import FlowStatus
+from diracx.db.auth.schema import FlowStatus, RefreshTokenStatus
 
 from .dependencies import (
     AuthDB,
     AvailableSecurityProperties,
     Config,
+    HTTPClient,
     add_settings_annotation,
 )
-from .fastapi_classes import DiracxRouter
+from .fastapi_classes import DiracxRouter, retry_deadlocks
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
 
 oidc_scheme = OpenIdConnect(openIdConnectUrl="/.well-known/openid-configuration")
 
@@ -59,14 +79,31 @@ class AuthSettings(ServiceSettingsBase, env_prefix="DIRACX_SERVICE_AUTH_"):
     token_issuer: str = "http://lhcbdirac.cern.ch/"
     token_audience: str = "dirac"
     token_key: TokenSigningKey
-    token_algorithm: str = "RS256"
-    access_token_expire_minutes: int = 3000
+    # Defaults to the algorithm matching the type of token_key
+    token_algorithm: str | None = None
+    # Keys which signed tokens before token_key, these tokens are still
+    # accepted and the keys are published in the JWKS until they are removed
+    token_retiring_keys: list[TokenSigningKey] = []
+    # Access tokens are short lived as they can't be revoked, clients get new
+    # ones with their refresh token without contacting the IdP
+    access_token_expire_minutes: int = 20
     refresh_token_expire_minutes: int = 3000
 
     available_properties: set[SecurityProperty] = Field(
         default_factory=SecurityProperty.available_properties
     )
 
+    @property
+    def signing_algorithm(self) -> str:
+        return self.token_algorithm or self.token_key.algorithm
+
+    def verification_keys(self) -> dict[str, tuple[JsonWebKey, str]]:
+        """The keys which tokens can be signed with and their algorithm, by kid"""
+        keys = {self.token_key.kid: (self.token_key.jwk, self.signing_algorithm)}
+        for key in self.token_retiring_keys:
+            keys.setdefault(key.kid, (key.jwk, key.algorithm))
+        return keys
+
 
 def has_properties(expression: UnevaluatedProperty | SecurityProperty):
     evaluator = (
@@ -85,53 +122,166 @@ def has_properties(expression: UnevaluatedProperty | SecurityProperty):
 class TokenResponse(BaseModel):
     # Base on RFC 6749
     access_token: str
-    # refresh_token: str
     expires_in: int
+    refresh_token: str
     state: str
 
 
 router = DiracxRouter(require_auth=False)
 
-_server_metadata_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+SERVER_METADATA_TTL_SECONDS = 3600
+# Expired server metadata keeps being used for this long while it can't be
+# refreshed, e.g. because the IdP is slow or down
+SERVER_METADATA_GRACE_SECONDS = 6 * 3600
+
+
+class _CachedServerMetadata(NamedTuple):
+    server_metadata: dict
+    fetched: float
+
 
+_server_metadata_cache: dict[str, _CachedServerMetadata] = {}
+_server_metadata_fetches: dict[str, asyncio.Task[dict]] = {}
 
-async def get_server_metadata(url: str):
-    server_metadata = _server_metadata_cache.get(url)
-    if server_metadata is None:
-        async with httpx.AsyncClient() as c:
-            res = await c.get(url)
-            if res.status_code != 200:
-                # TODO: Better error handling
-                raise NotImplementedError(res)
-            server_metadata = res.json()
-            _server_metadata_cache[url] = server_metadata
+
+def _fetch_once(
+    fetches: dict[str, asyncio.Task[T]],
+    url: str,
+    fetch: Callable[[], Coroutine[Any, Any, T]],
+) -> asyncio.Task[T]:
+    """Start ``fetch`` unless a fetch of ``url`` is already running
+
+    Concurrent callers share the same task so the IdP is only contacted once.
+    """
+    if (task := fetches.get(url)) is None:
+        task = asyncio.create_task(fetch())
+        fetches[url] = task
+        task.add_done_callback(lambda _: fetches.pop(url, None))
+    return task
+
+
+def _log_refresh_failure(what: str, url: str, task: asyncio.Task) -> None:
+    if not task.cancelled() and (exc := task.exception()) is not None:
+        logger.warning("Failed to refresh the %s of %s: %r", what, url, exc)
+
+
+async def _download_server_metadata(http_client: httpx.AsyncClient, url: str) -> dict:
+    res = await http_client.get(url)
+    if res.status_code != 200:
+        # TODO: Better error handling
+        raise NotImplementedError(res)
+    server_metadata = res.json()
+    _server_metadata_cache[url] = _CachedServerMetadata(
+        server_metadata, time.monotonic()
+    )
     return server_metadata
 
 
-async def fetch_jwk_set(url: str):
-    server_metadata = await get_server_metadata(url)
+async def get_server_metadata(http_client: httpx.AsyncClient, url: str) -> dict:
+    """Get the OpenID Connect server metadata from the given URL
+
+    Once it is older than ``SERVER_METADATA_TTL_SECONDS``, the cached metadata
+    is still returned while a single background task refreshes it. Only
+    after ``SERVER_METADATA_GRACE_SECONDS`` more without a successful refresh
+    do callers wait for the IdP again.
+    """
+    fetch = partial(_download_server_metadata, http_client, url)
+    cached = _server_metadata_cache.get(url)
+    if cached is None:
+        return await asyncio.shield(_fetch_once(_server_metadata_fetches, url, fetch))
+    age = time.monotonic() - cached.fetched
+    if age > SERVER_METADATA_TTL_SECONDS + SERVER_METADATA_GRACE_SECONDS:
+        return await asyncio.shield(_fetch_once(_server_metadata_fetches, url, fetch))
+    if age > SERVER_METADATA_TTL_SECONDS:
+        _fetch_once(_server_metadata_fetches, url, fetch).add_done_callback(
+            partial(_log_refresh_failure, "server metadata", url)
+        )
+    return cached.server_metadata
+
+
+JWKS_TTL_SECONDS = 3600
+# Cached key sets are refreshed in the background when they get this close to
+# expiring so logins don't wait for the IdP
+JWKS_REFRESH_AHEAD_SECONDS = 300
+# Tokens signed with an unknown key trigger a refetch, at most this often
+JWKS_MIN_REFETCH_INTERVAL_SECONDS = 60
+
+
+class _CachedKeySet(NamedTuple):
+    key_set: KeySet
+    fetched: float
+
+
+_jwks_cache: dict[str, _CachedKeySet] = {}
+_jwks_fetches: dict[str, asyncio.Task[KeySet]] = {}
+
+
+async def _download_jwk_set(http_client: httpx.AsyncClient, url: str) -> KeySet:
+    server_metadata = await get_server_metadata(http_client, url)
 
     jwks_uri = server_metadata.get("jwks_uri")
     if not jwks_uri:
         raise RuntimeError('Missing "jwks_uri" in metadata')
 
-    async with httpx.AsyncClient() as c:
-        res = await c.get(jwks_uri)
-        if res.status_code != 200:
-            # TODO: Better error handling
-            raise NotImplementedError(res)
-        jwk_set = res.json()
+    res = await http_client.get(jwks_uri)
+    if res.status_code != 200:
+        # TODO: Better error handling
+        raise NotImplementedError(res)
+    jwk_set = res.json()
 
-    # self.server_metadata['jwks'] = jwk_set
-    return JsonWebKey.import_key_set(jwk_set)
+    key_set = JsonWebKey.import_key_set(jwk_set)
+    _jwks_cache[url] = _CachedKeySet(key_set, time.monotonic())
+    return key_set
 
 
-async def parse_id_token(config, vo, raw_id_token: str, audience: str):
+async def fetch_jwk_set(
+    http_client: httpx.AsyncClient, url: str, kid: str | None = None
+) -> KeySet:
+    """Get the key set of the IdP with the given server metadata URL
+
+    Key sets are cached for ``JWKS_TTL_SECONDS`` and refreshed in the
+    background shortly before they expire. If ``kid`` isn't in the cached key
+    set the IdP may have rotated its keys so it is fetched again, at most once
+    every ``JWKS_MIN_REFETCH_INTERVAL_SECONDS``.
+    """
+    fetch = partial(_download_jwk_set, http_client, url)
+    cached = _jwks_cache.get(url)
+    if cached is None:
+        return await asyncio.shield(_fetch_once(_jwks_fetches, url, fetch))
+    age = time.monotonic() - cached.fetched
+    if age > JWKS_TTL_SECONDS:
+        return await asyncio.shield(_fetch_once(_jwks_fetches, url, fetch))
+    if kid is not None and not any(key.kid == kid for key in cached.key_set.keys):
+        if age > JWKS_MIN_REFETCH_INTERVAL_SECONDS:
+            return await asyncio.shield(_fetch_once(_jwks_fetches, url, fetch))
+    elif age > JWKS_TTL_SECONDS - JWKS_REFRESH_AHEAD_SECONDS:
+        _fetch_once(_jwks_fetches, url, fetch).add_done_callback(
+            partial(_log_refresh_failure, "JWKS", url)
+        )
+    return cached.key_set
+
+
+def _token_kid(raw_token: str) -> str | None:
+    """Get the ID of the key used to sign a JWT without verifying it"""
+    try:
+        header = json_loads(urlsafe_b64decode(raw_token.split(".", 1)[0].encode()))
+    except ValueError:
+        return None
+    return header.get("kid") if isinstance(header, dict) else None
+
+
+async def parse_id_token(
+    http_client: httpx.AsyncClient, config, vo, raw_id_token: str, audience: str
+):
     server_metadata = await get_server_metadata(
-        config.Registry[vo].IdP.server_metadata_url
+        http_client, config.Registry[vo].IdP.server_metadata_url
     )
     alg_values = server_metadata.get("id_token_signing_alg_values_supported", ["RS256"])
-    jwk_set = await fetch_jwk_set(config.Registry[vo].IdP.server_metadata_url)
+    jwk_set = await fetch_jwk_set(
+        http_client,
+        config.Registry[vo].IdP.server_metadata_url,
+        _token_kid(raw_id_token),
+    )
 
     token = JsonWebToken(alg_values).decode(
         raw_id_token,
@@ -166,39 +316,135 @@ class UserInfo(AuthInfo):
     vo: str
 
 
-async def verify_dirac_token(
-    authorization: Annotated[str, Depends(oidc_scheme)],
-    settings: AuthSettings,
-) -> UserInfo:
-    """Verify dirac user token and return a UserInfo class
-    Used for each API endpoint
+class _VerifiedToken(NamedTuple):
+    user_info: UserInfo
+    expires: float
+
+
+VERIFIED_TOKEN_CACHE_SIZE = 4096
+
+
+class _VerifiedTokenCache(TLRUCache):
+    """Tokens which were already verified, keyed by the hash of the raw token
+    and the settings it was verified with
+
+    The keys of the entries of each user are indexed so they can be evicted
+    when the tokens of the user are revoked.
     """
-    if match := re.fullmatch(r"Bearer (.+)", authorization):
-        raw_token = match.group(1)
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid authorization header",
+
+    def __init__(self, maxsize: int):
+        super().__init__(
+            maxsize=maxsize,
+            ttu=lambda _key, entry, _now: entry.expires,
+            timer=time.time,
         )
+        self._keys_by_sub: defaultdict[str, set] = defaultdict(set)
+
+    def __setitem__(self, key, entry: _VerifiedToken) -> None:
+        super().__setitem__(key, entry)
+        self._keys_by_sub[entry.user_info.sub].add(key)
+
+    def __delitem__(self, key) -> None:
+        # Expired entries are still there, but can't be read with self[key]
+        self._unindex(key, Cache.__getitem__(self, key))
+        super().__delitem__(key)
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, entry in expired:
+            self._unindex(key, entry)
+        return expired
+
+    def clear(self) -> None:
+        super().clear()
+        self._keys_by_sub.clear()
+
+    def _unindex(self, key, entry: _VerifiedToken) -> None:
+        keys = self._keys_by_sub.get(entry.user_info.sub)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_sub[entry.user_info.sub]
+
+    def evict_user(self, sub: str) -> None:
+        for key in self._keys_by_sub.pop(sub, set()):
+            self.pop(key, None)
+
+
+# The signature of a token is only checked once until it expires
+_verified_token_cache = _VerifiedTokenCache(VERIFIED_TOKEN_CACHE_SIZE)
 
+
+def revoke_verified_tokens(sub: str) -> None:
+    """Forget the cached verifications of the access tokens of ``sub``
+
+    This must be called when the tokens of a user are revoked so their
+    access tokens are verified again instead of being accepted from the cache.
+    """
+    _verified_token_cache.evict_user(sub)
+
+
+def decode_dirac_token(raw_token: str, settings: AuthSettings, audience: str):
+    """Verify the signature and claims of a token issued by DiracX
+
+    Access tokens are issued for ``settings.token_audience`` while refresh
+    tokens are issued for the token issuer itself so one can't be used as the
+    other.
+    """
     try:
-        jwt = JsonWebToken(settings.token_algorithm)
+        # Tokens issued before key rollover was supported have no kid
+        kid = _token_kid(raw_token) or settings.token_key.kid
+        key, algorithm = settings.verification_keys()[kid]
+        jwt = JsonWebToken([algorithm])
         token = jwt.decode(
             raw_token,
-            key=settings.token_key.jwk,
+            key=key,
             claims_options={
                 "iss": {"values": [settings.token_issuer]},
-                "aud": {"values": [settings.token_audience]},
+                "aud": {"values": [audience]},
             },
         )
         token.validate()
-    except JoseError:
+    except (JoseError, KeyError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid JWT",
         ) from None
+    return token
 
-    return UserInfo(
+
+async def verify_dirac_token(
+    authorization: Annotated[str, Depends(oidc_scheme)],
+    settings: AuthSettings,
+) -> UserInfo:
+    """Verify dirac user token and return a UserInfo class
+    Used for each API endpoint
+    """
+    if match := re.fullmatch(r"Bearer (.+)", authorization):
+        raw_token = match.group(1)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid authorization header",
+        )
+
+    # Tokens issued before key rollover was supported have no kid
+    kid = _token_kid(raw_token) or settings.token_key.kid
+    cache_key = (
+        hashlib.sha256(raw_token.encode()).digest(),
+        kid,
+        settings.token_issuer,
+        settings.token_audience,
+    )
+    # The key which signed the token may have been removed since it was cached
+    if kid in settings.verification_keys() and (
+        entry := _verified_token_cache.get(cache_key)
+    ):
+        return entry.user_info
+
+    token = decode_dirac_token(raw_token, settings, settings.token_audience)
+
+    user_info = UserInfo(
         bearer_token=raw_token,
         token_id=token["jti"],
         properties=token["dirac_properties"],
@@ -207,6 +453,9 @@ async def verify_dirac_token(
         dirac_group=token["dirac_group"],
         vo=token["vo"],
     )
+    if "exp" in token:
+        _verified_token_cache[cache_key] = _VerifiedToken(user_info, token["exp"])
+    return user_info
 
 
 def create_access_token(
@@ -221,9 +470,11 @@ def create_access_token(
         )
     to_encode.update({"exp": expire})
 
-    jwt = JsonWebToken(settings.token_algorithm)
+    jwt = JsonWebToken(settings.signing_algorithm)
     encoded_jwt = jwt.encode(
-        {"alg": settings.token_algorithm}, payload, settings.token_key.jwk
+        {"alg": settings.signing_algorithm, "kid": settings.token_key.kid},
+        to_encode,
+        settings.token_key.jwk,
     )
     return encoded_jwt.decode("ascii")
 
@@ -231,9 +482,11 @@ def create_access_token(
 async def exchange_token(
     vo: str,
     dirac_group: str,
+    scope: str,
     id_token: dict[str, str],
     config: Config,
     settings: AuthSettings,
+    auth_db: AuthDB,
 ) -> TokenResponse:
     """Method called to exchange the OIDC token for a DIRAC generated access token"""
     sub = id_token["sub"]
@@ -255,9 +508,26 @@ async def exchange_token(
         "dirac_group": dirac_group,
     }
 
+    await auth_db.delete_expired_refresh_tokens(
+        settings.refresh_token_expire_minutes * 60, sub
+    )
+    refresh_token_id = str(uuid4())
+    await auth_db.insert_refresh_token(refresh_token_id, sub, preferred_username, scope)
+    refresh_payload = {
+        "sub": f"{vo}:{sub}",
+        "aud": settings.token_issuer,
+        "iss": settings.token_issuer,
+        "jti": refresh_token_id,
+    }
+
     return TokenResponse(
         access_token=create_access_token(payload, settings),
         expires_in=settings.access_token_expire_minutes * 60,
+        refresh_token=create_access_token(
+            refresh_payload,
+            settings,
+            timedelta(minutes=settings.refresh_token_expire_minutes),
+        ),
         state="None",
     )
 
@@ -271,6 +541,7 @@ class InitiateDeviceFlowResponse(TypedDict):
 
 
 @router.post("/device")
+@retry_deadlocks
 async def initiate_device_flow(
     client_id: str,
     scope: str,
@@ -318,7 +589,11 @@ async def initiate_device_flow(
 
 
 async def initiate_authorization_flow_with_iam(
-    config, vo: str, redirect_uri: str, state: dict[str, str]
+    http_client: httpx.AsyncClient,
+    config,
+    vo: str,
+    redirect_uri: str,
+    state: dict[str, str],
 ):
     # code_verifier: https://www.rfc-editor.org/rfc/rfc7636#section-4.1
     code_verifier = secrets.token_hex()
@@ -331,7 +606,7 @@ async def initiate_authorization_flow_with_iam(
     )
 
     server_metadata = await get_server_metadata(
-        config.Registry[vo].IdP.server_metadata_url
+        http_client, config.Registry[vo].IdP.server_metadata_url
     )
 
     # Take these two from CS/.well-known
@@ -356,10 +631,15 @@ async def initiate_authorization_flow_with_iam(
 
 
 async def get_token_from_iam(
-    config, vo: str, code: str, state: dict[str, str], redirect_uri: str
+    http_client: httpx.AsyncClient,
+    config,
+    vo: str,
+    code: str,
+    state: dict[str, str],
+    redirect_uri: str,
 ) -> dict[str, str]:
     server_metadata = await get_server_metadata(
-        config.Registry[vo].IdP.server_metadata_url
+        http_client, config.Registry[vo].IdP.server_metadata_url
     )
 
     # Take these two from CS/.well-known
@@ -373,22 +653,22 @@ async def get_token_from_iam(
         "redirect_uri": redirect_uri,
     }
 
-    async with httpx.AsyncClient() as c:
-        res = await c.post(
-            token_endpoint,
-            data=data,
+    res = await http_client.post(
+        token_endpoint,
+        data=data,
+    )
+    if res.status_code >= 500:
+        raise HTTPException(
+            status.HTTP_502_BAD_GATEWAY, "Failed to contact token endpoint"
         )
-        if res.status_code >= 500:
-            raise HTTPException(
-                status.HTTP_502_BAD_GATEWAY, "Failed to contact token endpoint"
-            )
-        elif res.status_code >= 400:
-            raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid code")
+    elif res.status_code >= 400:
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid code")
 
     raw_id_token = res.json()["id_token"]
     # Extract the payload and verify it
     try:
         id_token = await parse_id_token(
+            http_client=http_client,
             config=config,
             vo=vo,
             raw_id_token=raw_id_token,
@@ -408,6 +688,7 @@ async def do_device_flow(
     config: Config,
     available_properties: AvailableSecurityProperties,
     settings: AuthSettings,
+    http_client: HTTPClient,
 ) -> RedirectResponse:
     """
     This is called as the verification URI for the device flow.
@@ -434,7 +715,7 @@ async def do_device_flow(
     }
 
     authorization_flow_url = await initiate_authorization_flow_with_iam(
-        config, parsed_scope["vo"], redirect_uri, state_for_iam
+        http_client, config, parsed_scope["vo"], redirect_uri, state_for_iam
     )
     return RedirectResponse(authorization_flow_url)
 
@@ -457,6 +738,7 @@ async def finish_device_flow(
     auth_db: AuthDB,
     config: Config,
     settings: AuthSettings,
+    http_client: HTTPClient,
 ):
     """
     This the url callbacked by IAM/Checkin after the authorization
@@ -471,6 +753,7 @@ async def finish_device_flow(
     )
 
     id_token = await get_token_from_iam(
+        http_client,
         config,
         decrypted_state["vo"],
         code,
@@ -620,11 +903,13 @@ def parse_and_validate_scope(
 #     ...
 
 
-@router.post("/token")
+@router.post("/token", response_model=TokenResponse)
+@retry_deadlocks
 async def token(
     grant_type: Annotated[
         Literal["authorization_code"]
-        | Literal["urn:ietf:params:oauth:grant-type:device_code"],
+        | Literal["urn:ietf:params:oauth:grant-type:device_code"]
+        | Literal["refresh_token"],
         Form(description="OAuth2 Grant type"),
     ],
     client_id: Annotated[str, Form(description="OAuth2 client id")],
@@ -648,7 +933,11 @@ async def token(
             description="Verifier for the code challenge for the OAuth2 authorization flow with PKCE"
         ),
     ] = None,
-) -> TokenResponse:
+    refresh_token: Annotated[
+        str | None,
+        Form(description="Refresh token for the OAuth2 refresh token grant"),
+    ] = None,
+) -> TokenResponse | JSONResponse:
     """ " Token endpoint to retrieve the token at the end of a flow.
     This is the endpoint being pulled by dirac-login when doing the device flow
     """
@@ -708,6 +997,50 @@ async def token(
                 detail="Invalid code_challenge",
             )
 
+    elif grant_type == "refresh_token":
+        if refresh_token is None:
+            raise DiracHttpResponse(
+                status.HTTP_400_BAD_REQUEST,
+                {
+                    "error": "invalid_request",
+                    "error_description": "refresh_token is required",
+                },
+            )
+        if settings.dirac_client_id != client_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Bad client_id"
+            )
+        refresh_claims = decode_dirac_token(
+            refresh_token, settings, settings.token_issuer
+        )
+        info = await auth_db.use_refresh_token(
+            refresh_claims["jti"], settings.refresh_token_expire_minutes * 60
+        )
+        if info["status"] != RefreshTokenStatus.CREATED:
+            revoke_verified_tokens(refresh_claims["sub"])
+            # Returned rather than raised so the revocation of the other
+            # refresh tokens of the user is committed
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={
+                    "error": "invalid_grant",
+                    "error_description": "Refresh token was already used",
+                },
+            )
+        # The user may have been removed from the group in the meantime
+        parsed_scope = parse_and_validate_scope(
+            info["scope"], config, available_properties
+        )
+        return await exchange_token(
+            parsed_scope["vo"],
+            parsed_scope["group"],
+            info["scope"],
+            {"sub": info["sub"], "preferred_username": info["preferred_username"]},
+            config,
+            settings,
+            auth_db,
+        )
+
     else:
         raise NotImplementedError(f"Grant type not implemented {grant_type}")
 
@@ -722,9 +1055,11 @@ async def token(
     return await exchange_token(
         parsed_scope["vo"],
         parsed_scope["group"],
+        info["scope"],
         info["id_token"],
         config,
         settings,
+        auth_db,
     )
 
 
@@ -742,6 +1077,7 @@ async def authorization_flow(
     config: Config,
     available_properties: AvailableSecurityProperties,
     settings: AuthSettings,
+    http_client: HTTPClient,
 ):
     if settings.dirac_client_id != client_id:
         raise HTTPException(
@@ -776,6 +1112,7 @@ async def authorization_flow(
     }
 
     authorization_flow_url = await initiate_authorization_flow_with_iam(
+        http_client,
         config,
         parsed_scope["vo"],
         f"{request.url.replace(query='')}/complete",
@@ -793,11 +1130,13 @@ async def authorization_flow_complete(
     auth_db: AuthDB,
     config: Config,
     settings: AuthSettings,
+    http_client: HTTPClient,
 ):
     decrypted_state = decrypt_state(state)
     assert decrypted_state["grant_type"] == "authorization_code"
 
     id_token = await get_token_from_iam(
+        http_client,
         config,
         decrypted_state["vo"],
         code,
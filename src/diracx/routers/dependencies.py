@@ -6,10 +6,12 @@ __all__ = (
     "JobDB",
     "add_settings_annotation",
     "AvailableSecurityProperties",
+    "HTTPClient",
 )
 
 from typing import Annotated, TypeVar
 
+import httpx
 from fastapi import Depends
 
 from diracx.core.config import Config as _Config
@@ -18,6 +20,8 @@ from diracx.core.properties import SecurityProperty
 from diracx.db import AuthDB as _AuthDB
 from diracx.db import JobDB as _JobDB
 
+from .http_client import SharedHTTPClient
+
 T = TypeVar("T")
 
 
@@ -35,3 +39,4 @@ Config = Annotated[_Config, Depends(ConfigSource.create)]
 AvailableSecurityProperties = Annotated[
     set[SecurityProperty], Depends(SecurityProperty.available_properties)
 ]
+HTTPClient = Annotated[httpx.AsyncClient, Depends(SharedHTTPClient.create)]
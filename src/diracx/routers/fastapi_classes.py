@@ -2,12 +2,27 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
-from typing import TypeVar
+import itertools
+import logging
+import random
+from typing import Any, Callable, Coroutine, TypeVar
 
-from fastapi import APIRouter, FastAPI
+from fastapi import APIRouter, FastAPI, Request, Response, status
+from fastapi.routing import APIRoute
+from sqlalchemy.exc import DBAPIError
+
+from diracx.core.exceptions import DiracHttpResponse
+from diracx.db.utils import is_retryable_error
 
 T = TypeVar("T")
 
+logger = logging.getLogger(__name__)
+
+# Number of times a request is attempted if its DB transactions deadlock
+MAX_TRANSACTION_ATTEMPTS = 4
+# Upper bound of the random delay before the first retry, doubled each time
+TRANSACTION_RETRY_DELAY = 0.05
+
 # Rules:
 # All routes must have tags (needed for auto gen of client)
 # Form headers must have a description (autogen)
@@ -48,6 +63,60 @@ class DiracFastAPI(FastAPI):
         return self.openapi_schema
 
 
+def retry_deadlocks(endpoint: T) -> T:
+    """Allow a route to be run again if one of its DB transactions deadlocks
+
+    Everything the endpoint does is done again so this must only be used
+    when all of its side effects are part of the DB transactions, e.g. not
+    if it sends single use codes to an IdP. It must be applied below the
+    ``@router.get``/``@router.post`` decorator.
+    """
+    endpoint.diracx_retry_deadlocks = True  # type: ignore[attr-defined]
+    return endpoint
+
+
+class DiracxRoute(APIRoute):
+    """Route which runs the request again when a DB transaction fails with
+    an error which can go away when retried, such as a deadlock
+
+    Only endpoints decorated with :func:`retry_deadlocks` are retried. The
+    failed transaction has already been rolled back by the time the error
+    reaches this point and the retry gets new transactions.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        if not getattr(self.endpoint, "diracx_retry_deadlocks", False):
+            return handler
+
+        async def retrying_handler(request: Request) -> Response:
+            for attempt in itertools.count(1):
+                try:
+                    return await handler(request)
+                except DBAPIError as e:
+                    if not is_retryable_error(e):
+                        raise
+                    if attempt == MAX_TRANSACTION_ATTEMPTS:
+                        raise DiracHttpResponse(
+                            status.HTTP_503_SERVICE_UNAVAILABLE,
+                            {"detail": "The database is too busy, try again later"},
+                        ) from e
+                    delay = random.uniform(
+                        0, TRANSACTION_RETRY_DELAY * 2 ** (attempt - 1)
+                    )
+                    logger.info(
+                        "Retrying %s in %.3fs after attempt %d failed: %s",
+                        self.path,
+                        delay,
+                        attempt,
+                        e,
+                    )
+                    await asyncio.sleep(delay)
+            raise AssertionError("unreachable")
+
+        return retrying_handler
+
+
 class DiracxRouter(APIRouter):
     def __init__(
         self,
@@ -55,5 +124,5 @@ class DiracxRouter(APIRouter):
         dependencies=None,
         require_auth: bool = True,
     ):
-        super().__init__(dependencies=dependencies)
+        super().__init__(dependencies=dependencies, route_class=DiracxRoute)
         self.diracx_require_auth = require_auth
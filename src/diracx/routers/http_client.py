@@ -0,0 +1,80 @@
+"""HTTP client shared by the whole application for outbound requests
+
+Requests to the identity providers go through a single ``httpx.AsyncClient``
+so connections are kept alive and reused instead of paying for a new TCP and
+TLS handshake each time.
+"""
+from __future__ import annotations
+
+__all__ = ("HTTPClientSettings", "SharedHTTPClient")
+
+import contextlib
+from typing import Any, AsyncIterator
+
+import httpx
+from pydantic import BaseSettings
+
+
+class HTTPClientSettings(BaseSettings, env_prefix="DIRACX_HTTP_CLIENT_"):
+    """Options of the shared HTTP client, read from ``DIRACX_HTTP_CLIENT_{OPTION}``
+
+    HTTP/2 requires the ``h2`` package, e.g. from ``httpx[http2]``.
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30
+    timeout: float = 10
+    connect_timeout: float = 5
+    http2: bool = False
+
+    def client_options(self) -> dict[str, Any]:
+        """Keyword arguments to pass to httpx.AsyncClient"""
+        return {
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            "timeout": httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            "http2": self.http2,
+        }
+
+
+class SharedHTTPClient:
+    """Owner of the HTTP client for the lifetime of the application"""
+
+    def __init__(
+        self,
+        settings: HTTPClientSettings | None = None,
+        *,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self._settings = settings or HTTPClientSettings()
+        # Used to send the requests to a stub instead of the network in tests
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    @contextlib.asynccontextmanager
+    async def client_context(self) -> AsyncIterator[None]:
+        """Context manager to manage the client lifecycle"""
+        assert self._client is None, "client_context cannot be nested"
+        async with httpx.AsyncClient(
+            transport=self._transport, **self._settings.client_options()
+        ) as client:
+            self._client = client
+            try:
+                yield
+            finally:
+                self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("HTTP client is not available outside client_context")
+        return self._client
+
+    @staticmethod
+    def create() -> httpx.AsyncClient:
+        """FastAPI dependency which is overridden to return the app's client"""
+        raise NotImplementedError("This should never be called")
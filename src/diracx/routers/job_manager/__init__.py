@@ -1,29 +1,107 @@
 from __future__ import annotations
 
 import asyncio
+import itertools
+import json
 import logging
 from datetime import datetime
-from typing import Annotated, Any, TypedDict
-
-from fastapi import Body, Depends, Query
+from functools import partial
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    TypedDict,
+)
+
+from fastapi import Body, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, root_validator
 
 from diracx.core.config import Config, ConfigSource
-from diracx.core.models import ScalarSearchOperator, SearchSpec, SortSpec
+from diracx.core.exceptions import (
+    InvalidJDLError,
+    InvalidJobStatusTransition,
+    JobNotFound,
+)
+from diracx.core.models import (
+    ExportFormat,
+    ScalarSearchOperator,
+    SearchSpec,
+    SortSpec,
+    TotalCountMode,
+)
 from diracx.core.properties import JOB_ADMINISTRATOR, NORMAL_USER
-from diracx.core.utils import JobStatus
+from diracx.core.settings import ServiceSettingsBase
+from diracx.core.utils import JobStatus, SingleFlightCache
+from diracx.db import JobDB as _JobDB
 
 from ..auth import UserInfo, has_properties, verify_dirac_token
-from ..dependencies import JobDB
-from ..fastapi_classes import DiracxRouter
+from ..dependencies import JobDB, add_settings_annotation
+from ..fastapi_classes import DiracxRouter, retry_deadlocks
+from .export import MEDIA_TYPES, export_stream
+from .parametric import iter_parametric_jobs
+
+MAX_PARAMETRIC_JOBS = 10_000
+# All the jobs of a submission are inserted in a single transaction
+MAX_SUBMITTED_JOBS = 10_000
+# Number of jobs written to the DB by each bulk insert of a submission
+SUBMISSION_BATCH_SIZE = 1000
+
+# Maximum number of jobs returned by each page of a search
+MAX_PER_PAGE = 10_000
+
+# Response header containing the cursor to use to get the next page of results
+NEXT_CURSOR_HEADER = "X-DiracX-Next-Cursor"
+# Response headers containing the total number of results, if requested
+TOTAL_COUNT_HEADER = "X-DiracX-Total-Count"
+TOTAL_COUNT_ACCURACY_HEADER = "X-DiracX-Total-Count-Accuracy"
 
-MAX_PARAMETRIC_JOBS = 20
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Number of rows in each record batch/row group of exports
+EXPORT_BATCH_SIZE = 10_000
+
+QUERY_CACHE_MAX_SIZE = 1024
 
 logger = logging.getLogger(__name__)
 
 router = DiracxRouter(dependencies=[has_properties(NORMAL_USER | JOB_ADMINISTRATOR)])
 
 
+@add_settings_annotation
+class JobsSettings(ServiceSettingsBase, env_prefix="DIRACX_SERVICE_JOBS_"):
+    # How long identical search/summary queries share their result, 0 disables
+    query_cache_ttl_seconds: float = 5
+    # Maximum number of results counted when the total count is not exact
+    total_count_cap: int = 10_000
+
+
+# Results of search/summary queries, shared by identical concurrent requests
+_query_cache = SingleFlightCache(maxsize=QUERY_CACHE_MAX_SIZE, name="jobs_query")
+
+
+async def _shared_query(
+    job_db: _JobDB, method: Callable[..., Awaitable[Any]], *args, **kwargs
+) -> Any:
+    """Run a query whose result is shared by several requests
+
+    It gets a transaction of its own as it outlives the request which
+    started it if that one is cancelled.
+    """
+    async with job_db:
+        return await method(*args, **kwargs)
+
+
+def _query_cache_key(endpoint: str, search: list[SearchSpec], **kwargs) -> str:
+    """Normalise a query so that equivalent ones share the same cache entry"""
+    # All filters must match so their order doesn't matter
+    normalised_search = sorted(json.dumps(s, sort_keys=True) for s in search)
+    return json.dumps([endpoint, normalised_search, kwargs], sort_keys=True)
+
+
 class JobSummaryParams(BaseModel):
     grouping: list[str]
     search: list[SearchSpec] = []
@@ -66,11 +144,13 @@ class JobID(BaseModel):
 class JobStatusUpdate(BaseModel):
     job_id: int
     status: JobStatus
+    minor_status: str | None = None
 
 
 class JobStatusReturn(TypedDict):
     job_id: int
-    status: JobStatus
+    # Jobs inserted by DIRAC can have statuses which are not in JobStatus
+    status: str
 
 
 EXAMPLE_JDLS = {
@@ -97,6 +177,7 @@ StdOutput = std.out;"""
 
 
 @router.post("/")
+@retry_deadlocks
 async def submit_bulk_jobs(
     # FIXME: Using mutliple doesn't work with swagger?
     job_definitions: Annotated[list[str], Body(example=EXAMPLE_JDLS["Simple JDL"])],
@@ -104,9 +185,7 @@ async def submit_bulk_jobs(
     user_info: Annotated[UserInfo, Depends(verify_dirac_token)],
 ) -> list[InsertedJob]:
     from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
-    from DIRAC.Core.Utilities.DErrno import EWMSJDL
     from DIRAC.WorkloadManagementSystem.Utilities.ParametricJob import (
-        generateParametricJobs,
         getParameterVectorLength,
     )
 
@@ -125,11 +204,6 @@ async def submit_bulk_jobs(
     # if not policyDict[RIGHT_SUBMIT]:
     #     raise NotImplementedError(EWMSSUBM, "Job submission not authorized")
 
-    # TODO make it bulk compatible
-    assert len(job_definitions) == 1
-
-    jobDesc = f"[{job_definitions[0]}]"
-
     # TODO: that needs to go in the legacy adapter
     # # jobDesc is JDL for now
     # jobDesc = jobDesc.strip()
@@ -138,47 +212,53 @@ async def submit_bulk_jobs(
     # if jobDesc[-1] != "]":
     #     jobDesc = f"{jobDesc}]"
 
-    # Check if the job is a parametric one
-    jobClassAd = ClassAd(jobDesc)
-    result = getParameterVectorLength(jobClassAd)
-    if not result["OK"]:
-        logger.error("Issue with getParameterVectorLength: %s", result["Message"])
-        return result
-    nJobs = result["Value"]
+    jobDescIterators: list[Iterable[str]] = []
+    nTotalJobs = 0
     parametricJob = False
-    if nJobs is not None and nJobs > 0:
-        # if we are here, then jobDesc was the description of a parametric job. So we start unpacking
-        parametricJob = True
-        if nJobs > MAX_PARAMETRIC_JOBS:
-            raise NotImplementedError(
-                EWMSJDL,
-                "Number of parametric jobs exceeds the limit of %d"
-                % MAX_PARAMETRIC_JOBS,
-            )
-        result = generateParametricJobs(jobClassAd)
-        if not result["OK"]:
-            return result
-        jobDescList = result["Value"]
-    else:
-        # if we are here, then jobDesc was the description of a single job.
-        jobDescList = [jobDesc]
+    for job_definition in job_definitions:
+        jobDesc = f"[{job_definition}]"
 
-    jobIDList = []
+        # Check if the job is a parametric one
+        jobClassAd = ClassAd(jobDesc)
+        result = getParameterVectorLength(jobClassAd)
+        if not result["OK"]:
+            logger.error("Issue with getParameterVectorLength: %s", result["Message"])
+            raise InvalidJDLError(result["Message"])
+        nJobs = result["Value"]
+        if nJobs is not None and nJobs > 0:
+            # if we are here, then jobDesc was the description of a parametric job.
+            # The jobs are only unpacked when they are inserted
+            parametricJob = True
+            if nJobs > MAX_PARAMETRIC_JOBS:
+                raise InvalidJDLError(
+                    "Number of parametric jobs exceeds the limit of %d"
+                    % MAX_PARAMETRIC_JOBS,
+                )
+            jobDescIterators.append(iter_parametric_jobs(jobClassAd, nJobs))
+            nTotalJobs += nJobs
+        else:
+            # if we are here, then jobDesc was the description of a single job.
+            jobDescIterators.append([jobDesc])
+            nTotalJobs += 1
+        if nTotalJobs > MAX_SUBMITTED_JOBS:
+            raise InvalidJDLError(
+                "Number of submitted jobs exceeds the limit of %d" % MAX_SUBMITTED_JOBS
+            )
 
-    if parametricJob:
+    if parametricJob or nTotalJobs > 1:
         initialStatus = JobStatus.SUBMITTING
         initialMinorStatus = "Bulk transaction confirmation"
     else:
         initialStatus = JobStatus.RECEIVED
         initialMinorStatus = "Job accepted"
 
-    for (
-        jobDescription
-    ) in (
-        jobDescList
-    ):  # jobDescList because there might be a list generated by a parametric job
-        job_id = await job_db.insert(
-            jobDescription,
+    # Insert in fixed size batches so the expanded JDLs of a large parametric
+    # job never have to be all in memory
+    jobIDList = []
+    jobDescs = itertools.chain.from_iterable(jobDescIterators)
+    while jobDescList := list(itertools.islice(jobDescs, SUBMISSION_BATCH_SIZE)):
+        jobIDList += await job_db.insert_bulk(
+            jobDescList,
             user_info.sub,
             fixme_ownerDN,
             fixme_ownerGroup,
@@ -188,21 +268,22 @@ async def submit_bulk_jobs(
             user_info.vo,
         )
 
-        logging.debug(
-            f'Job added to the JobDB", "{job_id} for {fixme_ownerDN}/{fixme_ownerGroup}'
-        )
-
-        # TODO comment out for test just now
-        # self.jobLoggingDB.addLoggingRecord(
-        #     jobID,
-        #     result["Status"],
-        #     result["MinorStatus"],
-        #     date=result["TimeStamp"],
-        #     source="JobManager",
-        # )
-
-        jobIDList.append(job_id)
+    logging.debug(
+        f'Jobs added to the JobDB", "{[x["JobID"] for x in jobIDList]} '
+        f"for {fixme_ownerDN}/{fixme_ownerGroup}"
+    )
 
+    # TODO comment out for test just now
+    # for result in jobIDList:
+    #     self.jobLoggingDB.addLoggingRecord(
+    #         result["JobID"],
+    #         result["Status"],
+    #         result["MinorStatus"],
+    #         date=result["TimeStamp"],
+    #         source="JobManager",
+    #     )
+
+    job_db.on_commit(_query_cache.invalidate)
     return jobIDList
 
     # TODO: is this needed ?
@@ -220,6 +301,63 @@ async def delete_bulk_jobs(job_ids: Annotated[list[int], Query()]):
     return job_ids
 
 
+def _visible_owner(config: Config, user_info: UserInfo) -> str | None:
+    """The owner of the jobs a user can see, None if they can see all jobs"""
+    # TODO: Apply all the job policy stuff properly using user_info
+    if config.Operations["Defaults"].Services.JobMonitoring.GlobalJobsInfo:
+        return None
+    return user_info.sub
+
+
+def _modifiable_owner(user_info: UserInfo) -> str | None:
+    """The owner of the jobs a user can modify, None if they can modify all jobs"""
+    if JOB_ADMINISTRATOR in user_info.properties:
+        return None
+    return user_info.sub
+
+
+@router.get("/status")
+@retry_deadlocks
+async def get_bulk_job_status(
+    job_ids: Annotated[list[int], Query(max_items=10)],
+    config: Annotated[Config, Depends(ConfigSource.create)],
+    job_db: JobDB,
+    user_info: Annotated[UserInfo, Depends(verify_dirac_token)],
+) -> list[JobStatusReturn]:
+    statuses = await job_db.get_job_statuses(
+        job_ids, owner=_visible_owner(config, user_info)
+    )
+    return [
+        {"job_id": job_id, "status": statuses[job_id]}
+        for job_id in job_ids
+        if job_id in statuses
+    ]
+
+
+@router.post("/status")
+@retry_deadlocks
+async def set_status_bulk(
+    job_update: list[JobStatusUpdate],
+    job_db: JobDB,
+    user_info: Annotated[UserInfo, Depends(verify_dirac_token)],
+) -> list[JobStatusReturn]:
+    """Update the status of many jobs at once
+
+    Updates which are not allowed from the current status of a job are
+    ignored so the returned status differs from the requested one. Jobs
+    which don't exist are left out, as are those of other users unless the
+    user is a job administrator.
+    """
+    new_statuses = await job_db.set_job_statuses(
+        {job.job_id: (job.status.value, job.minor_status) for job in job_update},
+        owner=_modifiable_owner(user_info),
+    )
+    job_db.on_commit(_query_cache.invalidate)
+    return [
+        {"job_id": job_id, "status": status} for job_id, status in new_statuses.items()
+    ]
+
+
 @router.get("/{job_id}")
 async def get_single_job(job_id: int):
     return f"This job {job_id}"
@@ -236,13 +374,41 @@ async def kill_single_job(job_id: int):
 
 
 @router.get("/{job_id}/status")
-async def get_single_job_status(job_id: int) -> JobStatus:
-    return JobStatus.Stalled
+@retry_deadlocks
+async def get_single_job_status(
+    job_id: int,
+    config: Annotated[Config, Depends(ConfigSource.create)],
+    job_db: JobDB,
+    user_info: Annotated[UserInfo, Depends(verify_dirac_token)],
+) -> str:
+    statuses = await job_db.get_job_statuses(
+        [job_id], owner=_visible_owner(config, user_info)
+    )
+    if job_id not in statuses:
+        raise JobNotFound(f"Job {job_id} not found")
+    return statuses[job_id]
 
 
 @router.post("/{job_id}/status")
-async def set_single_job_status(job_id: int, status: JobStatus):
-    return f"Updating Job {job_id} to {status}"
+@retry_deadlocks
+async def set_single_job_status(
+    job_id: int,
+    status: JobStatus,
+    job_db: JobDB,
+    user_info: Annotated[UserInfo, Depends(verify_dirac_token)],
+    minor_status: str | None = None,
+) -> JobStatusReturn:
+    new_statuses = await job_db.set_job_statuses(
+        {job_id: (status.value, minor_status)}, owner=_modifiable_owner(user_info)
+    )
+    job_db.on_commit(_query_cache.invalidate)
+    if job_id not in new_statuses:
+        raise JobNotFound(f"Job {job_id} not found")
+    if new_statuses[job_id] != status.value:
+        raise InvalidJobStatusTransition(
+            f"Job {job_id} can't move from {new_statuses[job_id]} to {status.value}"
+        )
+    return {"job_id": job_id, "status": new_statuses[job_id]}
 
 
 @router.post("/kill")
@@ -250,16 +416,6 @@ async def kill_bulk_jobs(job_ids: Annotated[list[int], Query()]):
     return job_ids
 
 
-@router.get("/status")
-async def get_bulk_job_status(job_ids: Annotated[list[int], Query(max_items=10)]):
-    return [{"job_id": jid, "status": JobStatus.Running} for jid in job_ids]
-
-
-@router.post("/status")
-async def set_status_bulk(job_update: list[JobStatusUpdate]) -> list[JobStatusReturn]:
-    return [{"job_id": job.job_id, "status": job.status} for job in job_update]
-
-
 EXAMPLE_SEARCHES = {
     "Show all": {
         "summary": "Show all",
@@ -311,23 +467,59 @@ EXAMPLE_RESPONSES: dict[int | str, dict[str, Any]] = {
                         "ApplicationStatus": "All events processed",
                     },
                 ]
-            }
+            },
+            NDJSON_MEDIA_TYPE: {
+                "example": '{"JobID": 1, "Status": "RECEIVED"}\n'
+                '{"JobID": 2, "Status": "Done"}\n'
+            },
         },
     },
 }
 
 
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value)} is not JSON serializable")
+
+
+async def _ndjson_batches(batches) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield "".join(
+            json.dumps(row, default=_json_default) + "\n" for row in batch
+        ).encode()
+
+
 @router.post("/search", responses=EXAMPLE_RESPONSES)
+@retry_deadlocks
 async def search(
     config: Annotated[Config, Depends(ConfigSource.create)],
     job_db: JobDB,
     user_info: Annotated[UserInfo, Depends(verify_dirac_token)],
-    page: int = 0,
-    per_page: int = 100,
+    settings: JobsSettings,
+    request: Request,
+    response: Response,
+    per_page: Annotated[int, Query(ge=1, le=MAX_PER_PAGE)] = 100,
+    cursor: str | None = None,
+    total: TotalCountMode | None = None,
     body: Annotated[JobSearchParams | None, Body(examples=EXAMPLE_SEARCHES)] = None,
 ) -> list[dict[str, Any]]:
     """Retrieve information about jobs.
 
+    Results are paginated: if more results are available the
+    `X-DiracX-Next-Cursor` response header contains the `cursor` to pass
+    to get the next page.
+
+    If `total` is given the `X-DiracX-Total-Count` response header contains
+    the number of matching jobs and `X-DiracX-Total-Count-Accuracy` says if
+    it is `exact`, a `lower-bound` or an `estimate`. `exact` counts all the
+    matching jobs, `capped` stops counting at a server defined limit and
+    `estimated` uses the statistics of the database when available.
+
+    If `application/x-ndjson` is requested with the `Accept` header all
+    matching jobs are streamed as one JSON object per line instead and
+    `per_page`/`cursor` are ignored.
+
     **TODO: Add more docs**
     """
     if body is None:
@@ -341,17 +533,102 @@ async def search(
                 "value": user_info.sub,
             }
         )
-    # TODO: Pagination
-    return await job_db.search(
-        body.parameters, body.search, body.sort, page=page, per_page=per_page
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        batches = await job_db.search_stream(body.parameters, body.search, body.sort)
+        return StreamingResponse(  # type: ignore[return-value]
+            _ndjson_batches(batches), media_type=NDJSON_MEDIA_TYPE
+        )
+    key = _query_cache_key(
+        "search",
+        body.search,
+        # The selected columns are always returned in the same order
+        parameters=sorted(body.parameters or []),
+        sort=body.sort,
+        per_page=per_page,
+        cursor=cursor,
+    )
+    jobs, next_cursor = await _query_cache.get(
+        key,
+        partial(
+            _shared_query,
+            job_db,
+            job_db.search,
+            body.parameters,
+            body.search,
+            body.sort,
+            per_page=per_page,
+            cursor=cursor,
+        ),
+        ttl=settings.query_cache_ttl_seconds,
+    )
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if total is not None:
+        key = _query_cache_key("count", body.search, mode=total)
+        count, accuracy = await _query_cache.get(
+            key,
+            partial(
+                _shared_query,
+                job_db,
+                job_db.count,
+                body.search,
+                total,
+                cap=settings.total_count_cap,
+            ),
+            ttl=settings.query_cache_ttl_seconds,
+        )
+        response.headers[TOTAL_COUNT_HEADER] = str(count)
+        response.headers[TOTAL_COUNT_ACCURACY_HEADER] = accuracy.value
+    return jobs
+
+
+@router.post(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {media_type: {} for media_type in MEDIA_TYPES.values()}}
+    },
+)
+@retry_deadlocks
+async def export(
+    config: Annotated[Config, Depends(ConfigSource.create)],
+    job_db: JobDB,
+    user_info: Annotated[UserInfo, Depends(verify_dirac_token)],
+    format: ExportFormat = ExportFormat.ARROW,
+    body: Annotated[JobSearchParams | None, Body(examples=EXAMPLE_SEARCHES)] = None,
+):
+    """Export the selected columns of all the matching jobs
+
+    The result is streamed as an Arrow IPC stream or a Parquet file, with
+    one record batch or row group for each chunk read from the database.
+    """
+    if body is None:
+        body = JobSearchParams()
+    # TODO: Apply all the job policy stuff properly using user_info
+    if not config.Operations["Defaults"].Services.JobMonitoring.GlobalJobsInfo:
+        body.search.append(
+            {
+                "parameter": "Owner",
+                "operator": ScalarSearchOperator.EQUAL,
+                "value": user_info.sub,
+            }
+        )
+    batches = await job_db.search_stream(
+        body.parameters, body.search, body.sort, batch_size=EXPORT_BATCH_SIZE
+    )
+    return StreamingResponse(
+        export_stream(format, job_db.search_column_types(body.parameters), batches),
+        media_type=MEDIA_TYPES[format],
     )
 
 
 @router.post("/summary")
+@retry_deadlocks
 async def summary(
     config: Annotated[Config, Depends(ConfigSource.create)],
     job_db: JobDB,
     user_info: Annotated[UserInfo, Depends(verify_dirac_token)],
+    settings: JobsSettings,
     body: JobSummaryParams,
 ):
     """Show information suitable for plotting"""
@@ -364,4 +641,9 @@ async def summary(
                 "value": user_info.sub,
             }
         )
-    return await job_db.summary(body.grouping, body.search)
+    key = _query_cache_key("summary", body.search, grouping=body.grouping)
+    return await _query_cache.get(
+        key,
+        partial(_shared_query, job_db, job_db.summary, body.grouping, body.search),
+        ttl=settings.query_cache_ttl_seconds,
+    )
@@ -0,0 +1,88 @@
+"""Conversion of job search results to columnar formats
+
+pyarrow is imported lazily as it is only needed by the export endpoint.
+"""
+from __future__ import annotations
+
+import io
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, AsyncIterator
+
+from diracx.core.models import ExportFormat
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+MEDIA_TYPES = {
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+
+def arrow_schema(column_types: dict[str, type]) -> pa.Schema:
+    """Find the Arrow schema of search results from the Python column types"""
+    import pyarrow as pa
+
+    arrow_types = {
+        bool: pa.bool_(),
+        int: pa.int64(),
+        str: pa.string(),
+        # The DB stores naive datetimes in UTC
+        datetime: pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema(
+        [(name, arrow_types[python_type]) for name, python_type in column_types.items()]
+    )
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write only file which buffers what is written until it is taken"""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def export_stream(
+    format: ExportFormat,
+    column_types: dict[str, type],
+    batches: AsyncIterator[list[dict[str, Any]]],
+) -> AsyncIterator[bytes]:
+    """Encode batches of rows as an Arrow IPC stream or a Parquet file
+
+    Each batch becomes an Arrow record batch or a Parquet row group and is
+    sent as soon as it is encoded, so only one batch is held in memory.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(column_types)
+    sink = _ChunkSink()
+    writer: pa.ipc.RecordBatchStreamWriter | pq.ParquetWriter
+    if format == ExportFormat.ARROW:
+        writer = pa.ipc.new_stream(sink, schema)
+    else:
+        writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for batch in batches:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
@@ -0,0 +1,119 @@
+"""Lazy expansion of parametric job descriptions
+
+This is equivalent to ``generateParametricJobs`` from DIRAC except that the
+job descriptions are generated one at a time. The parameter attributes are
+also removed from the template before the expansion starts, so expanding
+each job doesn't get slower as the parameter vectors get longer.
+"""
+from __future__ import annotations
+
+from typing import Any, Iterator
+
+from diracx.core.exceptions import InvalidJDLError
+
+PARAMETER_KEYS = ["Parameters", "ParameterStart", "ParameterStep", "ParameterFactor"]
+
+
+def _parameter_sequence(n_values: int, spec: dict[str, Any]) -> list:
+    if "ParameterList" in spec:
+        return list(spec["ParameterList"])
+    step = spec.get("ParameterStep", 0)
+    factor = spec.get("ParameterFactor", 1)
+    # The first value must have the same type as the other ones
+    values = [spec.get("ParameterStart", 1) * type(factor)(1) + type(step)(0)]
+    for _ in range(1, n_values):
+        values.append(values[-1] * factor + step)
+    return values
+
+
+def _parameter_lists(job_class_ad, n_values: int) -> dict[str, list]:
+    """Find the values taken by each sequence of parameters, keyed by sequence ID"""
+    specs: dict[str, dict[str, Any]] = {}
+    for attribute in job_class_ad.getAttributes():
+        for key in PARAMETER_KEYS:
+            if not attribute.startswith(key):
+                continue
+            seq_id = "0" if "." not in attribute else attribute.split(".")[1]
+            spec = specs.setdefault(seq_id, {})
+            if key == "Parameters":
+                if job_class_ad.isAttributeList(attribute):
+                    values = job_class_ad.getListFromExpression(attribute)
+                    if len(values) != n_values:
+                        raise InvalidJDLError("Inconsistent parametric job description")
+                    spec["ParameterList"] = values
+                elif attribute != "Parameters":
+                    raise InvalidJDLError("Inconsistent parametric job description")
+                elif job_class_ad.getAttributeInt(attribute) is None:
+                    value = job_class_ad.get_expression(attribute)
+                    raise InvalidJDLError(
+                        f"Inconsistent parametric job description: {attribute}={value}"
+                    )
+            else:
+                value = job_class_ad.getAttributeInt(attribute)
+                if value is None:
+                    value = job_class_ad.getAttributeFloat(attribute)
+                if value is None:
+                    value = job_class_ad.get_expression(attribute)
+                    raise InvalidJDLError(
+                        f"Illegal value for {attribute} JDL field: {value}"
+                    )
+                spec[key] = value
+    return {
+        seq_id: _parameter_sequence(n_values, spec) for seq_id, spec in specs.items()
+    }
+
+
+def _substitute(class_ad, attribute: str, seq_id: str, value: str):
+    placeholder = "%s" if seq_id == "0" else f"%({seq_id})s"
+    expr = class_ad.get_expression(attribute)
+    if placeholder not in expr:
+        return
+    value = value.strip()
+    if class_ad.isAttributeList(attribute) and value.startswith("{"):
+        value = value.lstrip("{").rstrip("}").strip()
+    class_ad.set_expression(attribute, expr.replace(placeholder, value))
+
+
+def _expand(template_jdl: str, parameter_lists: dict[str, list], n_values: int):
+    from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
+
+    # Width of the sequential parameter number
+    z_length = len(str(n_values - 1))
+    for n in range(n_values):
+        number = str(n).zfill(z_length)
+        class_ad = ClassAd(template_jdl.replace("%n", number))
+        parameters = {
+            seq_id: str(values[n]) for seq_id, values in parameter_lists.items()
+        }
+        for seq_id, parameter in parameters.items():
+            for attribute in class_ad.getAttributes():
+                _substitute(class_ad, attribute, seq_id, parameter)
+        for seq_id, parameter in parameters.items():
+            attribute = "Parameter" if seq_id == "0" else f"Parameter.{seq_id}"
+            if parameter.startswith("{"):
+                class_ad.insertAttributeInt(attribute, parameter)
+            else:
+                class_ad.insertAttributeString(attribute, parameter)
+        class_ad.insertAttributeInt("ParameterNumber", n)
+        yield class_ad.asJDL()
+
+
+def iter_parametric_jobs(job_class_ad, n_values: int) -> Iterator[str]:
+    """Return an iterator over the JDLs of the jobs described by ``job_class_ad``
+
+    ``n_values`` is the length of the parameter vectors, as given by
+    ``getParameterVectorLength``. The description is validated before this
+    function returns so errors are not raised midway through a submission.
+    """
+    from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
+
+    if not job_class_ad.lookupAttribute("Parameters"):
+        return iter([job_class_ad.asJDL()])
+
+    parameter_lists = _parameter_lists(job_class_ad, n_values)
+
+    template = ClassAd(job_class_ad.asJDL())
+    for seq_id in parameter_lists:
+        for key in PARAMETER_KEYS:
+            template.deleteAttribute(key if seq_id == "0" else f"{key}.{seq_id}")
+    return _expand(template.asJDL(), parameter_lists, n_values)
@@ -25,6 +25,7 @@ async def openid_configuration(
     return {
         "issuer": settings.token_issuer,
         "token_endpoint": str(request.url_for("token")),
+        "jwks_uri": str(request.url_for("jwks")),
         "authorization_endpoint": str(request.url_for("authorization_flow")),
         "device_authorization_endpoint": str(request.url_for("initiate_device_flow")),
         # "introspection_endpoint":"",
@@ -35,7 +36,24 @@ async def openid_configuration(
         ],
         "scopes_supported": scopes_supported,
         "response_types_supported": ["code"],
-        "token_endpoint_auth_signing_alg_values_supported": [settings.token_algorithm],
+        "token_endpoint_auth_signing_alg_values_supported": [
+            settings.signing_algorithm
+        ],
         "token_endpoint_auth_methods_supported": ["none"],
         "code_challenge_methods_supported": ["S256"],
     }
+
+
+@router.get("/jwks.json")
+async def jwks(settings: AuthSettings):
+    """The public keys which DiracX tokens can be signed with
+
+    This includes the retiring keys so tokens signed with them can still be
+    verified until they expire.
+    """
+    return {
+        "keys": [
+            key.as_dict(is_private=False) | {"alg": algorithm, "use": "sig"}
+            for key, algorithm in settings.verification_keys().values()
+        ]
+    }
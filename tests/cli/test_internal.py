@@ -77,3 +77,32 @@ def test_add_user(tmp_path, vo, user_group):
     assert vo in config.Registry
     assert sub in config.Registry[vo].Users
     assert ca == config.Registry[vo].Users[sub].CA
+
+
+def test_sync_db_indexes(monkeypatch):
+    monkeypatch.setenv("DIRACX_DB_URL_JOBDB", "sqlite+aiosqlite:///:memory:")
+
+    result = runner.invoke(app, ["internal", "sync-db-indexes", "JobDB"])
+    assert result.exit_code == 0, result.output
+
+    result = runner.invoke(app, ["internal", "sync-db-indexes", "NotADB"])
+    assert result.exit_code != 0
+
+
+def test_db_upgrade(monkeypatch):
+    monkeypatch.setenv("DIRACX_DB_URL_JOBDB", "sqlite+aiosqlite:///:memory:")
+
+    result = runner.invoke(app, ["internal", "db-upgrade", "JobDB"])
+    assert result.exit_code == 0, result.output
+    assert "schema version 1" in result.output
+
+    result = runner.invoke(app, ["internal", "db-upgrade", "NotADB"])
+    assert result.exit_code != 0
+
+
+def test_purge_refresh_tokens(monkeypatch):
+    monkeypatch.setenv("DIRACX_DB_URL_AUTHDB", "sqlite+aiosqlite:///:memory:")
+
+    result = runner.invoke(app, ["internal", "purge-refresh-tokens", "3000"])
+    assert result.exit_code == 0, result.output
+    assert "Deleted 0 expired refresh tokens" in result.output
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import typer
+
+from diracx.cli import utils
+
+
+@pytest.mark.parametrize("has_refresh_expiry", [False, True])
+async def test_get_auth_headers_expired(tmp_path, monkeypatch, has_refresh_expiry):
+    credentials_path = tmp_path / "credentials.json"
+    monkeypatch.setattr(utils, "CREDENTIALS_PATH", credentials_path)
+    now = datetime.now(tz=timezone.utc)
+    credentials = {
+        "access_token": "access",
+        "refresh_token": "refresh",
+        "expires": (now - timedelta(minutes=1)).isoformat(),
+    }
+    # Credentials saved by older versions have no refresh_token_expires
+    if has_refresh_expiry:
+        credentials["refresh_token_expires"] = credentials["expires"]
+    credentials_path.write_text(json.dumps(credentials))
+
+    with pytest.raises(typer.Exit):
+        await utils.get_auth_headers(api=None)
+
+    credentials["expires"] = (now + timedelta(minutes=1)).isoformat()
+    credentials_path.write_text(json.dumps(credentials))
+    assert await utils.get_auth_headers(api=None) == {"Authorization": "Bearer access"}
@@ -8,14 +8,16 @@ from git import Repo
 
 from diracx.core.config import Config, ConfigSource
 from diracx.core.properties import NORMAL_USER
-from diracx.routers import create_app_inner
+from diracx.routers import MetricsSettings, create_app_inner
 from diracx.routers.auth import AuthSettings, create_access_token
+from diracx.routers.job_manager import JobsSettings, _query_cache
 
 # to get a string like this run:
 # openssl rand -hex 32
 ALGORITHM = "HS256"
 ISSUER = "http://lhcbdirac.cern.ch/"
 AUDIENCE = "dirac"
+METRICS_TOKEN = "metrics-token"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
@@ -70,7 +72,7 @@ def with_app(test_auth_settings, with_config_repo):
     """
     yield create_app_inner(
         enabled_systems={".well-known", "auth", "config", "jobs"},
-        all_service_settings=[test_auth_settings],
+        all_service_settings=[test_auth_settings, JobsSettings()],
         database_urls={
             "JobDB": "sqlite+aiosqlite:///:memory:",
             "AuthDB": "sqlite+aiosqlite:///:memory:",
@@ -78,7 +80,9 @@ def with_app(test_auth_settings, with_config_repo):
         config_source=ConfigSource.create_from_url(
             backend_url=f"git+file://{with_config_repo}"
         ),
+        metrics_settings=MetricsSettings(token=METRICS_TOKEN),
     )
+    _query_cache.invalidate()
 
 
 @pytest.fixture
@@ -122,6 +126,11 @@ def with_config_repo(tmp_path):
     yield tmp_path
 
 
+@pytest.fixture
+def metrics_headers():
+    return {"Authorization": f"Bearer {METRICS_TOKEN}"}
+
+
 @pytest.fixture
 def test_client(with_app):
     with TestClient(with_app) as test_client:
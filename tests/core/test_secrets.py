@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+import pytest
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from pydantic import parse_obj_as
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from pydantic import ValidationError, parse_obj_as
 
 from diracx.core.settings import TokenSigningKey
 
@@ -36,3 +37,32 @@ def test_token_signing_key(tmp_path):
         parse_obj_as(TokenSigningKey, private_key_pem).jwk.get_private_key(),
         private_key,
     )
+
+
+def private_key_pem(private_key) -> str:
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode("ascii")
+
+
+@pytest.mark.parametrize(
+    "private_key, algorithm",
+    [
+        (rsa.generate_private_key(public_exponent=65537, key_size=2048), "RS256"),
+        (ec.generate_private_key(ec.SECP256R1()), "ES256"),
+        (ec.generate_private_key(ec.SECP384R1()), "ES384"),
+        (ed25519.Ed25519PrivateKey.generate(), "EdDSA"),
+    ],
+)
+def test_token_signing_key_algorithm(private_key, algorithm):
+    key = parse_obj_as(TokenSigningKey, private_key_pem(private_key))
+    assert key.algorithm == algorithm
+    assert key.kid == key.jwk.thumbprint()
+
+
+def test_token_signing_key_unsupported():
+    private_key = ec.generate_private_key(ec.SECP256K1())
+    with pytest.raises(ValidationError, match="Unsupported token signing key"):
+        parse_obj_as(TokenSigningKey, private_key_pem(private_key))
@@ -1,6 +1,11 @@
 from __future__ import annotations
 
-from diracx.core.utils import dotenv_files_from_environment
+import asyncio
+from functools import partial
+
+import pytest
+
+from diracx.core.utils import SingleFlightCache, dotenv_files_from_environment
 
 
 def test_dotenv_files_from_environment(monkeypatch):
@@ -24,3 +29,73 @@ def test_dotenv_files_from_environment(monkeypatch):
         {"TEST_PREFIX_2a": "/c", "TEST_PREFIX": "/a", "TEST_PREFIX_1": "/b"},
     )
     assert dotenv_files_from_environment("TEST_PREFIX") == ["/a", "/b"]
+
+
+async def test_single_flight_cache():
+    cache = SingleFlightCache(maxsize=2)
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    # Concurrent lookups of the same key share a single computation
+    results = await asyncio.gather(
+        *(cache.get("a", partial(compute, 1), ttl=60) for _ in range(5))
+    )
+    assert results == [1] * 5
+    assert calls == [1]
+    assert (cache.hits, cache.misses) == (4, 1)
+
+    # Results are reused until they expire
+    assert await cache.get("a", partial(compute, 2), ttl=60) == 1
+    assert await cache.get("b", partial(compute, 3), ttl=0) == 3
+    assert await cache.get("b", partial(compute, 4), ttl=0) == 4
+    assert calls == [1, 3, 4]
+
+    # The least recently used entry is evicted
+    await cache.get("c", partial(compute, 5), ttl=60)
+    await cache.get("d", partial(compute, 6), ttl=60)
+    assert await cache.get("a", partial(compute, 7), ttl=60) == 7
+
+    cache.invalidate()
+    assert await cache.get("d", partial(compute, 8), ttl=60) == 8
+
+
+async def test_single_flight_cache_slow_computation():
+    cache = SingleFlightCache(maxsize=2)
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.2)
+        return value
+
+    # Computations slower than the TTL are still shared by all the lookups
+    first = asyncio.ensure_future(cache.get("a", partial(compute, 1), ttl=0.1))
+    await asyncio.sleep(0.15)
+    assert await cache.get("a", partial(compute, 2), ttl=0.1) == 1
+    assert await first == 1
+    assert calls == [1]
+
+    # The TTL starts once the result is available
+    assert await cache.get("a", partial(compute, 3), ttl=0.1) == 1
+    await asyncio.sleep(0.15)
+    assert await cache.get("a", partial(compute, 4), ttl=0.1) == 4
+    assert calls == [1, 4]
+
+
+async def test_single_flight_cache_failure():
+    cache = SingleFlightCache(maxsize=2)
+
+    async def fail():
+        raise ValueError("Failed")
+
+    async def succeed():
+        return "ok"
+
+    with pytest.raises(ValueError):
+        await cache.get("a", fail, ttl=60)
+    # Failures are not cached
+    assert await cache.get("a", succeed, ttl=60) == "ok"
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from uuid import uuid4
+
+import pytest
+
+from diracx.core.exceptions import AuthorizationError
+from diracx.db.auth.db import AuthDB
+from diracx.db.auth.schema import RefreshTokenStatus
+
+MAX_VALIDITY = 2
+EXPIRED = 0
+
+
+@pytest.fixture
+async def auth_db(tmp_path):
+    auth_db = AuthDB("sqlite+aiosqlite:///:memory:")
+    async with auth_db.engine_context():
+        yield auth_db
+
+
+async def test_use_refresh_token(auth_db: AuthDB):
+    jti = str(uuid4())
+    async with auth_db as auth_db:
+        await auth_db.insert_refresh_token(jti, "sub", "username", "vo:lhcb")
+
+    async with auth_db as auth_db:
+        with pytest.raises(AuthorizationError):
+            await auth_db.use_refresh_token(str(uuid4()), MAX_VALIDITY)
+        with pytest.raises(AuthorizationError):
+            await auth_db.use_refresh_token(jti, EXPIRED)
+
+    async with auth_db as auth_db:
+        info = await auth_db.use_refresh_token(jti, MAX_VALIDITY)
+    assert info["status"] == RefreshTokenStatus.CREATED
+    assert info["sub"] == "sub"
+    assert info["preferred_username"] == "username"
+    assert info["scope"] == "vo:lhcb"
+
+    async with auth_db as auth_db:
+        info = await auth_db.use_refresh_token(jti, MAX_VALIDITY)
+    assert info["status"] == RefreshTokenStatus.REVOKED
+
+
+async def test_reused_refresh_token_revokes_user(auth_db: AuthDB):
+    used, rotated, other_user = (str(uuid4()) for _ in range(3))
+    async with auth_db as auth_db:
+        await auth_db.insert_refresh_token(used, "sub", "username", "vo:lhcb")
+        await auth_db.insert_refresh_token(rotated, "sub", "username", "vo:lhcb")
+        await auth_db.insert_refresh_token(other_user, "sub2", "user2", "vo:lhcb")
+
+    async with auth_db as auth_db:
+        await auth_db.use_refresh_token(used, MAX_VALIDITY)
+
+    # Using a token a second time is suspicious so all of the user's
+    # tokens are revoked
+    async with auth_db as auth_db:
+        info = await auth_db.use_refresh_token(used, MAX_VALIDITY)
+    assert info["status"] == RefreshTokenStatus.REVOKED
+
+    async with auth_db as auth_db:
+        info = await auth_db.use_refresh_token(rotated, MAX_VALIDITY)
+        assert info["status"] == RefreshTokenStatus.REVOKED
+        info = await auth_db.use_refresh_token(other_user, MAX_VALIDITY)
+        assert info["status"] == RefreshTokenStatus.CREATED
+
+
+async def test_delete_expired_refresh_tokens(auth_db: AuthDB):
+    jtis = [str(uuid4()) for _ in range(3)]
+    async with auth_db as auth_db:
+        await auth_db.insert_refresh_token(jtis[0], "sub", "username", "vo:lhcb")
+        await auth_db.insert_refresh_token(jtis[1], "sub2", "user2", "vo:lhcb")
+        await auth_db.use_refresh_token(jtis[1], MAX_VALIDITY)
+
+    # Tokens which didn't expire are kept, even if they were revoked
+    async with auth_db as auth_db:
+        assert await auth_db.delete_expired_refresh_tokens(MAX_VALIDITY) == 0
+        info = await auth_db.use_refresh_token(jtis[1], MAX_VALIDITY)
+        assert info["status"] == RefreshTokenStatus.REVOKED
+
+    async with auth_db as auth_db:
+        assert await auth_db.delete_expired_refresh_tokens(-1, "sub2") == 1
+        await auth_db.insert_refresh_token(jtis[2], "sub", "username", "vo:lhcb")
+    async with auth_db as auth_db:
+        assert await auth_db.delete_expired_refresh_tokens(-1) == 2
+        with pytest.raises(AuthorizationError):
+            await auth_db.use_refresh_token(jtis[0], MAX_VALIDITY)
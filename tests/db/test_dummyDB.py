@@ -4,6 +4,7 @@ import asyncio
 from uuid import uuid4
 
 import pytest
+from sqlalchemy import event
 
 from diracx.core.exceptions import InvalidQueryError
 from diracx.db.dummy.db import DummyDB
@@ -65,3 +66,42 @@ async def test_insert_and_summary(dummy_db: DummyDB):
                     }
                 ],
             )
+
+
+async def test_lazy_connection(dummy_db: DummyDB):
+    checkouts = []
+    event.listen(
+        dummy_db.engine.sync_engine, "checkout", lambda *args: checkouts.append(args)
+    )
+    commits = []
+    event.listen(
+        dummy_db.engine.sync_engine, "commit", lambda *args: commits.append(args)
+    )
+
+    # Nothing is checked out of the pool until a statement is executed
+    async with dummy_db as dummy_db:
+        pass
+    assert not checkouts
+    assert not commits
+
+    async with dummy_db as dummy_db:
+        assert not checkouts
+        await asyncio.gather(*(dummy_db.summary(["model"], []) for _ in range(5)))
+    assert len(checkouts) == 1
+    assert len(commits) == 1
+    assert dummy_db.pool_stats.in_use == 0
+
+
+async def test_concurrent_transactions(dummy_db: DummyDB):
+    # A single instance is shared by all requests, each one gets its own transaction
+    async def transaction():
+        async with dummy_db:
+            conn = dummy_db.conn
+            await asyncio.sleep(0)
+            assert dummy_db.conn is conn
+            return conn
+
+    first, second = await asyncio.gather(transaction(), transaction())
+    assert first is not second
+    with pytest.raises(RuntimeError, match="used before entering"):
+        dummy_db.conn  # noqa: B018
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 import asyncio
+from datetime import datetime, timezone
 
 import pytest
 
+from diracx.core.exceptions import InvalidQueryError
+from diracx.core.models import CountAccuracy, TotalCountMode
 from diracx.db.jobs.db import JobDB
+from diracx.db.jobs.status import is_allowed_transition
 
 
 @pytest.fixture
@@ -16,8 +20,9 @@ async def job_db(tmp_path):
 
 async def test_some_asyncio_code(job_db):
     async with job_db as job_db:
-        result = await job_db.search(["JobID"], [], [])
+        result, next_cursor = await job_db.search(["JobID"], [], [])
         assert not result
+        assert next_cursor is None
 
         result = await asyncio.gather(
             *(
@@ -36,5 +41,477 @@ async def test_some_asyncio_code(job_db):
         )
 
     async with job_db as job_db:
-        result = await job_db.search(["JobID"], [], [])
+        result, _ = await job_db.search(["JobID"], [], [])
         assert result
+
+
+async def test_search_pagination(job_db):
+    async with job_db as job_db:
+        await asyncio.gather(
+            *(
+                job_db.insert(
+                    f"JDL{i}",
+                    "owner",
+                    "owner_dn",
+                    "owner_group",
+                    "diracSetup",
+                    f"Status{i % 3}",
+                    "dfdfds",
+                    "lhcb",
+                )
+                for i in range(25)
+            )
+        )
+
+    search = [{"parameter": "Owner", "operator": "eq", "value": "owner"}]
+    sorts = [{"parameter": "Status", "direction": "desc"}]
+    async with job_db as job_db:
+        expected, next_cursor = await job_db.search(
+            ["JobID", "Status"], search, sorts, per_page=100
+        )
+        assert len(expected) == 25
+        assert next_cursor is None
+
+        pages = []
+        next_cursor = None
+        while True:
+            result, next_cursor = await job_db.search(
+                ["JobID"], search, sorts, per_page=10, cursor=next_cursor
+            )
+            pages.append(result)
+            if next_cursor is None:
+                break
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    # Columns which are only needed for the cursor are not returned
+    assert all(row.keys() == {"JobID"} for page in pages for row in page)
+    assert [row["JobID"] for page in pages for row in page] == [
+        row["JobID"] for row in expected
+    ]
+    assert [(row["Status"], row["JobID"]) for row in expected] == sorted(
+        ((row["Status"], row["JobID"]) for row in expected), reverse=True
+    )
+
+    async with job_db as job_db:
+        with pytest.raises(InvalidQueryError):
+            await job_db.search(["JobID"], [], [], cursor="not-a-cursor")
+        _, next_cursor = await job_db.search(["JobID"], search, sorts, per_page=10)
+        # The cursor can't be reused with a different ordering
+        with pytest.raises(InvalidQueryError):
+            await job_db.search(["JobID"], search, [], cursor=next_cursor)
+
+
+async def test_search_stream(job_db):
+    async with job_db as job_db:
+        await asyncio.gather(
+            *(
+                job_db.insert(
+                    f"JDL{i}",
+                    "owner",
+                    "owner_dn",
+                    "owner_group",
+                    "diracSetup",
+                    "New",
+                    "dfdfds",
+                    "lhcb",
+                )
+                for i in range(25)
+            )
+        )
+
+    async with job_db as job_db:
+        expected, _ = await job_db.search(["JobID"], [], [], per_page=100)
+        batches = [
+            batch
+            async for batch in await job_db.search_stream(
+                ["JobID"], [], [], batch_size=10
+            )
+        ]
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [row for batch in batches for row in batch] == expected
+
+    async with job_db as job_db:
+        with pytest.raises(InvalidQueryError):
+            await job_db.search_stream(["NotAColumn"], [], [])
+
+
+async def test_search_sort_planning(job_db):
+    async with job_db as job_db:
+        # Sorting by the primary key is always possible
+        await job_db.search(
+            ["JobID"], [], [{"parameter": "JobID", "direction": "desc"}]
+        )
+        # Orderings which can't be read directly from an index aren't
+        with pytest.raises(InvalidQueryError, match="not supported by any index"):
+            await job_db.search(
+                ["JobID"], [], [{"parameter": "Status", "direction": "asc"}]
+            )
+        # Unless the columns before it in the index are fixed by the search
+        await job_db.search(
+            ["JobID"],
+            [{"parameter": "Owner", "operator": "eq", "value": "owner"}],
+            [{"parameter": "Status", "direction": "asc"}],
+        )
+        # Latest jobs first
+        await job_db.search(
+            ["JobID"], [], [{"parameter": "LastUpdateTime", "direction": "desc"}]
+        )
+        # Mixed directions can't be served by scanning an index
+        with pytest.raises(InvalidQueryError, match="not supported by any index"):
+            await job_db.search(
+                ["JobID"],
+                [],
+                [
+                    {"parameter": "LastUpdateTime", "direction": "asc"},
+                    {"parameter": "JobID", "direction": "desc"},
+                ],
+            )
+        with pytest.raises(InvalidQueryError, match="Unknown sort"):
+            await job_db.search(
+                ["JobID"], [], [{"parameter": "JobID", "direction": "dsc"}]
+            )
+        with pytest.raises(InvalidQueryError, match="Unknown sort parameter"):
+            await job_db.search(
+                ["JobID"], [], [{"parameter": "NotAColumn", "direction": "asc"}]
+            )
+
+
+async def test_search_large_in(job_db, monkeypatch):
+    monkeypatch.setattr("diracx.db.utils.LARGE_IN_THRESHOLD", 5)
+    async with job_db as job_db:
+        jobs = await asyncio.gather(
+            *(
+                job_db.insert(
+                    f"JDL{i}",
+                    f"owner{i % 2}",
+                    "owner_dn",
+                    "owner_group",
+                    "diracSetup",
+                    "New",
+                    "dfdfds",
+                    "lhcb",
+                )
+                for i in range(20)
+            )
+        )
+    job_ids = sorted(job["JobID"] for job in jobs)
+    wanted = job_ids[::2] + [123456]
+    search = [{"parameter": "JobID", "operator": "in", "values": wanted}]
+    owners = [{"parameter": "Owner", "operator": "in", "values": ["owner0"] * 6}]
+
+    async with job_db as job_db:
+        rows, _ = await job_db.search(["JobID"], search, [], per_page=4)
+        assert [row["JobID"] for row in rows] == job_ids[:8:2]
+        batches = await job_db.search_stream(["JobID"], search, [])
+        streamed = [row["JobID"] async for batch in batches for row in batch]
+        assert streamed == job_ids[::2]
+        assert await job_db.summary(["Status"], search) == [
+            {"Status": "New", "count": 10}
+        ]
+        # Answered from the JobCounts rollup
+        assert await job_db.summary(["Owner"], owners) == [
+            {"Owner": "owner0", "count": 10}
+        ]
+
+        # Several large filters on the same column
+        monkeypatch.undo()
+        both = [
+            {"parameter": "JobID", "operator": "in", "values": wanted * 1001},
+            {
+                "parameter": "JobID",
+                "operator": "not in",
+                "values": job_ids[::4] + list(range(-1001, 0)),
+            },
+        ]
+        rows, _ = await job_db.search(["JobID"], both, [])
+        assert [row["JobID"] for row in rows] == job_ids[2::4]
+        assert await job_db.summary(["Status"], both) == [{"Status": "New", "count": 5}]
+
+
+async def test_count(job_db):
+    async with job_db as job_db:
+        await asyncio.gather(
+            *(
+                job_db.insert(
+                    f"JDL{i}",
+                    f"owner{i % 2}",
+                    "owner_dn",
+                    "owner_group",
+                    "diracSetup",
+                    "New",
+                    "dfdfds",
+                    "lhcb",
+                )
+                for i in range(10)
+            )
+        )
+
+    exact, capped, estimated = TotalCountMode
+    # Filtering on OwnerDN or JobID can't be answered by the JobCounts rollup
+    full_scan = [{"parameter": "OwnerDN", "operator": "eq", "value": "owner_dn"}]
+    owner0 = [{"parameter": "Owner", "operator": "eq", "value": "owner0"}]
+    nothing = [{"parameter": "JobID", "operator": "lt", "value": 0}]
+    async with job_db as job_db:
+        for mode in TotalCountMode:
+            # Answered from the rollup so always exact
+            assert await job_db.count([], mode, cap=3) == (10, CountAccuracy.EXACT)
+            assert await job_db.count(owner0, mode, cap=3) == (5, "exact")
+            assert await job_db.count(nothing, mode, cap=3) == (0, "exact")
+        assert await job_db.count(full_scan, exact, cap=3) == (10, "exact")
+        assert await job_db.count(full_scan, capped, cap=3) == (3, "lower-bound")
+        assert await job_db.count(full_scan, capped, cap=10) == (10, "exact")
+        # SQLite has no row estimates
+        assert await job_db.count(full_scan, estimated, cap=3) == (3, "lower-bound")
+
+
+async def test_summary_job_counts(job_db):
+    async with job_db as job_db:
+        jobs = await asyncio.gather(
+            *(
+                job_db.insert(
+                    f"JDL{i}",
+                    f"owner{i % 2}",
+                    "owner_dn",
+                    "owner_group",
+                    "diracSetup",
+                    "New",
+                    "dfdfds",
+                    "lhcb",
+                )
+                for i in range(10)
+            )
+        )
+
+    async with job_db as job_db:
+        for job in jobs[:3]:
+            await job_db.setJobAttributes(job["JobID"], {"Status": "Running"})
+        # Jobs which don't exist don't change the counts
+        await job_db.setJobAttributes(12345, {"Status": "Running"})
+
+    # Filtering on OwnerDN forces the summary to be computed from the Jobs table
+    full_scan = [{"parameter": "OwnerDN", "operator": "eq", "value": "owner_dn"}]
+    async with job_db as job_db:
+        result = await job_db.summary(["Status"], [])
+        assert sorted(result, key=lambda x: x["Status"]) == [
+            {"Status": "New", "count": 7},
+            {"Status": "Running", "count": 3},
+        ]
+        assert sorted(
+            await job_db.summary(["Status"], full_scan), key=lambda x: x["Status"]
+        ) == sorted(result, key=lambda x: x["Status"])
+
+        search = [{"parameter": "Owner", "operator": "eq", "value": "owner0"}]
+        assert await job_db.summary(["Owner"], search) == [
+            {"Owner": "owner0", "count": 5}
+        ]
+        assert await job_db.summary([], []) == [{"count": 10}]
+
+        with pytest.raises(InvalidQueryError):
+            await job_db.summary(["NotAColumn"], [])
+
+    async with job_db as job_db:
+        await job_db.rebuild_job_counts()
+    async with job_db as job_db:
+        assert sorted(
+            await job_db.summary(["Status"], []), key=lambda x: x["Status"]
+        ) == sorted(result, key=lambda x: x["Status"])
+
+
+async def test_upgrade_fills_job_counts(tmp_path):
+    from diracx.db.jobs.schema import JobCounts
+
+    db_url = f"sqlite+aiosqlite:///{tmp_path}/test.db"
+    job_db = JobDB(db_url)
+    async with job_db.engine_context(check_schema=False):
+        await job_db.upgrade()
+        async with job_db as job_db:
+            await job_db.insert_bulk(
+                ["JDL"] * 3, "owner", "owner_dn", "owner_group", "s", "New", "a", "v"
+            )
+        # Simulate a DB which was created before the rollup existed
+        async with job_db.engine.begin() as conn:
+            await conn.run_sync(JobCounts.__table__.drop)
+        await job_db.upgrade()
+        async with job_db as job_db:
+            assert await job_db.summary(["Status"], []) == [
+                {"Status": "New", "count": 3}
+            ]
+
+
+def test_is_allowed_transition():
+    assert is_allowed_transition("Running", "Done")
+    assert is_allowed_transition("Done", "Done")
+    assert not is_allowed_transition("Done", "Running")
+    assert not is_allowed_transition("NotAStatus", "Running")
+    assert not is_allowed_transition("Running", "NotAStatus")
+
+
+async def test_set_job_statuses(job_db):
+    async with job_db as job_db:
+        jobs = await asyncio.gather(
+            *(
+                job_db.insert(
+                    f"JDL{i}",
+                    "owner",
+                    "owner_dn",
+                    "owner_group",
+                    "diracSetup",
+                    "RECEIVED",
+                    "Job accepted",
+                    "lhcb",
+                )
+                for i in range(4)
+            )
+        )
+    job_ids = [job["JobID"] for job in jobs]
+    params = ["JobID", "Status", "MinorStatus", "LastUpdateTime"]
+    async with job_db as job_db:
+        before = {x["JobID"]: x for x in (await job_db.search(params, [], []))[0]}
+    # LastUpdateTime is set by the DB which may have a precision of one second
+    update_time = datetime.now(tz=timezone.utc).replace(tzinfo=None, microsecond=0)
+
+    async with job_db as job_db:
+        new_statuses = await job_db.set_job_statuses(
+            {
+                job_ids[0]: ("Checking", "JobPath"),
+                job_ids[1]: ("Checking", "JobSanity"),
+                job_ids[2]: ("Done", "Execution Complete"),
+                job_ids[3]: ("Waiting", None),
+                12345: ("Running", None),
+            }
+        )
+    # Received jobs can't be done and unknown jobs are left out
+    assert new_statuses == {
+        job_ids[0]: "Checking",
+        job_ids[1]: "Checking",
+        job_ids[2]: "RECEIVED",
+        job_ids[3]: "Waiting",
+    }
+
+    async with job_db as job_db:
+        assert await job_db.get_job_statuses([*job_ids, 12345]) == new_statuses
+        after = {x["JobID"]: x for x in (await job_db.search(params, [], []))[0]}
+    assert [after[job_id]["MinorStatus"] for job_id in job_ids] == [
+        "JobPath",
+        "JobSanity",
+        "Job accepted",
+        "Job accepted",
+    ]
+    assert after[job_ids[2]]["LastUpdateTime"] == before[job_ids[2]]["LastUpdateTime"]
+    for job_id in [job_ids[0], job_ids[1], job_ids[3]]:
+        assert after[job_id]["LastUpdateTime"] >= update_time
+
+    # The JobCounts rollup is kept consistent with the Jobs table
+    full_scan = [{"parameter": "OwnerDN", "operator": "eq", "value": "owner_dn"}]
+    async with job_db as job_db:
+        grouping = ["Status", "MinorStatus"]
+        result = await job_db.summary(grouping, [])
+        assert sorted(result, key=str) == sorted(
+            await job_db.summary(grouping, full_scan), key=str
+        )
+        assert len(result) == 4
+
+
+async def test_insert_bulk(job_db):
+    async with job_db as job_db:
+        single = await job_db.insert(
+            "JDL", "owner", "owner_dn", "owner_group", "diracSetup", "New", "a", "lhcb"
+        )
+        jobs = await job_db.insert_bulk(
+            ["[InputData = {/a/b, /c/d};]", "JDL", "[JobGroup = %j;]"],
+            "owner",
+            "owner_dn",
+            "owner_group",
+            "diracSetup",
+            "Submitting",
+            "b",
+            "lhcb",
+        )
+        assert await job_db.insert_bulk([], "o", "d", "g", "s", "New", "a", "v") == []
+
+    job_ids = [job["JobID"] for job in jobs]
+    assert job_ids == [single["JobID"] + i for i in range(1, 4)]
+    assert {job["Status"] for job in jobs} == {"Submitting"}
+
+    async with job_db as job_db:
+        result, _ = await job_db.search(
+            ["JobID", "JobGroup", "Status"],
+            [{"parameter": "JobID", "operator": "in", "values": job_ids}],
+            [],
+        )
+        assert result == [
+            {"JobID": job_ids[0], "JobGroup": "00000000", "Status": "Submitting"},
+            {"JobID": job_ids[1], "JobGroup": "00000000", "Status": "Submitting"},
+            {"JobID": job_ids[2], "JobGroup": str(job_ids[2]), "Status": "Submitting"},
+        ]
+        assert sorted(
+            await job_db.summary(["Status"], []), key=lambda x: x["Status"]
+        ) == [{"Status": "New", "count": 1}, {"Status": "Submitting", "count": 3}]
+
+
+async def test_insert_invalid_jdl(job_db):
+    from DIRAC.Core.Utilities.ReturnValues import SErrorException
+
+    # Errors raised while preparing the JDL in the process pool are propagated
+    with pytest.raises(SErrorException, match="Wrong Owner in JDL"):
+        async with job_db as job_db:
+            await job_db.insert_bulk(
+                ["JDL", '[Owner = "someone_else";]'],
+                "owner",
+                "owner_dn",
+                "owner_group",
+                "diracSetup",
+                "New",
+                "a",
+                "lhcb",
+            )
+
+    async with job_db as job_db:
+        assert await job_db.search(["JobID"], [], []) == ([], None)
+
+
+async def test_read_only_replicas(tmp_path):
+    primary_url = f"sqlite+aiosqlite:///{tmp_path}/primary.db"
+    replica_url = f"sqlite+aiosqlite:///{tmp_path}/replica.db"
+    broken_url = f"sqlite+aiosqlite:///{tmp_path}/missing/replica.db"
+
+    # Fill the replica with a single job
+    for url in [primary_url, replica_url]:
+        db = JobDB(url)
+        async with db.engine_context(check_schema=False):
+            await db.upgrade()
+
+    replica_db = JobDB(replica_url)
+    async with replica_db.engine_context():
+        async with replica_db as replica_db:
+            await replica_db.insert_bulk(
+                ["JDL"], "owner", "owner_dn", "owner_group", "setup", "New", "a", "lhcb"
+            )
+
+    job_db = JobDB(primary_url, read_only_urls=[broken_url, replica_url])
+    async with job_db.engine_context():
+        async with job_db as job_db:
+            await job_db.insert_bulk(
+                ["JDL"] * 3,
+                "owner",
+                "owner_dn",
+                "owner_group",
+                "setup",
+                "New",
+                "a",
+                "v",
+            )
+
+        # Reads go to the replica which is working
+        for _ in range(3):
+            async with job_db as job_db:
+                result, _ = await job_db.search(["JobID"], [], [])
+                assert result == [{"JobID": 1}]
+                assert await job_db.summary([], []) == [{"count": 1}]
+
+    # The primary is used when no replica is available
+    job_db = JobDB(primary_url, read_only_urls=[broken_url])
+    async with job_db.engine_context():
+        async with job_db as job_db:
+            result, _ = await job_db.search(["JobID"], [], [])
+            assert result == [{"JobID": 1}, {"JobID": 2}, {"JobID": 3}]
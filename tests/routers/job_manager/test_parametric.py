@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import itertools
+
+import pytest
+from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
+from DIRAC.WorkloadManagementSystem.Utilities.ParametricJob import (
+    generateParametricJobs,
+    getParameterVectorLength,
+)
+
+from diracx.core.exceptions import InvalidJDLError
+from diracx.routers.job_manager.parametric import iter_parametric_jobs
+
+from ..test_job_manager import TEST_PARAMETRIC_JDL
+
+
+@pytest.mark.parametrize(
+    "jdl",
+    [
+        TEST_PARAMETRIC_JDL,
+        'Executable = "x"; Arguments = "%s %n"; Parameters = {a, b_%n, c};',
+        'Arguments = "%s"; Parameters = 12; ParameterStart = 1.5; '
+        "ParameterStep = 2; ParameterFactor = 3;",
+        'Arguments = "%(A)s %(B)s"; Parameters = 2; Parameters.A = {x, y}; '
+        "Parameters.B = {{1, 2}, 3}; InputData = {%(B)s};",
+    ],
+)
+def test_iter_parametric_jobs(jdl):
+    class_ad = ClassAd(f"[{jdl}]")
+    n_values = getParameterVectorLength(class_ad)["Value"]
+    expected = generateParametricJobs(class_ad)["Value"]
+    assert list(iter_parametric_jobs(class_ad, n_values)) == expected
+
+
+def test_iter_parametric_jobs_lazy():
+    # Only the jobs which are consumed are generated
+    class_ad = ClassAd('[Arguments = "%s"; Parameters = 1000000;]')
+    jobs = iter_parametric_jobs(class_ad, 1_000_000)
+    first = list(itertools.islice(jobs, 2))
+    assert [ClassAd(x).getAttributeInt("ParameterNumber") for x in first] == [0, 1]
+
+
+def test_iter_parametric_jobs_invalid():
+    class_ad = ClassAd('[Arguments = "%s"; Parameters = 2; ParameterStep = abc;]')
+    with pytest.raises(InvalidJDLError, match="Illegal value for ParameterStep"):
+        iter_parametric_jobs(class_ad, 2)
@@ -1,19 +1,39 @@
+import asyncio
 import base64
 import hashlib
 import secrets
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
+from uuid import uuid4
 
 import httpx
 import pytest
+from authlib.jose import JsonWebKey
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+from fastapi import HTTPException
 from pytest_httpx import HTTPXMock
 
 from diracx.core.config import Config
 from diracx.core.properties import SecurityProperty
+from diracx.core.settings import TokenSigningKey
 from diracx.routers.auth import (
+    JWKS_MIN_REFETCH_INTERVAL_SECONDS,
+    JWKS_REFRESH_AHEAD_SECONDS,
+    JWKS_TTL_SECONDS,
+    SERVER_METADATA_GRACE_SECONDS,
+    SERVER_METADATA_TTL_SECONDS,
+    _jwks_cache,
+    _jwks_fetches,
     _server_metadata_cache,
+    _server_metadata_fetches,
+    _verified_token_cache,
+    create_access_token,
+    fetch_jwk_set,
     get_server_metadata,
     parse_and_validate_scope,
+    revoke_verified_tokens,
+    verify_dirac_token,
 )
 
 DIRAC_CLIENT_ID = "myDIRACClientID"
@@ -30,7 +50,8 @@ async def auth_httpx_mock(httpx_mock: HTTPXMock, monkeypatch):
     path = "lhcb-auth.web.cern.ch/.well-known/openid-configuration"
     httpx_mock.add_response(url=f"https://{path}", text=(data_dir / path).read_text())
 
-    server_metadata = await get_server_metadata(f"https://{path}")
+    async with httpx.AsyncClient() as http_client:
+        server_metadata = await get_server_metadata(http_client, f"https://{path}")
 
     def custom_response(request: httpx.Request):
         if b"&code=valid-code&" in request.content:
@@ -198,13 +219,91 @@ async def test_device_flow(test_client, auth_httpx_mock: HTTPXMock):
     )
 
 
+async def test_refresh_token(test_client, auth_httpx_mock: HTTPXMock):
+    r = test_client.post(
+        "/auth/device",
+        params={
+            "client_id": DIRAC_CLIENT_ID,
+            "audience": "Dirac server",
+            "scope": "vo:lhcb group:lhcb_user property:NormalUser",
+        },
+    )
+    assert r.status_code == 200, r.json()
+    data = r.json()
+    r = test_client.get(data["verification_uri_complete"], follow_redirects=False)
+    assert r.status_code == 307, r.text
+    query_paramers = parse_qs(urlparse(r.headers["Location"]).query)
+    redirect_uri = query_paramers["redirect_uri"][0]
+    state = query_paramers["state"][0]
+    r = test_client.get(redirect_uri, params={"code": "valid-code", "state": state})
+    assert r.status_code == 200, r.text
+    tokens = _get_token(
+        test_client,
+        {
+            "grant_type": "urn:ietf:params:oauth:grant-type:device_code",
+            "device_code": data["device_code"],
+            "client_id": DIRAC_CLIENT_ID,
+        },
+    )
+
+    # The refresh token can't be used as an access token
+    r = test_client.get(
+        "/config/lhcb",
+        headers={"Authorization": f"Bearer {tokens['refresh_token']}"},
+    )
+    assert r.status_code == 401, r.json()
+
+    def refresh(refresh_token, client_id=DIRAC_CLIENT_ID):
+        return test_client.post(
+            "/auth/token",
+            data={
+                "grant_type": "refresh_token",
+                "refresh_token": refresh_token,
+                "client_id": client_id,
+            },
+        )
+
+    r = refresh(tokens["refresh_token"], client_id="bad-client-id")
+    assert r.status_code == 400, r.json()
+    r = test_client.post(
+        "/auth/token",
+        data={"grant_type": "refresh_token", "client_id": DIRAC_CLIENT_ID},
+    )
+    assert r.status_code == 400, r.json()
+    assert r.json()["error"] == "invalid_request"
+
+    # Refreshing gives a new pair of tokens for the same user and scope
+    r = refresh(tokens["refresh_token"])
+    assert r.status_code == 200, r.json()
+    refreshed = r.json()
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+    r = test_client.get(
+        "/config/lhcb",
+        headers={"Authorization": f"Bearer {refreshed['access_token']}"},
+    )
+    assert r.status_code == 200, r.json()
+
+    # Reusing a refresh token fails and revokes the rotated one too
+    cached_tokens = [e.user_info.bearer_token for e in _verified_token_cache.values()]
+    assert refreshed["access_token"] in cached_tokens
+    r = refresh(tokens["refresh_token"])
+    assert r.status_code == 400, r.json()
+    assert r.json()["error"] == "invalid_grant"
+    # The verifications of the access tokens of the user are forgotten
+    cached_tokens = [e.user_info.bearer_token for e in _verified_token_cache.values()]
+    assert refreshed["access_token"] not in cached_tokens
+    r = refresh(refreshed["refresh_token"])
+    assert r.status_code == 400, r.json()
+    assert r.json()["error"] == "invalid_grant"
+
+
 def _get_token(test_client, request_data):
     # Check that token request now works
     r = test_client.post("/auth/token", data=request_data)
     assert r.status_code == 200, r.json()
     response_data = r.json()
     assert response_data["access_token"]
-    # TODO assert response_data["refresh_token"]
+    assert response_data["refresh_token"]
     assert response_data["expires_in"]
     assert response_data["state"]
 
@@ -285,3 +384,196 @@ def test_parse_scopes_invalid(vos, groups, scope, expected_error):
     available_properties = SecurityProperty.available_properties()
     with pytest.raises(ValueError, match=expected_error):
         parse_and_validate_scope(scope, config, available_properties)
+
+
+async def test_verified_token_cache(test_auth_settings, monkeypatch):
+    payload = {
+        "sub": "testingVO:yellow-sub",
+        "aud": test_auth_settings.token_audience,
+        "iss": test_auth_settings.token_issuer,
+        "dirac_properties": ["NormalUser"],
+        "jti": str(uuid4()),
+        "preferred_username": "preferred_username",
+        "dirac_group": "test_group",
+        "vo": "lhcb",
+    }
+    token = create_access_token(payload, test_auth_settings)
+    user_info = await verify_dirac_token(f"Bearer {token}", test_auth_settings)
+    assert str(user_info.token_id) == payload["jti"]
+
+    # The signature of a token which was already verified isn't checked again
+    def fail(*args, **kwargs):
+        raise AssertionError("The token should not be decoded again")
+
+    monkeypatch.setattr("diracx.routers.auth.JsonWebToken", fail)
+    assert await verify_dirac_token(f"Bearer {token}", test_auth_settings) == user_info
+
+    # Revoking the tokens of the user forgets their verification
+    revoke_verified_tokens(payload["sub"])
+    with pytest.raises(AssertionError):
+        await verify_dirac_token(f"Bearer {token}", test_auth_settings)
+    monkeypatch.undo()
+    await verify_dirac_token(f"Bearer {token}", test_auth_settings)
+    revoke_verified_tokens("testingVO:other-sub")
+    monkeypatch.setattr("diracx.routers.auth.JsonWebToken", fail)
+    assert await verify_dirac_token(f"Bearer {token}", test_auth_settings) == user_info
+
+    # Tokens verified with other settings are verified again
+    other_settings = test_auth_settings.copy(update={"token_audience": "other"})
+    with pytest.raises(AssertionError):
+        await verify_dirac_token(f"Bearer {token}", other_settings)
+    monkeypatch.undo()
+
+    # Invalid tokens are never cached
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc_info:
+            await verify_dirac_token(f"Bearer {token}x", test_auth_settings)
+        assert exc_info.value.status_code == 401
+
+
+async def test_jwks_cache(httpx_mock: HTTPXMock):
+    metadata_url = "https://idp.invalid/.well-known/openid-configuration"
+    jwks_uri = "https://idp.invalid/jwks"
+    httpx_mock.add_response(url=metadata_url, json={"jwks_uri": jwks_uri})
+    keys = [
+        JsonWebKey.generate_key("RSA", 2048, {"kid": kid}, is_private=True)
+        for kid in ["key1", "key2"]
+    ]
+    published = keys[:1]
+    httpx_mock.add_callback(
+        lambda request: httpx.Response(
+            200, json={"keys": [key.as_dict() for key in published]}
+        ),
+        url=jwks_uri,
+    )
+
+    def age_cache(seconds):
+        _jwks_cache[metadata_url] = _jwks_cache[metadata_url]._replace(
+            fetched=_jwks_cache[metadata_url].fetched - seconds
+        )
+
+    http_client = httpx.AsyncClient()
+    try:
+        key_set = await fetch_jwk_set(http_client, metadata_url)
+        assert [key.kid for key in key_set.keys] == ["key1"]
+        assert await fetch_jwk_set(http_client, metadata_url, "key1") is key_set
+        assert len(httpx_mock.get_requests(url=jwks_uri)) == 1
+
+        # The IdP rotates its keys but refetches are rate limited
+        published = keys
+        assert await fetch_jwk_set(http_client, metadata_url, "key2") is key_set
+        assert len(httpx_mock.get_requests(url=jwks_uri)) == 1
+        age_cache(JWKS_MIN_REFETCH_INTERVAL_SECONDS + 1)
+        key_set = await fetch_jwk_set(http_client, metadata_url, "key2")
+        assert [key.kid for key in key_set.keys] == ["key1", "key2"]
+        assert len(httpx_mock.get_requests(url=jwks_uri)) == 2
+
+        # Key sets which are about to expire are refreshed in the background
+        age_cache(JWKS_TTL_SECONDS - JWKS_REFRESH_AHEAD_SECONDS + 1)
+        assert await fetch_jwk_set(http_client, metadata_url, "key1") is key_set
+        await asyncio.gather(*_jwks_fetches.values())
+        assert len(httpx_mock.get_requests(url=jwks_uri)) == 3
+        assert await fetch_jwk_set(http_client, metadata_url, "key1") is not key_set
+
+        # Expired key sets are fetched again
+        age_cache(JWKS_TTL_SECONDS + 1)
+        await fetch_jwk_set(http_client, metadata_url)
+        assert len(httpx_mock.get_requests(url=jwks_uri)) == 4
+    finally:
+        await http_client.aclose()
+        _jwks_cache.clear()
+        _server_metadata_cache.clear()
+
+
+async def test_server_metadata_cache(httpx_mock: HTTPXMock):
+    url = "https://idp.invalid/.well-known/openid-configuration"
+    responses = iter(
+        [
+            httpx.Response(200, json={"issuer": "first"}),
+            httpx.Response(200, json={"issuer": "second"}),
+            httpx.Response(500),
+            httpx.Response(500),
+        ]
+    )
+    httpx_mock.add_callback(lambda request: next(responses), url=url)
+
+    def age_cache(seconds):
+        _server_metadata_cache[url] = _server_metadata_cache[url]._replace(
+            fetched=_server_metadata_cache[url].fetched - seconds
+        )
+
+    http_client = httpx.AsyncClient()
+    try:
+        # Concurrent misses share a single request
+        results = await asyncio.gather(
+            *(get_server_metadata(http_client, url) for _ in range(5))
+        )
+        assert results == [{"issuer": "first"}] * 5
+        assert len(httpx_mock.get_requests(url=url)) == 1
+
+        # Expired metadata is served while it is refreshed in the background
+        age_cache(SERVER_METADATA_TTL_SECONDS + 1)
+        assert await get_server_metadata(http_client, url) == {"issuer": "first"}
+        await asyncio.gather(*_server_metadata_fetches.values())
+        assert await get_server_metadata(http_client, url) == {"issuer": "second"}
+        assert len(httpx_mock.get_requests(url=url)) == 2
+
+        # The last good value is used during the grace period if the IdP fails
+        age_cache(SERVER_METADATA_TTL_SECONDS + 1)
+        assert await get_server_metadata(http_client, url) == {"issuer": "second"}
+        await asyncio.gather(*_server_metadata_fetches.values(), return_exceptions=True)
+        assert await get_server_metadata(http_client, url) == {"issuer": "second"}
+        assert len(httpx_mock.get_requests(url=url)) == 3
+
+        age_cache(SERVER_METADATA_GRACE_SECONDS)
+        with pytest.raises(NotImplementedError):
+            await get_server_metadata(http_client, url)
+    finally:
+        await http_client.aclose()
+        _server_metadata_cache.clear()
+
+
+async def test_token_key_rollover(test_auth_settings):
+    payload = {
+        "sub": "testingVO:yellow-sub",
+        "aud": test_auth_settings.token_audience,
+        "iss": test_auth_settings.token_issuer,
+        "dirac_properties": ["NormalUser"],
+        "preferred_username": "preferred_username",
+        "dirac_group": "test_group",
+        "vo": "lhcb",
+    }
+    rsa_token = create_access_token(payload | {"jti": str(uuid4())}, test_auth_settings)
+
+    # Move to an Ed25519 key, the RSA key is kept to verify existing tokens
+    ed25519_pem = (
+        ed25519.Ed25519PrivateKey.generate()
+        .private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        .decode()
+    )
+    new_settings = test_auth_settings.copy(
+        update={
+            "token_key": TokenSigningKey(ed25519_pem),
+            "token_retiring_keys": [test_auth_settings.token_key],
+        }
+    )
+    assert new_settings.signing_algorithm == "EdDSA"
+    assert list(new_settings.verification_keys()) == [
+        new_settings.token_key.kid,
+        test_auth_settings.token_key.kid,
+    ]
+    ed25519_token = create_access_token(payload | {"jti": str(uuid4())}, new_settings)
+    for token in [rsa_token, ed25519_token]:
+        await verify_dirac_token(f"Bearer {token}", new_settings)
+
+    # Once the RSA key is removed its tokens are rejected, even if they were
+    # already verified
+    retired_settings = new_settings.copy(update={"token_retiring_keys": []})
+    await verify_dirac_token(f"Bearer {ed25519_token}", retired_settings)
+    with pytest.raises(HTTPException) as exc_info:
+        await verify_dirac_token(f"Bearer {rsa_token}", retired_settings)
+    assert exc_info.value.status_code == 401
@@ -8,3 +8,67 @@ def test_oidc_configuration(test_client):
     r = test_client.get("/.well-known/openid-configuration")
     assert r.status_code == 200
     assert r.json()
+
+    r = test_client.get(r.json()["jwks_uri"])
+    assert r.status_code == 200
+    [key] = r.json()["keys"]
+    assert key["kty"] == "RSA"
+    assert key["alg"] == "RS256"
+    assert "d" not in key
+
+
+def test_metrics(test_client, metrics_headers):
+    r = test_client.get("/metrics")
+    assert r.status_code == 401
+    r = test_client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+    assert r.status_code == 401
+
+    r = test_client.get("/metrics", headers=metrics_headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    assert 'diracx_db_pool_connections_in_use{db="JobDB"} 0' in r.text
+    assert 'diracx_db_pool_checkouts_total{db="AuthDB"}' in r.text
+    assert 'diracx_query_cache_hits_total{cache="jobs_query"}' in r.text
+
+
+def test_retry_deadlocks_opt_in(monkeypatch):
+    import sqlite3
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy.exc import OperationalError
+
+    from diracx.routers.fastapi_classes import DiracxRouter, retry_deadlocks
+
+    monkeypatch.setattr("diracx.routers.fastapi_classes.TRANSACTION_RETRY_DELAY", 0)
+    calls = []
+
+    def deadlock_once(name):
+        calls.append(name)
+        if len(calls) == 1:
+            orig = sqlite3.OperationalError("database is locked")
+            orig.sqlite_errorcode = 5  # type: ignore[attr-defined]
+            raise OperationalError("SELECT", {}, orig)
+        return name
+
+    router = DiracxRouter()
+
+    @router.get("/retried")
+    @retry_deadlocks
+    async def retried():
+        return deadlock_once("retried")
+
+    @router.get("/not-retried")
+    async def not_retried():
+        return deadlock_once("not-retried")
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app, raise_server_exceptions=False)
+
+    assert client.get("/retried").json() == "retried"
+    assert calls == ["retried", "retried"]
+
+    calls.clear()
+    assert client.get("/not-retried").status_code == 500
+    assert calls == ["not-retried"]
@@ -0,0 +1,47 @@
+import httpx
+import pytest
+
+from diracx.routers.auth import _server_metadata_cache, get_server_metadata
+from diracx.routers.http_client import HTTPClientSettings, SharedHTTPClient
+
+
+async def test_shared_http_client():
+    requests = []
+
+    def stub_idp(request: httpx.Request):
+        requests.append(request.url)
+        if request.url.path == "/.well-known/openid-configuration":
+            return httpx.Response(200, json={"issuer": "https://idp.invalid/"})
+        return httpx.Response(404)
+
+    settings = HTTPClientSettings(max_connections=7, timeout=3, connect_timeout=1)
+    shared = SharedHTTPClient(settings, transport=httpx.MockTransport(stub_idp))
+    with pytest.raises(RuntimeError):
+        shared.client  # noqa: B018
+
+    async with shared.client_context():
+        client = shared.client
+        assert client.timeout == httpx.Timeout(3, connect=1)
+        url = "https://idp.invalid/.well-known/openid-configuration"
+        try:
+            server_metadata = await get_server_metadata(client, url)
+        finally:
+            _server_metadata_cache.clear()
+        assert server_metadata == {"issuer": "https://idp.invalid/"}
+        assert shared.client is client
+    assert client.is_closed
+    assert len(requests) == 1
+
+
+def test_http_client_settings(monkeypatch):
+    monkeypatch.setenv("DIRACX_HTTP_CLIENT_MAX_CONNECTIONS", "3")
+    monkeypatch.setenv("DIRACX_HTTP_CLIENT_HTTP2", "true")
+    options = HTTPClientSettings().client_options()
+    assert options["limits"].max_connections == 3
+    assert options["http2"] is True
+
+
+def test_app_http_client(test_client):
+    client = test_client.app.dependency_overrides[SharedHTTPClient.create]()
+    assert isinstance(client, httpx.AsyncClient)
+    assert not client.is_closed
@@ -1,3 +1,12 @@
+import json
+import sqlite3
+from datetime import timedelta
+from uuid import uuid4
+
+from diracx.db import JobDB
+from diracx.routers.auth import create_access_token
+from diracx.routers.job_manager import MAX_PER_PAGE
+
 TEST_JDL = """
     Arguments = "jobDescription.xml -o LogLevel=INFO";
     Executable = "dirac-jobexec";
@@ -156,3 +165,366 @@ def test_insert_and_search(normal_user_client):
     )
     assert r.status_code == 200, r.json()
     assert r.json() == []
+
+
+def test_search_pagination(normal_user_client):
+    r = normal_user_client.post("/jobs/", json=[TEST_PARAMETRIC_JDL])
+    assert r.status_code == 200, r.json()
+    submitted_job_ids = sorted([job_dict["JobID"] for job_dict in r.json()])
+
+    r = normal_user_client.post("/jobs/search", params={"per_page": 2})
+    assert r.status_code == 200, r.json()
+    assert [x["JobID"] for x in r.json()] == submitted_job_ids[:2]
+    cursor = r.headers["X-DiracX-Next-Cursor"]
+
+    r = normal_user_client.post(
+        "/jobs/search", params={"per_page": 2, "cursor": cursor}
+    )
+    assert r.status_code == 200, r.json()
+    assert [x["JobID"] for x in r.json()] == submitted_job_ids[2:]
+    assert "X-DiracX-Next-Cursor" not in r.headers
+
+    r = normal_user_client.post("/jobs/search", params={"cursor": "invalid"})
+    assert r.status_code == 400, r.json()
+
+    for per_page in [-1, 0, MAX_PER_PAGE + 1]:
+        r = normal_user_client.post("/jobs/search", params={"per_page": per_page})
+        assert r.status_code == 422, r.json()
+    r = normal_user_client.post("/jobs/search", params={"per_page": MAX_PER_PAGE})
+    assert r.status_code == 200, r.json()
+    assert len(r.json()) == len(submitted_job_ids)
+
+
+def test_search_ndjson(normal_user_client):
+    r = normal_user_client.post("/jobs/", json=[TEST_PARAMETRIC_JDL])
+    assert r.status_code == 200, r.json()
+    submitted_job_ids = sorted([job_dict["JobID"] for job_dict in r.json()])
+
+    r = normal_user_client.post(
+        "/jobs/search",
+        params={"per_page": 1},
+        json={"parameters": ["JobID", "Status", "SubmissionTime"]},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"] == "application/x-ndjson"
+    listed_jobs = [json.loads(line) for line in r.text.splitlines()]
+    assert [x["JobID"] for x in listed_jobs] == submitted_job_ids
+    assert {x["Status"] for x in listed_jobs} == {"Submitting"}
+    # Datetimes are serialised the same way as in the JSON response
+    r = normal_user_client.post(
+        "/jobs/search", json={"parameters": ["JobID", "SubmissionTime"]}
+    )
+    assert r.json() == [
+        {"JobID": x["JobID"], "SubmissionTime": x["SubmissionTime"]}
+        for x in listed_jobs
+    ]
+
+    r = normal_user_client.post(
+        "/jobs/search",
+        json={"parameters": ["NotAColumn"]},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert r.status_code == 400, r.text
+
+
+def test_search_sort(normal_user_client):
+    r = normal_user_client.post("/jobs/", json=[TEST_PARAMETRIC_JDL])
+    assert r.status_code == 200, r.json()
+    submitted_job_ids = sorted([job_dict["JobID"] for job_dict in r.json()])
+
+    r = normal_user_client.post(
+        "/jobs/search", json={"sort": [{"parameter": "JobID", "direction": "desc"}]}
+    )
+    assert r.status_code == 200, r.json()
+    assert [x["JobID"] for x in r.json()] == submitted_job_ids[::-1]
+
+    r = normal_user_client.post(
+        "/jobs/search", json={"sort": [{"parameter": "JobID", "direction": "dsc"}]}
+    )
+    assert r.status_code == 422, r.json()
+
+
+def test_search_filters(normal_user_client):
+    r = normal_user_client.post("/jobs/", json=[TEST_PARAMETRIC_JDL])
+    assert r.status_code == 200, r.json()
+    submitted_job_ids = sorted([job_dict["JobID"] for job_dict in r.json()])
+
+    excluded = submitted_job_ids[1]
+    r = normal_user_client.post(
+        "/jobs/search",
+        json={
+            "search": [
+                {"parameter": "JobID", "operator": "not in", "values": [excluded]}
+            ]
+        },
+    )
+    assert r.status_code == 200, r.json()
+    assert [x["JobID"] for x in r.json()] == [
+        job_id for job_id in submitted_job_ids if job_id != excluded
+    ]
+
+    for bad_filter in [
+        {"parameter": "NotAColumn", "operator": "eq", "value": "1"},
+        {"parameter": "JobID", "operator": "like", "value": "1%"},
+        {"parameter": "JobID", "operator": "eq", "value": "one"},
+    ]:
+        r = normal_user_client.post("/jobs/search", json={"search": [bad_filter]})
+        assert r.status_code == 400, r.json()
+        r = normal_user_client.post(
+            "/jobs/summary", json={"grouping": ["Status"], "search": [bad_filter]}
+        )
+        assert r.status_code == 400, r.json()
+
+
+def test_search_total_count(normal_user_client):
+    r = normal_user_client.post("/jobs/", json=[TEST_PARAMETRIC_JDL])
+    assert r.status_code == 200, r.json()
+
+    r = normal_user_client.post("/jobs/search", params={"per_page": 1})
+    assert r.status_code == 200, r.json()
+    assert "X-DiracX-Total-Count" not in r.headers
+
+    for total in ["exact", "capped", "estimated"]:
+        r = normal_user_client.post(
+            "/jobs/search", params={"per_page": 1, "total": total}
+        )
+        assert r.status_code == 200, r.json()
+        assert len(r.json()) == 1
+        assert r.headers["X-DiracX-Total-Count"] == "3"
+        assert r.headers["X-DiracX-Total-Count-Accuracy"] == "exact"
+
+    r = normal_user_client.post("/jobs/search", params={"total": "roughly"})
+    assert r.status_code == 422, r.json()
+
+
+def test_export(normal_user_client, monkeypatch):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    monkeypatch.setattr("diracx.routers.job_manager.EXPORT_BATCH_SIZE", 2)
+    r = normal_user_client.post("/jobs/", json=[TEST_PARAMETRIC_JDL])
+    assert r.status_code == 200, r.json()
+
+    parameters = ["JobID", "SubmissionTime", "Status", "VerifiedFlag"]
+    r = normal_user_client.post("/jobs/search", json={"parameters": parameters})
+    assert r.status_code == 200, r.json()
+    expected = r.json()
+
+    r = normal_user_client.post("/jobs/export", json={"parameters": parameters})
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    reader = pa.ipc.open_stream(r.content)
+    assert reader.schema.names == parameters
+    batches = list(reader)
+    assert [batch.num_rows for batch in batches] == [2, 1]
+    table = pa.Table.from_batches(batches)
+    assert table["JobID"].to_pylist() == [x["JobID"] for x in expected]
+    assert table["Status"].to_pylist() == [x["Status"] for x in expected]
+    assert table["VerifiedFlag"].to_pylist() == [x["VerifiedFlag"] for x in expected]
+    # The DB stores naive datetimes in UTC
+    submission_times = table["SubmissionTime"].to_pylist()
+    assert {x.utcoffset() for x in submission_times} == {timedelta(0)}
+    assert [x.replace(tzinfo=None).isoformat() for x in submission_times] == [
+        x["SubmissionTime"] for x in expected
+    ]
+
+    r = normal_user_client.post(
+        "/jobs/export",
+        params={"format": "parquet"},
+        json={"search": [{"parameter": "JobID", "operator": "lt", "value": 0}]},
+    )
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"] == "application/vnd.apache.parquet"
+    table = pq.read_table(pa.BufferReader(r.content))
+    assert table.num_rows == 0
+    assert "OwnerDN" in table.schema.names
+
+
+def test_job_status(normal_user_client):
+    r = normal_user_client.post("/jobs/", json=[TEST_JDL, TEST_JDL])
+    assert r.status_code == 200, r.json()
+    job_ids = [job["JobID"] for job in r.json()]
+
+    r = normal_user_client.get("/jobs/status", params={"job_ids": [*job_ids, 999]})
+    assert r.status_code == 200, r.json()
+    assert r.json() == [
+        {"job_id": job_id, "status": "Submitting"} for job_id in job_ids
+    ]
+
+    r = normal_user_client.post(
+        f"/jobs/{job_ids[0]}/status",
+        params={"status": "RECEIVED", "minor_status": "Job accepted"},
+    )
+    assert r.status_code == 200, r.json()
+    assert r.json() == {"job_id": job_ids[0], "status": "RECEIVED"}
+
+    r = normal_user_client.get(f"/jobs/{job_ids[0]}/status")
+    assert r.status_code == 200, r.json()
+    assert r.json() == "RECEIVED"
+
+    r = normal_user_client.post(f"/jobs/{job_ids[0]}/status", params={"status": "Done"})
+    assert r.status_code == 409, r.json()
+
+    r = normal_user_client.get("/jobs/999/status")
+    assert r.status_code == 404, r.json()
+    r = normal_user_client.post("/jobs/999/status", params={"status": "Running"})
+    assert r.status_code == 404, r.json()
+
+    # Updates which are not allowed are ignored
+    r = normal_user_client.post(
+        "/jobs/status",
+        json=[
+            {"job_id": job_ids[0], "status": "Checking", "minor_status": "JobPath"},
+            {"job_id": job_ids[1], "status": "Running"},
+            {"job_id": 999, "status": "Running"},
+        ],
+    )
+    assert r.status_code == 200, r.json()
+    assert sorted(r.json(), key=lambda x: x["job_id"]) == [
+        {"job_id": job_ids[0], "status": "Checking"},
+        {"job_id": job_ids[1], "status": "Submitting"},
+    ]
+
+    r = normal_user_client.post(
+        "/jobs/summary", json={"grouping": ["Status", "MinorStatus"]}
+    )
+    assert r.status_code == 200, r.json()
+    assert sorted(r.json(), key=lambda x: x["Status"]) == [
+        {"Status": "Checking", "MinorStatus": "JobPath", "count": 1},
+        {
+            "Status": "Submitting",
+            "MinorStatus": "Bulk transaction confirmation",
+            "count": 1,
+        },
+    ]
+
+
+def test_job_status_other_owner(normal_user_client, test_auth_settings):
+    r = normal_user_client.post("/jobs/", json=[TEST_JDL])
+    assert r.status_code == 200, r.json()
+    job_id = r.json()[0]["JobID"]
+
+    payload = normal_user_client.dirac_token_payload | {
+        "sub": "testingVO:other-sub",
+        "jti": str(uuid4()),
+    }
+    token = create_access_token(payload, test_auth_settings)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # Jobs of other users are visible but can't be modified
+    r = normal_user_client.get(f"/jobs/{job_id}/status", headers=headers)
+    assert r.status_code == 200, r.json()
+    assert r.json() == "RECEIVED"
+    r = normal_user_client.post(
+        f"/jobs/{job_id}/status", params={"status": "Killed"}, headers=headers
+    )
+    assert r.status_code == 404, r.json()
+    r = normal_user_client.post(
+        "/jobs/status", json=[{"job_id": job_id, "status": "Killed"}], headers=headers
+    )
+    assert r.status_code == 200, r.json()
+    assert r.json() == []
+
+    r = normal_user_client.get(f"/jobs/{job_id}/status")
+    assert r.json() == "RECEIVED"
+
+
+def test_job_status_unknown(normal_user_client, monkeypatch):
+    async def get_job_statuses(self, job_ids, *, owner=None):
+        return {job_id: "Received" for job_id in job_ids}
+
+    monkeypatch.setattr(JobDB, "get_job_statuses", get_job_statuses)
+
+    # Statuses set by DIRAC which aren't known to DiracX are returned as is
+    r = normal_user_client.get("/jobs/1/status")
+    assert r.status_code == 200, r.json()
+    assert r.json() == "Received"
+    r = normal_user_client.get("/jobs/status", params={"job_ids": [1]})
+    assert r.status_code == 200, r.json()
+    assert r.json() == [{"job_id": 1, "status": "Received"}]
+
+
+def test_insert_bulk_jobs(normal_user_client):
+    job_definitions = [TEST_JDL, TEST_PARAMETRIC_JDL, TEST_JDL]
+    r = normal_user_client.post("/jobs/", json=job_definitions)
+    assert r.status_code == 200, r.json()
+    assert len(r.json()) == 5
+    submitted_job_ids = [job_dict["JobID"] for job_dict in r.json()]
+    assert submitted_job_ids == list(
+        range(submitted_job_ids[0], submitted_job_ids[0] + 5)
+    )
+    assert {job_dict["Status"] for job_dict in r.json()} == {"Submitting"}
+
+    r = normal_user_client.post(
+        "/jobs/search", json={"parameters": ["JobID", "JobName"]}
+    )
+    assert r.status_code == 200, r.json()
+    assert [x["JobID"] for x in r.json()] == submitted_job_ids
+    assert [x["JobName"] for x in r.json()] == ["jobName"] + ["Name"] * 3 + ["jobName"]
+
+
+def test_insert_large_parametric_job(normal_user_client, monkeypatch):
+    monkeypatch.setattr("diracx.routers.job_manager.SUBMISSION_BATCH_SIZE", 7)
+    jdl = 'Executable = "echo"; Arguments = "%s"; Parameters = 20;'
+    r = normal_user_client.post("/jobs/", json=[jdl, TEST_JDL])
+    assert r.status_code == 200, r.json()
+    submitted_job_ids = [job_dict["JobID"] for job_dict in r.json()]
+    assert submitted_job_ids == list(
+        range(submitted_job_ids[0], submitted_job_ids[0] + 21)
+    )
+
+    r = normal_user_client.post(
+        "/jobs/summary", json={"grouping": ["Status", "JobName"]}
+    )
+    assert r.status_code == 200, r.json()
+    assert sorted(r.json(), key=lambda x: x["count"]) == [
+        {"Status": "Submitting", "JobName": "jobName", "count": 1},
+        {"Status": "Submitting", "JobName": "Unknown", "count": 20},
+    ]
+
+    jdl = 'Executable = "echo"; Arguments = "%s"; Parameters = 10001;'
+    r = normal_user_client.post("/jobs/", json=[jdl])
+    assert r.status_code == 400, r.json()
+    assert "exceeds the limit" in r.json()["detail"]
+
+    # The limit also applies to the total of all the definitions
+    monkeypatch.setattr("diracx.routers.job_manager.MAX_SUBMITTED_JOBS", 25)
+    r = normal_user_client.post("/jobs/", json=[jdl.replace("10001", "20")] * 2)
+    assert r.status_code == 400, r.json()
+    assert "submitted jobs exceeds the limit" in r.json()["detail"]
+
+
+def test_retry_deadlocks(normal_user_client, metrics_headers, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.ext.asyncio import AsyncConnection
+
+    r = normal_user_client.post("/jobs/", json=[TEST_JDL])
+    assert r.status_code == 200, r.json()
+
+    failures = 2
+    original_stream = AsyncConnection.stream
+
+    async def stream(self, *args, **kwargs):
+        nonlocal failures
+        if failures > 0:
+            failures -= 1
+            orig = sqlite3.OperationalError("database is locked")
+            orig.sqlite_errorcode = 5
+            raise OperationalError("SELECT", {}, orig)
+        return await original_stream(self, *args, **kwargs)
+
+    monkeypatch.setattr(AsyncConnection, "stream", stream)
+    monkeypatch.setattr("diracx.routers.fastapi_classes.TRANSACTION_RETRY_DELAY", 0)
+
+    # The request succeeds once the database is no longer locked
+    r = normal_user_client.post("/jobs/summary", json={"grouping": ["Status"]})
+    assert r.status_code == 200, r.json()
+    assert r.json() == [{"Status": "RECEIVED", "count": 1}]
+    r = normal_user_client.get("/metrics", headers=metrics_headers)
+    assert 'diracx_db_retryable_errors_total{db="JobDB"} 2' in r.text
+
+    # Too many failures are reported as the service being unavailable
+    failures = 10
+    r = normal_user_client.post("/jobs/summary", json={"grouping": ["Owner"]})
+    assert r.status_code == 503, r.json()